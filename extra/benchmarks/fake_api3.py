@@ -0,0 +1,543 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# extra/benchmarks/fake_api3.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# Local fake of the LANBilling api3 SOAP service. It serves the operations that are described in the
+# api3-stub.wsdl file over a synthetic dataset. Vgroups are generated from theirs ids on the fly, so millions of
+# them do not take memory; only vgroups and tariffs that are changed by write calls are kept.
+#
+# Besides SOAP the server answers:
+#   GET /admin/soap/api3.wsdl - WSDL with the address of this server
+#   GET /stats - JSON with the number of calls and transferred bytes per method
+#   POST /reset - drop every change and statistics (the dataset becomes the same as at the start)
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+
+wsdl_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api3-stub.wsdl')
+
+xsd_namespace = '{http://www.w3.org/2001/XMLSchema}'
+soap_namespace = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+
+class WApi3Schema:
+
+	def __init__(self, wsdl_filename):
+		tree = etree.parse(wsdl_filename)
+		self.types = {}
+		self.requests = {}
+		self.responses = {}
+
+		for complex_type in tree.iter(xsd_namespace + 'complexType'):
+			if complex_type.get('name') is not None:
+				self.types[complex_type.get('name')] = self.__fields(complex_type)
+
+		for element in tree.iter(xsd_namespace + 'element'):
+			if element.getparent().tag != xsd_namespace + 'schema':
+				continue
+			name = element.get('name')
+			fields = self.__fields(element.find(xsd_namespace + 'complexType'))
+			if name.endswith('Response') is True:
+				self.responses[name[:-len('Response')]] = fields[0]
+			else:
+				self.requests[name] = fields
+
+	@staticmethod
+	def __fields(complex_type):
+		result = []
+		for element in complex_type.iter(xsd_namespace + 'element'):
+			result.append((
+				element.get('name'), element.get('type').split(':')[1], element.get('maxOccurs') == 'unbounded'
+			))
+		return result
+
+	def render(self, output, name, type_name, value):
+		fields = self.types.get(type_name)
+		if fields is None:
+			output.append('<%s>%s</%s>' % (name, escape(str(value)), name))
+			return
+
+		output.append('<%s>' % name)
+		for field_name, field_type, repeated in fields:
+			field_value = value.get(field_name)
+			if field_value is None:
+				continue
+			if repeated is True:
+				for item in field_value:
+					self.render(output, field_name, field_type, item)
+			else:
+				self.render(output, field_name, field_type, field_value)
+		output.append('</%s>' % name)
+
+	def parse(self, element, type_name):
+		fields = self.types.get(type_name)
+		if fields is None:
+			if type_name == 'long':
+				return int(element.text)
+			if type_name == 'double':
+				return float(element.text)
+			return element.text if element.text is not None else ''
+		return self.parse_fields(element, fields)
+
+	def parse_request(self, element):
+		method_name = etree.QName(element).localname
+		if method_name not in self.requests:
+			raise ValueError('error_unknown_method')
+		return method_name, self.parse_fields(element, self.requests[method_name])
+
+	def parse_fields(self, element, fields):
+		fields = {x[0]: x for x in fields}
+		result = {}
+		for child in element:
+			field_name, field_type, repeated = fields[etree.QName(child).localname]
+			value = self.parse(child, field_type)
+			if repeated is True:
+				result.setdefault(field_name, []).append(value)
+			else:
+				result[field_name] = value
+		return result
+
+
+class WApi3Dataset:
+
+	destination_tariff_type = 5
+
+	def __init__(self, vgroups=1000, agents=4, tariffs=100, seed=0):
+		self.vgroups = vgroups
+		self.agents = agents
+		self.tariffs = max(tariffs, 10)
+		self.seed = seed
+		self.lock = threading.Lock()
+		# every tenth tariff has an analog of the destination type, vgroups are assigned to primary tariffs only
+		self.primary_tariffs = [x for x in range(1, self.tariffs + 1) if self.tariff_kind(x) < 8]
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.changed_vgroups = {}
+			self.changed_tariffs = {}
+			self.next_vgid = self.vgroups + 1
+			self.next_tarid = self.tariffs + 1
+
+	def hash(self, vg_id):
+		return (vg_id * 2654435761 + self.seed * 40503) % (2 ** 32)
+
+	@staticmethod
+	def tariff_kind(tar_id):
+		return (tar_id - 1) % 10
+
+	def agent(self, agent_id):
+		return {'id': agent_id, 'type': 1, 'name': 'agent-%i' % agent_id, 'descr': 'Synthetic agent %i' % agent_id}
+
+	def tariff(self, tar_id):
+		tariff = self.changed_tariffs.get(tar_id)
+		if tariff is not None:
+			return tariff
+		if tar_id < 1 or tar_id > self.tariffs:
+			return None
+
+		kind = self.tariff_kind(tar_id)
+		tariff_type = 0
+		base_id = tar_id
+		if kind >= 8:
+			# an analog of the first or the second tariff of the same ten
+			tariff_type = self.destination_tariff_type
+			base_id = tar_id - 8
+
+		return {
+			'tarif': {
+				'tarid': tar_id, 'type': tariff_type, 'curid': 1, 'actblock': 0, 'dailyrent': 0,
+				'shape': 1024 * (1 + base_id % 8), 'used': 0, 'saledictionaryid': 0, 'trafflimit': 0, 'archive': 0,
+				'additional': 0, 'rent': 100.0 + base_id * 10, 'blockrent': 0.0, 'uuid': 'uuid-%08i' % tar_id,
+				'descr': 'Tariff %i' % base_id, 'descrfull': 'Synthetic tariff %i' % tar_id, 'catnumbers': []
+			},
+			'sizeshapes': [],
+			'timeshapes': []
+		}
+
+	def vgroup(self, vg_id):
+		vgroup = self.changed_vgroups.get(vg_id)
+		if vgroup is not None:
+			return vgroup
+		if vg_id < 1 or vg_id > self.vgroups:
+			return None
+
+		h = self.hash(vg_id)
+		agent_id = 1 + h % self.agents
+		return {
+			'vgroup': {
+				'vgid': vg_id, 'id': agent_id, 'uid': vg_id,
+				'tarid': self.primary_tariffs[(h >> 8) % len(self.primary_tariffs)], 'parentvgid': 0,
+				'blocked': 2 if (h >> 20) % 50 == 0 else 0, 'archive': 1 if (h >> 16) % 20 == 0 else 0,
+				'dirty': 0, 'ipdet': 0, 'portdet': 0, 'shape': 0, 'maxsessions': 1, 'amount': 0.0,
+				'login': 'user%07i' % vg_id, 'pass': 'secret%i' % h, 'descr': 'Synthetic vgroup %i' % vg_id,
+				'accondate': '2017-01-01 00:00:00', 'creationdate': '2016-12-01 00:00:00'
+			},
+			'agentname': 'agent-%i' % agent_id,
+			'staff': [{'id': 0, 'ipmask': '10.%i.%i.%i/32' % (h >> 16 & 255, h >> 8 & 255, h & 255), 'type': 0}]
+			if (h >> 24) % 10 == 0 else []
+		}
+
+	def vgroup_summary(self, vg_id):
+		vgroup = self.vgroup(vg_id)
+		if vgroup is None:
+			return None
+		record = vgroup['vgroup']
+		tariff = self.tariff(record['tarid'])
+		return {
+			'vgid': record['vgid'], 'id': record['id'], 'uid': record.get('uid', 0), 'tarid': record['tarid'],
+			'agenttype': 1, 'archive': record.get('archive', 0), 'blocked': record.get('blocked', 0), 'curid': 1,
+			'balance': (self.hash(vg_id) % 100000) / 100, 'login': record['login'],
+			'username': 'Synthetic user %i' % record.get('uid', 0), 'agentdescr': vgroup.get('agentname', ''),
+			'tarifdescr': tariff['tarif']['descr'] if tariff is not None else '',
+			'accondate': record.get('accondate'), 'creationdate': record.get('creationdate')
+		}
+
+	def vgroup_ids(self):
+		for vg_id in range(1, self.vgroups + 1):
+			yield vg_id
+		for vg_id in sorted(x for x in self.changed_vgroups if x > self.vgroups):
+			yield vg_id
+
+	def change_vgroup(self, vg_id):
+		vgroup = self.vgroup(vg_id)
+		if vgroup is None:
+			raise ValueError('error_vgroup_not_found')
+		self.changed_vgroups[vg_id] = vgroup
+		return vgroup
+
+
+class WApi3Service:
+
+	write_methods = ('insupdVgroup', 'insupdTarif', 'insupdTarifsRasp', 'insBlkRasp')
+
+	def __init__(self, schema, dataset, latency=0, jitter=0, record_latency=0, capacity=None):
+		self.schema = schema
+		self.dataset = dataset
+		self.latency = latency
+		self.jitter = jitter
+		self.record_latency = record_latency
+		# an overloaded server is emulated by a queue of calls that are over the capacity
+		self.capacity = threading.BoundedSemaphore(capacity) if capacity is not None else None
+		self.stats_lock = threading.Lock()
+		self.stats = {}
+
+	def account(self, method_name, request_bytes=0, response_bytes=0):
+		with self.stats_lock:
+			method_stats = self.stats.setdefault(method_name, {'calls': 0, 'request_bytes': 0, 'response_bytes': 0})
+			method_stats['calls'] += 1
+			method_stats['request_bytes'] += request_bytes
+			method_stats['response_bytes'] += response_bytes
+
+	def reset(self):
+		self.dataset.reset()
+		with self.stats_lock:
+			self.stats = {}
+
+	def delay(self, records=0):
+		delay = self.latency + records * self.record_latency
+		if self.jitter > 0:
+			delay += random.uniform(0, self.jitter)
+		if delay > 0:
+			time.sleep(delay)
+
+	def call(self, method_name, request):
+		method = getattr(self, 'op_' + method_name, None)
+		if method is None:
+			raise ValueError('error_unknown_method')
+
+		if self.capacity is not None:
+			self.capacity.acquire()
+		try:
+			result = method(request)
+			if isinstance(result, list) is True:
+				self.delay(len(result))
+			else:
+				self.delay()
+			return result
+		finally:
+			if self.capacity is not None:
+				self.capacity.release()
+
+	def op_Login(self, request):
+		return 1
+
+	def op_Logout(self, request):
+		return 1
+
+	def op_getAgents(self, request):
+		return [self.dataset.agent(x) for x in range(1, self.dataset.agents + 1)]
+
+	def op_getVgroups(self, request):
+		flt = request.get('flt', {})
+		dataset = self.dataset
+
+		if 'vgid' in flt:
+			vg_ids = [flt['vgid']]
+		else:
+			vg_ids = dataset.vgroup_ids()
+
+		result = []
+		with dataset.lock:
+			for vg_id in vg_ids:
+				record = dataset.vgroup_summary(vg_id)
+				if record is None:
+					continue
+				if 'login' in flt and flt['login'] not in record['login']:
+					continue
+				if 'agentid' in flt and record['id'] != flt['agentid']:
+					continue
+				if 'archive' in flt and record['archive'] != flt['archive']:
+					continue
+				if 'tarid' in flt and record['tarid'] != flt['tarid']:
+					continue
+				result.append(record)
+
+		if 'pgsize' in flt and flt['pgsize'] > 0:
+			offset = (max(flt.get('pgnum', 1), 1) - 1) * flt['pgsize']
+			result = result[offset:offset + flt['pgsize']]
+		return result
+
+	def op_getVgroup(self, request):
+		with self.dataset.lock:
+			vgroup = self.dataset.vgroup(request['id'])
+		return [vgroup] if vgroup is not None else []
+
+	def op_getTarifs(self, request):
+		dataset = self.dataset
+		with dataset.lock:
+			tar_ids = list(range(1, dataset.tariffs + 1)) + sorted(dataset.changed_tariffs)
+			tariffs = [dataset.tariff(x)['tarif'] for x in sorted(set(tar_ids))]
+		return [{'id': x['tarid'], 'type': x['type'], 'descr': x['descr']} for x in tariffs]
+
+	def op_getTarif(self, request):
+		with self.dataset.lock:
+			tariff = self.dataset.tariff(request['id'])
+		return [tariff] if tariff is not None else []
+
+	def op_insupdVgroup(self, request):
+		vgroup = request['val']
+		dataset = self.dataset
+		with dataset.lock:
+			vg_id = vgroup['vgroup'].get('vgid', 0)
+			if vg_id == 0:
+				vg_id = dataset.next_vgid
+				dataset.next_vgid += 1
+				vgroup['vgroup']['vgid'] = vg_id
+				vgroup['vgroup']['uid'] = vg_id
+			elif dataset.vgroup(vg_id) is None:
+				raise ValueError('error_vgroup_not_found')
+			dataset.changed_vgroups[vg_id] = vgroup
+		return vg_id
+
+	def op_insupdTarif(self, request):
+		tariff = request['val']
+		dataset = self.dataset
+		with dataset.lock:
+			tar_id = tariff['tarif'].get('tarid', 0)
+			if tar_id == 0:
+				tar_id = dataset.next_tarid
+				dataset.next_tarid += 1
+				tariff['tarif'].update({'tarid': tar_id, 'uuid': 'uuid-%08i' % tar_id, 'saledictionaryid': 0})
+			elif dataset.tariff(tar_id) is None:
+				raise ValueError('error_tarif_not_found')
+			tariff['tarif']['used'] = 0
+			dataset.changed_tariffs[tar_id] = tariff
+		return tar_id
+
+	def op_insupdTarifsRasp(self, request):
+		record = request['val']
+		with self.dataset.lock:
+			if self.dataset.tariff(record['taridnew']) is None:
+				raise ValueError('error_tarif_not_found')
+			self.dataset.change_vgroup(record['vgid'])['vgroup']['tarid'] = record['taridnew']
+		return 1
+
+	def op_insBlkRasp(self, request):
+		record = request['val']
+		with self.dataset.lock:
+			self.dataset.change_vgroup(record['vgid'])['vgroup']['blocked'] = record['blkreq']
+		return 1
+
+
+class WApi3RequestHandler(BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+
+	# headers and chunks are sent by separate writes, with Nagle's algorithm every response would wait for ACK
+	disable_nagle_algorithm = True
+
+	chunk_size = 64 * 1024
+
+	def log_message(self, format, *args):
+		if self.server.verbose is True:
+			BaseHTTPRequestHandler.log_message(self, format, *args)
+
+	def send_body(self, body, content_type, status=200):
+		body = body.encode()
+		self.send_response(status)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if self.path.endswith('.wsdl') is True:
+			address = 'http://%s/' % self.headers.get('Host', '%s:%i' % self.server.server_address)
+			self.send_body(
+				self.server.wsdl.replace('http://localhost:34012', address), 'text/xml; charset=utf-8'
+			)
+		elif self.path == '/stats':
+			with self.server.service.stats_lock:
+				stats = json.dumps(self.server.service.stats, sort_keys=True)
+			self.send_body(stats, 'application/json')
+		else:
+			self.send_body('Not found', 'text/plain', status=404)
+
+	def do_POST(self):
+		request_body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+		if self.path == '/reset':
+			self.server.service.reset()
+			self.send_body('{}', 'application/json')
+			return
+
+		service = self.server.service
+		method_name = None
+		try:
+			body = etree.fromstring(request_body).find('{%s}Body' % soap_namespace)
+			method_name, request = service.schema.parse_request(body[0])
+			result = service.call(method_name, request)
+		except Exception as e:
+			fault = (
+				'<soap-env:Envelope xmlns:soap-env="%s"><soap-env:Body><soap-env:Fault>'
+				'<faultcode>soap-env:Server</faultcode><faultstring>%s</faultstring>'
+				'</soap-env:Fault></soap-env:Body></soap-env:Envelope>'
+			) % (soap_namespace, escape(str(e)))
+			service.account(method_name or 'unknown', len(request_body), len(fault))
+			self.send_body(fault, 'text/xml; charset=utf-8', status=500)
+			return
+
+		response_bytes = self.send_result(method_name, result)
+		service.account(method_name, len(request_body), response_bytes)
+
+	def send_result(self, method_name, result):
+		# large results are rendered and sent chunk by chunk
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/xml; charset=utf-8')
+		self.send_header('Transfer-Encoding', 'chunked')
+		self.end_headers()
+
+		schema = self.server.service.schema
+		field_name, type_name, repeated = schema.responses[method_name]
+		response_bytes = 0
+		output = [
+			'<?xml version="1.0" encoding="UTF-8"?><soap-env:Envelope xmlns:soap-env="%s"><soap-env:Body>'
+			'<%sResponse xmlns="urn:api3">' % (soap_namespace, method_name)
+		]
+		output_size = 0
+
+		for item in (result if repeated is True else [result]):
+			schema.render(output, field_name, type_name, item)
+			output_size += len(output[-1])
+			if output_size >= self.chunk_size:
+				response_bytes += self.write_chunk(''.join(output))
+				output = []
+				output_size = 0
+
+		output.append('</%sResponse></soap-env:Body></soap-env:Envelope>' % method_name)
+		response_bytes += self.write_chunk(''.join(output))
+		self.wfile.write(b'0\r\n\r\n')
+		return response_bytes
+
+	def write_chunk(self, data):
+		data = data.encode()
+		self.wfile.write(('%x\r\n' % len(data)).encode() + data + b'\r\n')
+		return len(data)
+
+
+class WApi3Server(ThreadingMixIn, HTTPServer):
+
+	daemon_threads = True
+
+	def __init__(self, server_address, service, verbose=False):
+		HTTPServer.__init__(self, server_address, WApi3RequestHandler)
+		self.service = service
+		self.verbose = verbose
+		with open(wsdl_path) as f:
+			self.wsdl = f.read()
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Fake LANBilling api3 SOAP server with a synthetic dataset')
+	parser.add_argument('--host', help='address to listen on', type=str, metavar='host', default='127.0.0.1')
+	parser.add_argument('--port', help='port to listen on', type=int, metavar='port', default=34012)
+	parser.add_argument('--vgroups', help='number of vgroups', type=int, metavar='vgroups', default=1000)
+	parser.add_argument('--agents', help='number of agents', type=int, metavar='agents', default=4)
+	parser.add_argument(
+		'--tariffs', help='number of tariffs (every tenth pair of them has the type 5)', type=int,
+		metavar='tariffs', default=100
+	)
+	parser.add_argument('--seed', help='seed of the generated dataset', type=int, metavar='seed', default=0)
+	parser.add_argument(
+		'--latency', help='delay of every response in seconds', type=float, metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--jitter', help='maximum random delay that is added to every response in seconds', type=float,
+		metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--record-latency', help='delay of every returned record (of list results) in seconds', type=float,
+		metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--capacity', help='number of calls that are processed concurrently, others wait in a queue. '
+		'Unlimited by default', type=int, metavar='calls', default=None
+	)
+	parser.add_argument('--verbose', help='print every request to stderr', action='store_true')
+	args = parser.parse_args()
+
+	api3_service = WApi3Service(
+		WApi3Schema(wsdl_path), WApi3Dataset(
+			vgroups=args.vgroups, agents=args.agents, tariffs=args.tariffs, seed=args.seed
+		), latency=args.latency, jitter=args.jitter, record_latency=args.record_latency, capacity=args.capacity
+	)
+	server = WApi3Server((args.host, args.port), api3_service, verbose=args.verbose)
+	print('Fake api3 server is listening on http://%s:%i/' % server.server_address)
+	sys.stdout.flush()
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
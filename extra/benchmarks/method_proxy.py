@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# extra/benchmarks/method_proxy.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the cost of resolving "rpc.<method>" before the SOAP request is made and the cost of a whole call
+# through the MethodProxy wrappers (response cache, retry policy with a circuit breaker, concurrency limiter and
+# metrics). No server is required - the operation proxies are built from the api3-stub.wsdl file and requests are
+# answered by a stub transport with an empty getVgroup response, so the difference between a direct zeep call and a
+# call through the proxy is the cost of the wrappers
+
+import os
+import sys
+import timeit
+import argparse
+import itertools
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from zeep import Client as SOAPClient
+from zeep.transports import Transport
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.rpc_cache import WRPCResponseCache
+from lanbilling_stuff.retry import WRetryPolicy, WCircuitBreaker
+from lanbilling_stuff.limiter import WConcurrencyLimiter
+from lanbilling_stuff.metrics import WRPCMetrics
+
+
+class WStubTransport(Transport):
+
+	response_content = (
+		b'<?xml version="1.0" encoding="utf-8"?>'
+		b'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="urn:api3">'
+		b'<soap:Body><tns:getVgroupResponse/></soap:Body></soap:Envelope>'
+	)
+
+	def post(self, address, message, headers):
+		response = requests.Response()
+		response.status_code = 200
+		response.headers['Content-Type'] = 'text/xml; charset=utf-8'
+		response.encoding = 'utf-8'
+		response._content = self.response_content
+		return response
+
+
+class WStubLanbillingRPC(WLanbillingRPC):
+
+	def __init__(self, soap_client, **kwargs):
+		WLanbillingRPC.__init__(self, **kwargs)
+		self.__soap_client = soap_client
+
+	def rpc(self):
+		return self.__soap_client.service
+
+
+def legacy_lookup(rpc, method_name):
+	# the way WLanbillingRPC.__getattr__ resolved methods before proxies were cached
+	try:
+		return object.__getattribute__(rpc, method_name)
+	except AttributeError:
+		pass
+	return WLanbillingRPC.MethodProxy(rpc, rpc.rpc(), method_name)
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='WLanbillingRPC method lookup benchmark')
+	parser.add_argument(
+		'--calls', help='number of lookups to measure', type=int, metavar='calls', default=200000
+	)
+	parser.add_argument(
+		'--rpc-calls', help='number of getVgroup calls to measure', type=int, metavar='calls', default=20000
+	)
+	args = parser.parse_args()
+
+	wsdl_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api3-stub.wsdl')
+	soap_client = SOAPClient(wsdl_path, transport=WStubTransport())
+	rpc = WStubLanbillingRPC(soap_client)
+
+	legacy_time = timeit.timeit(lambda: legacy_lookup(rpc, 'Login'), number=args.calls)
+	cached_time = timeit.timeit(lambda: rpc.Login, number=args.calls)
+
+	print('lookups: %i' % args.calls)
+	print('legacy lookup: %.3f us per call' % (legacy_time * 1e6 / args.calls))
+	print('cached lookup: %.3f us per call' % (cached_time * 1e6 / args.calls))
+	print('speedup: %.1fx' % (legacy_time / cached_time))
+
+	wrapped_rpc = WStubLanbillingRPC(
+		soap_client, response_cache=WRPCResponseCache(), metrics=WRPCMetrics(),
+		retry_policy=WRetryPolicy(circuit_breaker=WCircuitBreaker()),
+		concurrency_limiter=WConcurrencyLimiter(max_limit=10)
+	)
+	# every call asks for another vgroup, so the response cache misses (except for the "cache hit" case)
+	calls = (
+		('zeep call', lambda ids: soap_client.service.getVgroup(next(ids))),
+		('bare proxy call', lambda ids: rpc.getVgroup(next(ids))),
+		('wrapped proxy call', lambda ids: wrapped_rpc.getVgroup(next(ids))),
+		('wrapped proxy call (cache hit)', lambda ids: wrapped_rpc.getVgroup(1))
+	)
+
+	print('calls: %i' % args.rpc_calls)
+	call_times = {}
+	for call_name, call in calls:
+		ids = itertools.count(1)
+		call_times[call_name] = timeit.timeit(lambda: call(ids), number=args.rpc_calls)
+		print('%s: %.3f us per call' % (call_name, call_times[call_name] * 1e6 / args.rpc_calls))
+	print('wrappers overhead: %.3f us per call' % (
+		(call_times['wrapped proxy call'] - call_times['zeep call']) * 1e6 / args.rpc_calls
+	))
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# extra/benchmarks/records.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# Memory that is taken by fetched records: zeep objects against compact records (lanbilling_stuff/records.py).
+# Records are fetched from the fake api3 server (see fake_api3.py) that is started inside this process. Memory
+# is measured with tracemalloc as the size of Python objects that are kept after fetching, so a parser's
+# temporary memory is not counted. Compact records are checked to give the same payload as zeep objects:
+#
+#   extra/benchmarks/records.py --vgroups 100000 --details 10000
+
+import os
+import sys
+import gc
+import argparse
+import threading
+import tracemalloc
+
+from zeep import Client
+from zeep.helpers import serialize_object
+
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(1, os.path.abspath(os.path.join(benchmarks_dir, '..', '..')))
+
+from fake_api3 import WApi3Schema, WApi3Dataset, WApi3Service, WApi3Server, wsdl_path
+from lanbilling_stuff.records import VGroupSummary, VGroupDetail, Tariff
+
+
+def retained_memory(fetch):
+	gc.collect()
+	tracemalloc.start()
+	try:
+		result = fetch()
+		gc.collect()
+		size = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	return result, size
+
+
+def payload(value, omitted_fields=tuple()):
+	result = serialize_object(value, dict)
+	for field_name in omitted_fields:
+		result.pop(field_name, None)
+	return result
+
+
+def measure(name, fetch, record_cls):
+	zeep_records, zeep_size = retained_memory(fetch)
+	# records are fetched again, so strings that compact records refer to are counted too
+	compact_records, compact_size = retained_memory(lambda: [record_cls.from_value(x) for x in fetch()])
+
+	for zeep_record, compact_record in zip(zeep_records, compact_records):
+		if payload(zeep_record, record_cls.omitted_fields) != compact_record.payload():
+			raise RuntimeError('%s record differs from the zeep object: %s' % (name, compact_record))
+
+	count = len(zeep_records)
+	print(
+		'%-16s %8i records: zeep %10.1f MiB (%6i bytes/record), compact %8.1f MiB (%5i bytes/record), '
+		'%5.1fx less' % (
+			name, count, zeep_size / (1024 * 1024), zeep_size / count, compact_size / (1024 * 1024),
+			compact_size / count, zeep_size / compact_size
+		)
+	)
+	sys.stdout.flush()
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Memory benchmark of zeep objects and compact records')
+	parser.add_argument(
+		'--vgroups', help='number of vgroups in the dataset', type=int, metavar='vgroups', default=20000
+	)
+	parser.add_argument(
+		'--details', help='number of vgroups that are fetched by getVgroup', type=int, metavar='vgroups',
+		default=2000
+	)
+	parser.add_argument(
+		'--tariffs', help='number of tariffs in the dataset', type=int, metavar='tariffs', default=300
+	)
+	args = parser.parse_args()
+
+	service = WApi3Service(WApi3Schema(wsdl_path), WApi3Dataset(vgroups=args.vgroups, tariffs=args.tariffs))
+	server = WApi3Server(('127.0.0.1', 0), service)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+
+	try:
+		client = Client('http://127.0.0.1:%i/admin/soap/api3.wsdl' % server.server_address[1])
+		api3 = client.service
+
+		measure('getVgroups', lambda: api3.getVgroups({}), VGroupSummary)
+		measure(
+			'getVgroup', lambda: [api3.getVgroup(x)[0] for x in range(1, min(args.details, args.vgroups) + 1)],
+			VGroupDetail
+		)
+		measure('getTarif', lambda: [api3.getTarif(x)[0] for x in range(1, args.tariffs + 1)], Tariff)
+	finally:
+		server.shutdown()
+		server.server_close()
@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# extra/benchmarks/scripts.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runs the scripts against the local fake api3 server (see fake_api3.py) and measures wall time, RPC calls per
+# second and peak RSS of every script. The fake server is started for every dataset size and is reset before
+# every script, so every run sees the same data. Results are saved as JSON and may be compared with the results of
+# a previous run:
+#
+#   extra/benchmarks/scripts.py --vgroups 1000 100000 --output after.json --baseline before.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import configparser
+from urllib.request import urlopen, Request
+from urllib.error import URLError
+
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repository_dir = os.path.abspath(os.path.join(benchmarks_dir, '..', '..'))
+
+
+def scenarios(args, report_filename):
+	# write scenarios are limited by the --write-limit option, reading scenarios process everything
+	jobs = ['--jobs', str(args.jobs)] if args.jobs is not None else []
+	write_range = ['--from-vg-id', '1', '--to-vg-id', str(args.write_limit)]
+	return {
+		'vgroups.py': ['vgroups.py'],
+		'tariffs.py': ['tariffs.py'] + jobs,
+		'update_vgroups.py': ['update_vgroups.py', '--update-ip-details', '1'] + write_range + jobs,
+		'clone_tariffs.py': [
+			'clone_tariffs.py', '--destination-tariff-type', '5', '--destination-tariff-prefix', 'Cloned ',
+			'--export-report', report_filename
+		] + jobs,
+		'migrate_vgroups.py': [
+			'migrate_vgroups.py', '--destination-agent-id', str(args.agents), '--destination-tariff-type', '5',
+			'--export-report', report_filename
+		] + write_range + jobs
+	}
+
+
+def free_port():
+	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+
+def server_request(address, path, method='GET'):
+	with urlopen(Request(address + path, method=method, data=(b'' if method == 'POST' else None))) as response:
+		return json.loads(response.read().decode())
+
+
+def start_server(args, vgroups, port):
+	command = [
+		sys.executable, os.path.join(benchmarks_dir, 'fake_api3.py'), '--port', str(port), '--vgroups', str(vgroups),
+		'--agents', str(args.agents), '--tariffs', str(args.tariffs), '--latency', str(args.latency),
+		'--jitter', str(args.jitter), '--record-latency', str(args.record_latency)
+	]
+	if args.capacity is not None:
+		command.extend(['--capacity', str(args.capacity)])
+	server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+	address = 'http://127.0.0.1:%i' % port
+
+	deadline = time.monotonic() + 30
+	while True:
+		try:
+			server_request(address, '/stats')
+			return server, address
+		except (URLError, ConnectionError):
+			if server.poll() is not None or time.monotonic() > deadline:
+				server.kill()
+				raise RuntimeError('Fake api3 server was not started')
+			time.sleep(0.1)
+
+
+def write_config(base_config, address, filename):
+	config = configparser.ConfigParser()
+	config.read(base_config)
+	if config.has_section('lanbilling') is False:
+		config.add_section('lanbilling')
+	config['lanbilling'].update({
+		'login': 'admin', 'password': 'admin', 'hostname': address.split('://')[1],
+		'wsdl_url': address + '/admin/soap/api3.wsdl', 'soap_proxy_address': '', 'wsdl_cache_dir': ''
+	})
+	with open(filename, 'w') as f:
+		config.write(f)
+
+
+def run_script(command, config_filename, timeout):
+	env = os.environ.copy()
+	env['LANBILLING_CONFIG'] = config_filename
+	env['PYTHONPATH'] = repository_dir + os.pathsep + env.get('PYTHONPATH', '')
+
+	with tempfile.TemporaryFile() as stderr:
+		started_at = time.monotonic()
+		process = subprocess.Popen(
+			[sys.executable] + command, cwd=repository_dir, env=env, stdin=subprocess.DEVNULL,
+			stdout=subprocess.DEVNULL, stderr=stderr
+		)
+
+		deadline = started_at + timeout
+		while True:
+			pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+			if pid != 0:
+				break
+			if time.monotonic() > deadline:
+				process.kill()
+				pid, status, usage = os.wait4(process.pid, 0)
+				break
+			time.sleep(0.01)
+		wall_time = time.monotonic() - started_at
+		# Popen must not wait for the process that is reaped already
+		process.returncode = status
+
+		stderr.seek(0)
+		error = stderr.read().decode(errors='replace')
+
+	exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+	# ru_maxrss is measured in kilobytes on Linux and in bytes on macOS
+	peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+	return exit_code, wall_time, peak_rss, error[-2000:] if exit_code != 0 else None
+
+
+def compare(results, baseline_filename):
+	with open(baseline_filename) as f:
+		baseline = {(x['script'], x['vgroups']): x for x in json.load(f)['results']}
+
+	print()
+	print('Compared with %s:' % baseline_filename)
+	for result in results:
+		previous = baseline.get((result['script'], result['vgroups']))
+		if previous is None or previous['exit_code'] != 0 or result['exit_code'] != 0:
+			continue
+		changes = []
+		for field in ('wall_time', 'calls_per_second', 'peak_rss'):
+			if previous[field] > 0:
+				changes.append('%s %+.1f%%' % (field, (result[field] - previous[field]) * 100 / previous[field]))
+		print('%-20s %10i  %s' % (result['script'], result['vgroups'], ', '.join(changes)))
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='End-to-end scripts benchmark against the fake api3 server')
+	parser.add_argument(
+		'--vgroups', help='dataset sizes (number of vgroups) to run the scripts with', type=int, nargs='+',
+		metavar='vgroups', default=[1000]
+	)
+	parser.add_argument('--agents', help='number of agents in datasets', type=int, metavar='agents', default=4)
+	parser.add_argument('--tariffs', help='number of tariffs in datasets', type=int, metavar='tariffs', default=100)
+	parser.add_argument(
+		'--latency', help='delay of every server response in seconds', type=float, metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--jitter', help='maximum random delay that is added to every response in seconds', type=float,
+		metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--record-latency', help='delay of every returned record (of list results) in seconds', type=float,
+		metavar='seconds', default=0
+	)
+	parser.add_argument(
+		'--capacity', help='number of calls that the server processes concurrently (unlimited by default)',
+		type=int, metavar='calls', default=None
+	)
+	parser.add_argument(
+		'--scripts', help='scripts to run (all of them by default)', type=str, nargs='+', metavar='script',
+		choices=('vgroups.py', 'tariffs.py', 'update_vgroups.py', 'clone_tariffs.py', 'migrate_vgroups.py'),
+		default=None
+	)
+	parser.add_argument(
+		'--write-limit', help='number of vgroups (from the first one) that are changed by update_vgroups.py and '
+		'migrate_vgroups.py', type=int, metavar='vgroups', default=1000
+	)
+	parser.add_argument(
+		'--jobs', help='"--jobs" option for the scripts that support it', type=int, metavar='jobs', default=None
+	)
+	parser.add_argument(
+		'--config', help='configuration that the scripts settings (like retries and pool sizes) are taken from. '
+		'Server address and credentials are replaced', type=str, metavar='filename',
+		default=os.path.join(repository_dir, 'lanbilling.ini')
+	)
+	parser.add_argument(
+		'--timeout', help='time limit for a single script run in seconds', type=float, metavar='seconds', default=3600
+	)
+	parser.add_argument(
+		'--output', help='file to save results to', type=str, metavar='filename', default='benchmark-results.json'
+	)
+	parser.add_argument(
+		'--baseline', help='results of the previous run to compare with', type=str, metavar='filename', default=None
+	)
+	args = parser.parse_args()
+
+	results = []
+	work_dir = tempfile.mkdtemp(prefix='lanbilling-benchmark-')
+	config_filename = os.path.join(work_dir, 'lanbilling.ini')
+	report_filename = os.path.join(work_dir, 'report.csv')
+
+	for vgroups in args.vgroups:
+		server, address = start_server(args, vgroups, free_port())
+		try:
+			write_config(args.config, address, config_filename)
+
+			for script, command in scenarios(args, report_filename).items():
+				if args.scripts is not None and script not in args.scripts:
+					continue
+
+				server_request(address, '/reset', method='POST')
+				exit_code, wall_time, peak_rss, error = run_script(command, config_filename, args.timeout)
+				methods = server_request(address, '/stats')
+
+				calls = sum(x['calls'] for x in methods.values())
+				result = {
+					'script': script,
+					'vgroups': vgroups,
+					'args': command[1:],
+					'exit_code': exit_code,
+					'wall_time': wall_time,
+					'calls': calls,
+					'calls_per_second': (calls / wall_time) if wall_time > 0 else 0,
+					'peak_rss': peak_rss,
+					'methods': methods
+				}
+				if error is not None:
+					result['error'] = error
+				results.append(result)
+
+				print(
+					'%-20s %10i vgroups: %s %8.2fs %8i calls %10.1f calls/s %8.1f MiB peak RSS' % (
+						script, vgroups, 'ok    ' if exit_code == 0 else ('exit %-2i' % exit_code),
+						wall_time, calls, result['calls_per_second'], peak_rss / (1024 * 1024)
+					)
+				)
+				sys.stdout.flush()
+		finally:
+			server.terminate()
+			server.wait()
+
+	git_revision = None
+	try:
+		git_revision = subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], cwd=repository_dir, stderr=subprocess.DEVNULL
+		).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		pass
+
+	with open(args.output, 'w') as f:
+		json.dump({
+			'created_at': time.time(),
+			'git_revision': git_revision,
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'settings': {
+				'agents': args.agents, 'tariffs': args.tariffs, 'latency': args.latency, 'jitter': args.jitter,
+				'record_latency': args.record_latency, 'capacity': args.capacity, 'write_limit': args.write_limit,
+				'jobs': args.jobs
+			},
+			'results': results
+		}, f, indent=4, sort_keys=True)
+	print('Results are saved to %s' % args.output)
+
+	if args.baseline is not None:
+		compare(results, args.baseline)
+
+	shutil.rmtree(work_dir, ignore_errors=True)
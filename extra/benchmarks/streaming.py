@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# extra/benchmarks/streaming.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# Throughput and memory of fetch_vgroups with zeep decoding against streaming decoding ("rpc_streaming" option,
+# see lanbilling_stuff/streaming.py). The fake api3 server (see fake_api3.py) is started for every dataset size
+# and every fetch is done by a separate process, so its peak RSS includes the memory of the XML parser. Records are
+# either processed one by one ("iterate") or kept in a list ("keep"). Both decoders must give the same records:
+#
+#   extra/benchmarks/streaming.py --vgroups 10000 100000
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tempfile
+import configparser
+
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarks_dir)
+sys.path.insert(1, os.path.abspath(os.path.join(benchmarks_dir, '..', '..')))
+
+from scripts import free_port, start_server, write_config, run_script, repository_dir
+
+
+def worker(keep, result_filename):
+	from wasp_general.config import WConfig
+	from lanbilling_stuff.rpc import WLanbillingRPC
+	from lanbilling_stuff.vgroup import fetch_vgroups
+
+	config = WConfig()
+	config.merge(os.environ['LANBILLING_CONFIG'])
+	rpc = WLanbillingRPC.from_configuration(config, 'lanbilling')
+	rpc.rpc()
+	# ru_maxrss is measured in kilobytes on Linux and in bytes on macOS
+	started_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+	started_at = time.monotonic()
+	records = fetch_vgroups(rpc)
+	if keep is True:
+		records = list(records)
+
+	count = 0
+	digest = hashlib.sha1()
+	for record in records:
+		count += 1
+		digest.update(repr(sorted(record.items())).encode())
+	fetch_time = time.monotonic() - started_at
+	rpc.rpc().Logout()
+
+	with open(result_filename, 'w') as f:
+		json.dump({
+			'records': count, 'fetch_time': fetch_time, 'started_rss': started_rss, 'digest': digest.hexdigest()
+		}, f)
+
+
+def streaming_config(config_filename, streaming, filename):
+	config = configparser.ConfigParser()
+	config.read(config_filename)
+	config['lanbilling']['rpc_streaming'] = 'true' if streaming is True else 'false'
+	with open(filename, 'w') as f:
+		config.write(f)
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Streaming decoding benchmark against the fake api3 server')
+	parser.add_argument(
+		'--vgroups', help='dataset sizes (number of vgroups) to fetch', type=int, nargs='+', metavar='vgroups',
+		default=[10000, 100000]
+	)
+	parser.add_argument('--agents', help='number of agents in datasets', type=int, metavar='agents', default=4)
+	parser.add_argument('--tariffs', help='number of tariffs in datasets', type=int, metavar='tariffs', default=100)
+	parser.add_argument(
+		'--config', help='configuration that the RPC settings are taken from. Server address, credentials and the '
+		'"rpc_streaming" option are replaced', type=str, metavar='filename',
+		default=os.path.join(repository_dir, 'lanbilling.ini')
+	)
+	parser.add_argument(
+		'--timeout', help='time limit for a single fetch in seconds', type=float, metavar='seconds', default=3600
+	)
+	parser.add_argument('--worker', help=argparse.SUPPRESS, choices=('iterate', 'keep'), default=None)
+	parser.add_argument('--result', help=argparse.SUPPRESS, type=str, default=None)
+	args = parser.parse_args()
+
+	if args.worker is not None:
+		worker(args.worker == 'keep', args.result)
+		sys.exit(0)
+
+	# fake_api3.py options that the start_server function requires
+	args.latency = args.jitter = args.record_latency = 0
+	args.capacity = None
+
+	with tempfile.TemporaryDirectory(prefix='lanbilling-benchmark-') as work_dir:
+		result_filename = os.path.join(work_dir, 'result.json')
+		base_config = os.path.join(work_dir, 'base.ini')
+		configs = {x: os.path.join(work_dir, '%s.ini' % x) for x in ('zeep', 'streaming')}
+
+		for vgroups in args.vgroups:
+			server, address = start_server(args, vgroups, free_port())
+			try:
+				write_config(args.config, address, base_config)
+				for decoder, config_filename in configs.items():
+					streaming_config(base_config, decoder == 'streaming', config_filename)
+
+				for consumer in ('iterate', 'keep'):
+					command = [os.path.abspath(__file__), '--worker', consumer, '--result', result_filename]
+					digests = set()
+					for decoder, config_filename in configs.items():
+						exit_code, wall_time, peak_rss, error = run_script(command, config_filename, args.timeout)
+						if exit_code != 0:
+							raise RuntimeError('%s fetch failed:\n%s' % (decoder, error))
+						with open(result_filename) as f:
+							result = json.load(f)
+						digests.add(result['digest'])
+
+						print(
+							'%10i vgroups %-8s %-10s %8.2fs %10.1f records/s %8.1f MiB peak RSS '
+							'(%7.1f MiB over the session start)' % (
+								vgroups, consumer, decoder, result['fetch_time'],
+								result['records'] / result['fetch_time'], peak_rss / (1024 * 1024),
+								(peak_rss - result['started_rss']) / (1024 * 1024)
+							)
+						)
+						sys.stdout.flush()
+
+					if len(digests) != 1:
+						raise RuntimeError('Streaming decoding gives records that differ from zeep decoding')
+			finally:
+				server.terminate()
+				server.wait()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/async_rpc.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import asyncio
+
+import zeep.exceptions
+from zeep import AsyncClient as AsyncSOAPClient
+from zeep.proxy import AsyncServiceProxy
+from zeep.transports import AsyncTransport as AsyncSOAPTransport
+
+try:
+	import httpx
+except ImportError:
+	httpx = None
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.rpc import WLanbillingRPC, WLanbillingRPCSettings
+
+
+class WLanbillingAsyncRPC(WLanbillingRPCSettings):
+
+	class MethodProxy:
+
+		def __init__(self, lanbilling_rpc, method_name):
+			self.lanbilling_rpc = lanbilling_rpc
+			self.method_name = method_name
+			self.operation = None
+			self.generation = None
+
+		async def __call__(self, *args, **kwargs):
+			async with self.lanbilling_rpc.semaphore():
+				if self.operation is None:
+					self.operation = getattr(await self.lanbilling_rpc.rpc(), self.method_name)
+					self.generation = self.lanbilling_rpc.generation()
+
+				operation, generation = self.operation, self.generation
+				try:
+					return await operation(*args, **kwargs)
+				except zeep.exceptions.Fault as e:
+					if e.message != 'error_auth' or self.method_name in ('Login', 'Logout'):
+						raise
+
+				# only the first caller that spotted the expired session logs in again, the others reuse its result
+				await self.lanbilling_rpc.reconnect(generation)
+				self.operation = getattr(await self.lanbilling_rpc.rpc(), self.method_name)
+				self.generation = self.lanbilling_rpc.generation()
+				return await self.operation(*args, **kwargs)
+
+	@verify_type(concurrency=int)
+	@verify_value(concurrency=lambda x: x > 0)
+	def __init__(
+		self, hostname=None, login=None, password=None, wsdl_url=None, soap_proxy=False,
+		soap_proxy_service=None, soap_proxy_address=None, wsdl_cache=None, transport_settings=None,
+		concurrency=10
+	):
+		WLanbillingRPCSettings.__init__(
+			self, hostname=hostname, login=login, password=password, wsdl_url=wsdl_url, soap_proxy=soap_proxy,
+			soap_proxy_service=soap_proxy_service, soap_proxy_address=soap_proxy_address, wsdl_cache=wsdl_cache,
+			transport_settings=transport_settings
+		)
+		self.__concurrency = concurrency
+		self.__semaphore = asyncio.Semaphore(concurrency)
+		self.__connect_lock = asyncio.Lock()
+		self.__http_client = None
+		self.__wsdl_client = None
+		self.__client = None
+		self.__service = None
+		self.__methods = {}
+		self.__generation = 0
+
+	def concurrency(self):
+		return self.__concurrency
+
+	def semaphore(self):
+		return self.__semaphore
+
+	def soap_client(self):
+		return self.__client
+
+	def soap_proxy(self):
+		return self.__service
+
+	def http_client(self):
+		if httpx is None:
+			raise RuntimeError('"httpx" module is required for the asynchronous client (the "async" extra)')
+
+		if self.__http_client is None:
+			self.__http_client = httpx.AsyncClient(
+				timeout=self.transport_settings().operation_timeout(),
+				limits=httpx.Limits(
+					max_connections=self.__concurrency, max_keepalive_connections=self.__concurrency
+				)
+			)
+		return self.__http_client
+
+	def wsdl_client(self):
+		# WSDL documents are loaded by a synchronous client
+		if httpx is None:
+			raise RuntimeError('"httpx" module is required for the asynchronous client (the "async" extra)')
+
+		if self.__wsdl_client is None:
+			self.__wsdl_client = httpx.Client(timeout=self.transport_settings().timeout())
+		return self.__wsdl_client
+
+	async def connect(self):
+		await self.close()
+		http_client = self.http_client()
+		http_client.cookies.clear()
+
+		settings = self.transport_settings()
+		wsdl_cache = self.wsdl_cache()
+		transport = AsyncSOAPTransport(
+			client=http_client, wsdl_client=self.wsdl_client(), timeout=settings.timeout(),
+			operation_timeout=settings.operation_timeout(),
+			cache=(wsdl_cache.raw_cache() if wsdl_cache is not None else None)
+		)
+		# the transport replaces headers of both clients
+		for client in (http_client, transport.wsdl_client):
+			client.headers['Accept-Encoding'] = 'gzip, deflate' if settings.compression() is True else 'identity'
+
+		if wsdl_cache is not None:
+			self.__client = AsyncSOAPClient(wsdl_cache.document(self.wsdl_url(), transport), transport=transport)
+		else:
+			self.__client = AsyncSOAPClient(self.wsdl_url(), transport=transport)
+		proxy_address = self.proxy_address()
+		proxy_service = self.proxy_service()
+
+		if proxy_address is not None and proxy_service is not None:
+			self.__service = AsyncServiceProxy(
+				self.__client, self.__client.wsdl.bindings[proxy_service], address=proxy_address
+			)
+		await self._rpc().Login(self.login(), self.password())
+		self.__generation += 1
+
+	def generation(self):
+		return self.__generation
+
+	async def reconnect(self, generation):
+		async with self.__connect_lock:
+			if self.__generation == generation:
+				await self.connect()
+		return self.__generation
+
+	def _rpc(self):
+		if self.__service is not None:
+			return self.__service
+		if self.__client is not None:
+			return self.__client.service
+		raise RuntimeError('RPC call before connect')
+
+	async def close(self):
+		for method_name in self.__methods:
+			self.__dict__.pop(method_name, None)
+		self.__methods.clear()
+		try:
+			if self.__client is not None:
+				await self._rpc().Logout()
+		finally:
+			self.__client = None
+			self.__service = None
+
+	async def aclose(self):
+		try:
+			await self.close()
+		finally:
+			if self.__http_client is not None:
+				await self.__http_client.aclose()
+				self.__http_client = None
+			if self.__wsdl_client is not None:
+				self.__wsdl_client.close()
+				self.__wsdl_client = None
+
+	async def rpc(self):
+		if self.__client is None:
+			async with self.__connect_lock:
+				if self.__client is None:
+					await self.connect()
+		return self._rpc()
+
+	def __getattr__(self, item):
+		if item.startswith('_'):
+			raise AttributeError(item)
+		method = WLanbillingAsyncRPC.MethodProxy(self, item)
+		self.__methods[item] = method
+		self.__dict__[item] = method
+		return method
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		await self.aclose()
+
+	@classmethod
+	@verify_type(rpc=WLanbillingRPC, concurrency=int)
+	@verify_value(concurrency=lambda x: x > 0)
+	def from_rpc(cls, rpc, concurrency=10):
+		return cls(concurrency=concurrency, **rpc.settings())
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str, password_prompt=bool, concurrency=(int, None))
+	@verify_value(section_name=lambda x: len(x) > 0, concurrency=lambda x: x is None or x > 0)
+	def from_configuration(cls, config, section_name, password_prompt=False, concurrency=None):
+		settings = cls.settings_from_configuration(config, section_name, password_prompt=password_prompt)
+
+		if concurrency is None:
+			concurrency = 10
+			if config.has_option(section_name, 'async_concurrency') is True:
+				value = config[section_name]['async_concurrency'].strip()
+				if len(value) > 0:
+					concurrency = int(value)
+
+		return cls(concurrency=concurrency, **settings)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/cassette.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import io
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import deque
+
+from lxml import etree
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from zeep.transports import Transport as SOAPTransport
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+
+class WRPCCassette:
+
+	modes = ('record', 'replay')
+
+	@verify_type(filename=str, mode=str, latency_factor=(int, float))
+	@verify_value(filename=lambda x: len(x) > 0, mode=lambda x: x in WRPCCassette.modes)
+	@verify_value(latency_factor=lambda x: x >= 0)
+	def __init__(self, filename, mode='replay', latency_factor=0):
+		self.__filename = filename
+		self.__mode = mode
+		self.__latency_factor = latency_factor
+		self.__lock = threading.Lock()
+		self.__fd = None
+		self.__pid = None
+
+		self.__loads = {}
+		self.__requests = {}
+		self.__operations = {}
+		self.__last_responses = {}
+
+		if mode == 'replay':
+			self.__load(filename)
+		else:
+			# a new recording replaces the previous one
+			self.__fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o644)
+			self.__pid = os.getpid()
+
+	def filename(self):
+		return self.__filename
+
+	def mode(self):
+		return self.__mode
+
+	def latency_factor(self):
+		return self.__latency_factor
+
+	@staticmethod
+	def request_digest(message):
+		if isinstance(message, str) is True:
+			message = message.encode()
+		return hashlib.sha1(message).hexdigest()
+
+	@staticmethod
+	def operation_name(message):
+		try:
+			envelope = etree.fromstring(message)
+		except etree.XMLSyntaxError:
+			return None
+		for element in envelope:
+			if etree.QName(element).localname == 'Body' and len(element) > 0:
+				return etree.QName(element[0]).localname
+		return None
+
+	@staticmethod
+	def __encode_content(content):
+		try:
+			return {'content': content.decode('utf-8')}
+		except UnicodeDecodeError:
+			return {'content_base64': base64.b64encode(content).decode('ascii')}
+
+	@staticmethod
+	def __decode_content(record):
+		if 'content_base64' in record:
+			return base64.b64decode(record['content_base64'])
+		return record['content'].encode('utf-8')
+
+	def __load(self, filename):
+		records = []
+		with gzip.open(filename, 'rt', encoding='utf-8') as f:
+			try:
+				for line in f:
+					records.append(json.loads(line))
+			except (EOFError, OSError, ValueError):
+				# the last record may be truncated by a crash
+				pass
+
+		for record in records:
+			if record['kind'] == 'load':
+				self.__loads[record['url']] = self.__decode_content(record)
+			else:
+				self.__requests.setdefault(record['digest'], deque()).append(record)
+				self.__operations.setdefault(record['operation'], deque()).append(record)
+
+	def __write(self, record):
+		# every record is a separate gzip member that is appended by a single write call, so records of threads
+		# and forked processes do not interleave and a crash loses the last record only
+		data = gzip.compress((json.dumps(record, sort_keys=True) + '\n').encode('utf-8'))
+		with self.__lock:
+			if self.__fd is None or self.__pid != os.getpid():
+				self.__fd = os.open(self.__filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+				self.__pid = os.getpid()
+			os.write(self.__fd, data)
+
+	def record_load(self, url, content):
+		record = {'kind': 'load', 'url': url}
+		record.update(self.__encode_content(content))
+		self.__write(record)
+
+	def record_post(self, address, message, response, latency):
+		record = {
+			'kind': 'post',
+			'address': address,
+			'operation': self.operation_name(message),
+			'digest': self.request_digest(message),
+			'status': response.status_code,
+			'headers': {'Content-Type': response.headers.get('Content-Type', 'text/xml')},
+			'latency': latency
+		}
+		record.update(self.__encode_content(response.content))
+		self.__write(record)
+
+	def replay_load(self, url):
+		content = self.__loads.get(url)
+		if content is None:
+			raise RuntimeError('Cassette "%s" does not have the "%s" document' % (self.__filename, url))
+		return content
+
+	@staticmethod
+	def __take(queue):
+		while len(queue) > 0:
+			record = queue.popleft()
+			if record.get('replayed') is not True:
+				record['replayed'] = True
+				return record
+		return None
+
+	def replay_post(self, address, message):
+		digest = self.request_digest(message)
+		with self.__lock:
+			# the same request is answered with the recorded responses in order (and with the last one when they
+			# are over). A request that was not recorded (it has a timestamp or other volatile data inside) gets
+			# the next recorded response of the same operation
+			record = self.__take(self.__requests.get(digest, deque()))
+			if record is None:
+				record = self.__last_responses.get(digest)
+			if record is None:
+				operation_name = self.operation_name(message)
+				record = self.__take(self.__operations.get(operation_name, deque()))
+				if record is None:
+					raise RuntimeError(
+						'Cassette "%s" does not have a response for the "%s" operation' %
+						(self.__filename, operation_name)
+					)
+			self.__last_responses[digest] = record
+
+		if self.__latency_factor > 0:
+			time.sleep(record['latency'] * self.__latency_factor)
+
+		response = Response()
+		response.status_code = record['status']
+		response.headers = CaseInsensitiveDict(record['headers'])
+		response.raw = io.BytesIO(self.__decode_content(record))
+		response.url = address
+		return response
+
+	def close(self):
+		with self.__lock:
+			if self.__fd is not None and self.__pid == os.getpid():
+				os.close(self.__fd)
+			self.__fd = None
+			self.__pid = None
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str)
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def from_configuration(cls, config, section_name):
+		if config.has_option(section_name, 'rpc_cassette') is False:
+			return None
+		filename = config[section_name]['rpc_cassette'].strip()
+		if len(filename) == 0:
+			return None
+
+		kwargs = {}
+		if config.has_option(section_name, 'rpc_cassette_mode') is True:
+			value = config[section_name]['rpc_cassette_mode'].strip()
+			if len(value) > 0:
+				kwargs['mode'] = value
+		if config.has_option(section_name, 'rpc_cassette_latency') is True:
+			value = config[section_name]['rpc_cassette_latency'].strip()
+			if len(value) > 0:
+				kwargs['latency_factor'] = float(value)
+
+		return cls(filename, **kwargs)
+
+
+class WCassetteTransport(SOAPTransport):
+
+	@verify_type(cassette=WRPCCassette)
+	def __init__(self, cassette, **kwargs):
+		SOAPTransport.__init__(self, **kwargs)
+		self.__cassette = cassette
+
+	def cassette(self):
+		return self.__cassette
+
+	def load(self, url):
+		if self.__cassette.mode() == 'replay':
+			return self.__cassette.replay_load(url)
+		content = SOAPTransport.load(self, url)
+		self.__cassette.record_load(url, content)
+		return content
+
+	def post(self, address, message, headers):
+		if self.__cassette.mode() == 'replay':
+			return self.__cassette.replay_post(address, message)
+
+		started_at = time.monotonic()
+		response = SOAPTransport.post(self, address, message, headers)
+		self.__cassette.record_post(address, message, response, time.monotonic() - started_at)
+		return response
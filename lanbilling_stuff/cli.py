@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/cli.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import argparse
+import importlib
+
+
+# subcommand name and the module that implements it (see lanbilling_stuff/commands/__init__.py)
+lanbilling_commands = (
+	('vgroups', 'lanbilling_stuff.commands.vgroups'),
+	('tariffs', 'lanbilling_stuff.commands.tariffs'),
+	('update-vgroups', 'lanbilling_stuff.commands.update_vgroups'),
+	('migrate-vgroups', 'lanbilling_stuff.commands.migrate_vgroups'),
+	('clone-tariffs', 'lanbilling_stuff.commands.clone_tariffs'),
+	('snapshot', 'lanbilling_stuff.commands.snapshot'),
+	('wsdl-cache', 'lanbilling_stuff.commands.wsdl_cache')
+)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+		prog='lanbilling', description='Lanbilling scripts. Configuration file is set by the LANBILLING_CONFIG '
+		'environment variable'
+	)
+	parser.add_argument('--version', action='version', version=__version__)
+	subparsers = parser.add_subparsers(dest='command', metavar='command')
+	subparsers.required = True
+
+	for command_name, module_name in lanbilling_commands:
+		command = importlib.import_module(module_name)
+		command_parser = subparsers.add_parser(
+			command_name, help=command.summary, description=command.description
+		)
+		command.arguments(command_parser)
+		command_parser.set_defaults(run=command.run)
+
+	args = parser.parse_args(argv)
+	args.run(args)
+
+
+def script(command):
+	# entry point of the standalone scripts (vgroups.py, tariffs.py and so on)
+	parser = argparse.ArgumentParser(description=command.description)
+	command.arguments(parser)
+	command.run(parser.parse_args())
+
+
+if __name__ == '__main__':
+	main()
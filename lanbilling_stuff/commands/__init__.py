@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/__init__.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+# Every command module has "summary" and "description" strings, "arguments(parser)" and "run(args)" functions.
+# Modules of this package are imported by the "lanbilling" entry point just to build the arguments parser, so
+# zeep, wasp_general and RPC modules must be imported inside "run" functions only
+
+import os
+import sys
+import logging
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+
+
+def vgroup_selection_args(parser, action, archive_flags=True):
+	group = parser.add_argument_group('vgroups selection')
+	group.add_argument(
+		'--from-tar-id', help='start tarid (tariff\'s id) number. '
+		'Only those vgroups that are assigned to specified tariffs will be %s' % action,
+		**lanbilling_scripts_args['--from-tar-id']
+	)
+	group.add_argument(
+		'--to-tar-id', help='end tarid (tariff\'s id)  number. '
+		'Only those vgroups that are assigned to specified tariffs will be %s' % action,
+		**lanbilling_scripts_args['--to-tar-id']
+	)
+	group.add_argument(
+		'--from-vg-id', help='start vg_id (vgroup\'s id) number. '
+		'Only those vgroups whose id are inside the selection will be %s' % action,
+		**lanbilling_scripts_args['--from-vg-id']
+	)
+	group.add_argument(
+		'--to-vg-id', help='end vg_id (vgroup\'s id) number. '
+		'Only those vgroups whose id are inside the selection will be %s' % action,
+		**lanbilling_scripts_args['--to-vg-id']
+	)
+	group.add_argument(
+		'--login',
+		help='login pattern to search for. '
+		'Only those vgroups whose login has the specified substring will be %s' % action,
+		**lanbilling_scripts_args['--login']
+	)
+	group.add_argument(
+		'--vgroup-agent-id', help='vgroup agent id. '
+		'Only those vgroups that are belongs to the specified agent will be %s' % action,
+		**lanbilling_scripts_args['--vgroup-agent-id']
+	)
+
+	if archive_flags is True:
+		archive_group = group.add_mutually_exclusive_group()
+		archive_group.add_argument(
+			'--archived-vgroups', help='Select archived vgroups only',
+			**lanbilling_scripts_args['--archived-vgroups']
+		)
+		archive_group.add_argument(
+			'--non-archived-vgroups', help='Select vgroups that are not archived',
+			**lanbilling_scripts_args['--non-archived-vgroups']
+		)
+
+
+def tariff_selection_args(parser, action):
+	group = parser.add_argument_group('tariffs selection')
+	group.add_argument(
+		'--from-tar-id', help='start tarid (tariff\'s id) number. '
+		'Only those tariffs whose id are inside the selection will be %s' % action,
+		**lanbilling_scripts_args['--from-tar-id']
+	)
+	group.add_argument(
+		'--to-tar-id', help='end tarid (tariff\'s id)  number. '
+		'Only those tariffs whose id are inside the selection will be %s' % action,
+		**lanbilling_scripts_args['--to-tar-id']
+	)
+	group.add_argument(
+		'--from-vg-id', help='start vg_id (vgroup\'s id) number. '
+		'Only those tariffs that are assigned to specified vgroups will be %s' % action,
+		**lanbilling_scripts_args['--from-vg-id']
+	)
+	group.add_argument(
+		'--to-vg-id', help='end vg_id (vgroup\'s id) number. '
+		'Only those tariffs that are assigned to specified vgroups will be %s' % action,
+		**lanbilling_scripts_args['--to-vg-id']
+	)
+	group.add_argument(
+		'--login',
+		help='login pattern to search for. Only assigned tariffs will be selected. '
+		'Vgroup to which tariff is assigned must have the specified substring inside login string',
+		**lanbilling_scripts_args['--login']
+	)
+	group.add_argument(
+		'--vgroup-agent-id', help='vgroup agent id.  Only assigned tariffs will be selected. '
+		'Vgroup to which tariff is assigned must belong to the specified agent',
+		**lanbilling_scripts_args['--vgroup-agent-id']
+	)
+
+	archive_group = group.add_mutually_exclusive_group()
+	archive_group.add_argument(
+		'--archived-vgroups', help='Select tariffs that are assigned to archived vgroups only',
+		**lanbilling_scripts_args['--archived-vgroups']
+	)
+	archive_group.add_argument(
+		'--non-archived-vgroups', help='Select tariffs that are assigned to vgroups which are not archived',
+		**lanbilling_scripts_args['--non-archived-vgroups']
+	)
+
+
+def diagnostic_args(parser):
+	group = parser.add_argument_group('diagnostics')
+	group.add_argument(
+		'--verbose', help='print diagnostic messages (like the chosen vgroups query plan) to stderr',
+		**lanbilling_scripts_args['--verbose']
+	)
+	group.add_argument(
+		'--metrics', help='file to which per-method RPC metrics are written at exit and on SIGUSR1 signal',
+		**lanbilling_scripts_args['--metrics']
+	)
+	group.add_argument(
+		'--metrics-format', help='format of the metrics file (default: json)',
+		**lanbilling_scripts_args['--metrics-format']
+	)
+
+
+def archive_flag(args):
+	if args.archived_vgroups is True:
+		return True
+	elif args.non_archived_vgroups is True:
+		return False
+	return None
+
+
+def check_selection(args):
+	if args.from_tar_id is not None and args.to_tar_id is not None:
+		if args.from_tar_id > args.to_tar_id:
+			raise ValueError('"from-tar-id" is greater then "to-tar-id"')
+
+	if args.from_vg_id is not None and args.to_vg_id is not None:
+		if args.from_vg_id > args.to_vg_id:
+			raise ValueError('"from-vg-id" is greater then "to-vg-id"')
+
+
+def check_positive(args, *arg_names):
+	for arg_name in arg_names:
+		arg_value = getattr(args, arg_name)
+		if arg_value is not None and arg_value < 1:
+			raise ValueError('"%s" must be a positive number' % arg_name.replace('_', '-'))
+
+
+def start_session(args, password_prompt=True):
+	from wasp_general.config import WConfig
+	from lanbilling_stuff.rpc import WLanbillingRPC
+	from lanbilling_stuff.metrics import WRPCMetrics
+	from lanbilling_stuff.rpc_pool import WLanbillingRPCPool
+
+	if getattr(args, 'verbose', False) is True:
+		logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+	config = WConfig()
+	config.merge(os.environ['LANBILLING_CONFIG'])
+
+	# "--jobs" option takes precedence over the "rpc_pool_size" option
+	if hasattr(args, 'jobs') is True and args.jobs is None:
+		args.jobs = WLanbillingRPCPool.size_from_configuration(config, 'lanbilling')
+
+	metrics = None
+	if getattr(args, 'metrics', None) is not None:
+		metrics = WRPCMetrics()
+		metrics.dump_on_signal(args.metrics, dump_format=args.metrics_format)
+
+	rpc = WLanbillingRPC.from_configuration(config, 'lanbilling', password_prompt=password_prompt, metrics=metrics)
+	return rpc, metrics
+
+
+def concurrency_status(rpc):
+	limiter = rpc.concurrency_limiter()
+	if limiter is None or limiter.limit() is None:
+		return None
+	return 'RPC concurrency limit - %i (minimum - %i, %i calls in flight)' % (
+		limiter.limit(), limiter.min_limit(), limiter.in_flight()
+	)
+
+
+def dump_metrics(args, metrics):
+	if metrics is not None:
+		metrics.dump(args.metrics, dump_format=args.metrics_format)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/clone_tariffs.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+from lanbilling_stuff.commands import tariff_selection_args, diagnostic_args, archive_flag, check_selection
+from lanbilling_stuff.commands import check_positive, start_session, dump_metrics
+
+
+summary = 'clone tariffs to other tariff type'
+description = (
+	'Tariffs agent cloning tool. This script clones tariffs from one tariff type to other. '
+	'If there is a tariff which is equal to the copying one nothing is done. Two tariffs are equal when '
+	'theirs parameters (except "tarid", "type", "descr", "descrfull", "used" and "uuid") are equal. '
+	'If --target-tariff-prefix is specified, then destination tariff must have it. Two tariff '
+	'does not meant equal if destination tariff does not have the specified prefix. Current implementation '
+	'is able to clone not-archived primary tariffs without time/size limitations, without assigned '
+	'"catalogs" only.'
+)
+
+
+def arguments(parser):
+	parser.add_argument(
+		'--destination-tariff-type', help='Destination tariff type to which tariff must be cloned', type=int,
+		metavar='tariff_type', required=True
+	)
+
+	parser.add_argument(
+		'--destination-tariff-prefix', help='Prefix that should be added to newly created tariffs',
+		type=str, nargs='?', metavar='prefix', default=None
+	)
+
+	parser.add_argument(
+		'--export-report', help='Whether to export verbose result to csv-file or not',
+		type=str, nargs='?', metavar='filename', default=None
+	)
+
+	tariff_selection_args(parser, 'cloned')
+
+	parser.add_argument(
+		'--jobs', help='number of parallel sessions that are used for fetching tariffs. '
+		'Tariffs are fetched one by one if this option is omitted and "rpc_pool_size" option is not set',
+		**lanbilling_scripts_args['--jobs']
+	)
+
+	parser.add_argument(
+		'--plan', help='do not clone anything, but fetch every tariff once and print what would be done. '
+		'Report (see --export-report) will have the action for every selected tariff',
+		**lanbilling_scripts_args['--plan']
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	check_selection(args)
+	check_positive(args, 'jobs')
+
+	from lanbilling_stuff.tariff import fetch_tariffs, TariffPrefixCloneGenerator, vgroups_required
+	from lanbilling_stuff.tariff import filter_tariff_ids
+	from lanbilling_stuff.vgroup import fetch_vgroups
+
+	archived_vgroups = archive_flag(args)
+	rpc, metrics = start_session(args)
+
+	def plan_cloning():
+		print('Fetching tariffs')
+		tariffs = list(fetch_tariffs(rpc, max_workers=args.jobs))
+		print('%i tariffs was fetched' % len(tariffs))
+		tariffs_by_id = {x['tarif']['tarid']: x for x in tariffs}
+
+		if vgroups_required(
+			from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id, login=args.login,
+			vgroup_agent_id=args.vgroup_agent_id, archived_vgroups=archived_vgroups
+		) is True:
+			print('Fetching vgroups')
+			source_ids = set(map(lambda x: x['tarid'], fetch_vgroups(
+				rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id,
+				from_tar_id=args.from_tar_id, to_tar_id=args.to_tar_id,
+				login=args.login, vgroup_agent_id=args.vgroup_agent_id, archived_vgroups=archived_vgroups
+			)))
+		else:
+			source_ids = set(filter_tariff_ids(
+				tariffs_by_id.keys(), from_tar_id=args.from_tar_id, to_tar_id=args.to_tar_id
+			))
+		source_tariffs = [tariffs_by_id[x] for x in sorted(source_ids) if x in tariffs_by_id]
+		print('%i tariffs are selected' % len(source_tariffs))
+
+		c_generator = TariffPrefixCloneGenerator(
+			rpc, args.destination_tariff_type, prefix=args.destination_tariff_prefix, tariffs=tariffs
+		)
+		print('%i tariffs with destination type was found' % len(c_generator.current_tariffs()))
+
+		counts = c_generator.plan(source_tariffs, report_filename=args.export_report)
+		print('Tariffs with destination type already: %i' % counts['same_type'])
+		print('Tariffs with equal destination tariff: %i' % counts['equal'])
+		print('Tariffs to clone: %i' % counts['clone'])
+		print('Unsupported tariffs: %i' % counts['unsupported'])
+		if counts['unsupported'] > 0:
+			print('Cloning will stop at the first unsupported tariff')
+
+		# source ids request, getTarif for every selected tariff, getTarifs and getTarif for every tariff
+		# that is checked for the destination type and insupdTarif for every clone
+		read_calls = 1 + len(source_ids) + 1 + len(tariffs)
+		print('Estimated RPC calls: %i (%i of them are writes)' % (read_calls + counts['clone'], counts['clone']))
+
+	try:
+		if args.plan is True:
+			plan_cloning()
+		else:
+			print('Fetching source tariffs')
+			source_tariffs = list(fetch_tariffs(
+				rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id,
+				from_tar_id=args.from_tar_id, to_tar_id=args.to_tar_id,
+				login=args.login, vgroup_agent_id=args.vgroup_agent_id, archived_vgroups=archived_vgroups,
+				max_workers=args.jobs
+			))
+			print('%i selected tariffs was fetched' % len(source_tariffs))
+			c_generator = TariffPrefixCloneGenerator(
+				rpc, args.destination_tariff_type, prefix=args.destination_tariff_prefix, max_workers=args.jobs
+			)
+			print('%i tariffs with destination type was fetched' % len(c_generator.current_tariffs()))
+			c_generator.clone(source_tariffs, report_filename=args.export_report)
+
+	finally:
+		dump_metrics(args, metrics)
+		response_cache = rpc.response_cache()
+		if response_cache is not None:
+			print(
+				'RPC response cache: %i hits, %i misses' % (response_cache.hits(), response_cache.misses())
+			)
+		rpc.rpc().Logout()
@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/migrate_vgroups.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+from datetime import datetime
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+from lanbilling_stuff.records import payload_value
+from lanbilling_stuff.commands import vgroup_selection_args, diagnostic_args, check_selection, check_positive
+from lanbilling_stuff.commands import start_session, dump_metrics, concurrency_status
+
+
+summary = 'migrate vgroups to other agent'
+description = (
+	'Vgroups agent migration tool. This script migrates vgroups to other agent (vgroup must '
+	'not be archived). If vgroup has been already assigned to the agent then nothing is done to that '
+	'vgroup.'
+)
+
+
+def supported_vgroup(vgroup):
+	for attr in ('services', 'addons', 'macstaff', 'telstaff', 'staff', 'blockrasp', 'tarrasp'):
+		if len(vgroup[attr]) > 0:
+			print('Vgroup attribute "%s" has invalid value - %s' % (attr, payload_value(vgroup[attr])))
+			return False
+	if vgroup['vgroup']['parentvgid'] != 0:
+		return False
+	if vgroup['vgroup']['blocked'] != 0:
+		return False
+	elif vgroup['vgroup']['parentvglogin'] is not None:
+		return False
+	elif vgroup['vgroup']['dirty'] != 0:
+		return False
+	return True
+
+
+def migration_action(destination_tariffs, tariff):
+	# the migration and its plan choose the destination tariff the same way. A tariff of the destination type is
+	# not used as is, an equal one is searched (with the prefix, if it is specified)
+	if destination_tariffs.supported_tariff(tariff) is False:
+		return 'unsupported_tariff', None
+	equal_tariff = destination_tariffs.find_equal(tariff)
+	if equal_tariff is None:
+		return 'no_analog', None
+	return 'migrate', equal_tariff
+
+
+def arguments(parser):
+	parser.add_argument(
+		'--destination-agent-id', help='Destination agent id to which vgroups must be migrated', type=int,
+		metavar='agent_id', required=True
+	)
+	parser.add_argument(
+		'--destination-tariff-type', help='Type of tariff that should be assigned to destination vgroups',
+		type=int, metavar='tariff_type', required=True
+	)
+	parser.add_argument(
+		'--destination-tariff-prefix', help='Prefix of tariff that should have tariff, that are assigned to '
+		'destination vgroups', type=str, metavar='tariff_type', default=None
+	)
+	parser.add_argument(
+		'--export-report', help='Whether to export verbose result to csv-file or not',
+		type=str, nargs='?', metavar='filename', default=None
+	)
+
+	vgroup_selection_args(parser, 'migrated', archive_flags=False)
+
+	parser.add_argument(
+		'--jobs', help='number of parallel sessions that are used for fetching tariffs. '
+		'Tariffs are fetched one by one if this option is omitted and "rpc_pool_size" option is not set',
+		**lanbilling_scripts_args['--jobs']
+	)
+
+	parser.add_argument(
+		'--shards', help='split the selected vgroups (they are fetched once) into the specified number of parts and '
+		'migrate each part in a separate process (with a separate session). Reports and RPC metrics are merged. '
+		'Every process has its own RPC concurrency limit (see "rpc_concurrency_max" option)',
+		**lanbilling_scripts_args['--shards']
+	)
+
+	parser.add_argument(
+		'--journal', help='append-only file where every completed migration step is saved. With this file an '
+		'interrupted migration may be resumed (see --resume)', type=str, metavar='filename', default=None
+	)
+	parser.add_argument(
+		'--resume', help='skip vgroups that are completed according to the journal and continue half-migrated '
+		'vgroups from the step where they stopped', action='store_true'
+	)
+
+	parser.add_argument(
+		'--plan', help='do not migrate anything, but fetch every required dataset once and print what would be '
+		'done. Report (see --export-report) will have the action for every selected vgroup',
+		**lanbilling_scripts_args['--plan']
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	if args.destination_agent_id == args.vgroup_agent_id:
+		print('Target agent id and vgroup agent id has the same value - nothing more can be done here')
+		sys.exit(0)
+
+	check_selection(args)
+	check_positive(args, 'jobs', 'shards')
+
+	if args.plan is True and (args.journal is not None or (args.shards is not None and args.shards > 1)):
+		raise ValueError('"plan" option can not be used with "journal" or "shards" options')
+
+	if args.resume is True and args.journal is None:
+		raise ValueError('"resume" option requires a journal')
+
+	from wasp_general.csv import WCSVExporter
+	from lanbilling_stuff.tariff import fetch_tariffs, assign_tariff, TariffPrefixCloneGenerator
+	from lanbilling_stuff.vgroup import fetch_vgroups, fetch_vgroup_details, fetch_vgroups_details, disable_vgroup
+	from lanbilling_stuff.vgroup import unblock_vgroup
+	from lanbilling_stuff.shards import WVgroupShards, vgroup_shards
+	from lanbilling_stuff.journal import WMigrationJournal
+
+	journal = None
+	if args.journal is not None:
+		journal = WMigrationJournal(args.journal)
+		if journal.records() > 0 and args.resume is False:
+			raise ValueError(
+				'Journal "%s" has records of the previous migration. Use "resume" option to continue it' %
+				args.journal
+			)
+
+	rpc, metrics = start_session(args)
+
+	filters = {
+		'from_tar_id': args.from_tar_id, 'to_tar_id': args.to_tar_id, 'login': args.login,
+		'vgroup_agent_id': args.vgroup_agent_id, 'archived_vgroups': False
+	}
+
+	def fetch_source_vgroups():
+		print('Fetching source vgroups')
+		source_vgroups = list(fetch_vgroups(rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id, **filters))
+		print('%i selected vgroups was fetched' % len(source_vgroups))
+		return source_vgroups
+
+	def migrate_vgroups(rpc_obj, exporter, source_vgroups):
+		def journal_step(vg_id, step, sync=False, **data):
+			if journal is not None:
+				journal.record(vg_id, step, sync=sync, **data)
+
+		for source_v in source_vgroups:
+			source_id = source_v['vgid']
+			source_agent_id = source_v['id']
+			tariff_id = source_v['tarid']
+
+			progress = journal.progress(source_id) if journal is not None else None
+			if progress is not None and journal.finished(source_id) is True:
+				print('Vgroup with vgid=%i was processed already (step "%s")' % (source_id, progress['step']))
+				continue
+
+			migration_report = {
+				'source_vgid': source_id, 'source_id': source_agent_id, 'source_tarid': tariff_id,
+				'skipped': None, 'supported': None, 'equal_tarid': None, 'result_vgid': None
+			}
+
+			if progress is None:
+				print('Migrating vgroup with vgid=%i' % source_id)
+
+				if source_agent_id == target_agent['id']:
+					print('Vgroup is at the specified agent already')
+					migration_report.update({
+						'skipped': True,
+						'supported': None,
+						'equal_tarid': None,
+						'result_vgid': source_id
+					})
+					exporter.export(migration_report)
+					journal_step(source_id, 'skipped', reason='same_agent')
+					continue
+
+				full_source_v = fetch_vgroup_details(rpc_obj, source_id)
+				assert(len(full_source_v) == 1)
+				full_source_v = full_source_v[0]
+				if supported_vgroup(full_source_v) is False:
+					print('Unsupported vgroup (vg_id=%i) spotted. Skipping' % source_id)
+					migration_report.update({
+						'skipped': True,
+						'supported': False,
+						'equal_tarid': None,
+						'result_vgid': None
+					})
+					exporter.export(migration_report)
+					journal_step(source_id, 'skipped', reason='unsupported')
+					continue
+				migration_report['supported'] = True
+
+				current_tariff = list(fetch_tariffs(rpc_obj, from_tar_id=tariff_id, to_tar_id=tariff_id))
+				assert(len(current_tariff) == 1)
+				current_tariff = current_tariff[0]
+				print('Current tariff (with tarid=%i) was found for vgroup (vgid=%i)' % (tariff_id, source_id))
+
+				action, equal_tariff = migration_action(destination_tariffs, current_tariff)
+				if action == 'unsupported_tariff':
+					raise ValueError('Unsupported tariff spotted (tar_id=%i)' % tariff_id)
+				if equal_tariff is None:
+					print(
+						'Unable to migrate vgroup (vgid=%i). Tariff with tarid=%i does not have '
+						'suitable analog' % (source_id, tariff_id)
+					)
+					migration_report.update({
+						'skipped': True,
+						'equal_tarid': None,
+						'result_vgid': None
+					})
+					exporter.export(migration_report)
+					journal_step(source_id, 'skipped', reason='no_analog')
+					continue
+
+				equal_tariff_id = equal_tariff['tarif']['tarid']
+				print(
+					'Equal tariff found (tarid=%i) for vgroup with vgid=%i (original tarid=%i)' %
+					(equal_tariff_id, source_id, tariff_id)
+				)
+				step = None
+			else:
+				print('Resuming migration of vgroup with vgid=%i (last step - "%s")' % (source_id, progress['step']))
+				if progress['agentid'] != target_agent['id']:
+					raise RuntimeError(
+						'Vgroup (vgid=%i) was being migrated to other agent (id=%i)' %
+						(source_id, progress['agentid'])
+					)
+				migration_report['supported'] = True
+				equal_tariff_id = progress['equal_tarid']
+				step = progress['step']
+				if step in ('disabled', 'renamed'):
+					full_source_v = fetch_vgroup_details(rpc_obj, source_id)
+					assert(len(full_source_v) == 1)
+					full_source_v = full_source_v[0]
+
+			migration_report['skipped'] = False
+			migration_report['equal_tarid'] = equal_tariff_id
+
+			if step is None:
+				disable_vgroup(rpc_obj, source_id, target_agent['id'])
+				journal_step(
+					source_id, 'disabled', agentid=target_agent['id'], equal_tarid=equal_tariff_id,
+					login=full_source_v['vgroup']['login']
+				)
+				print('Vgroup (vgid=%i) was disabled' % source_id)
+				step = 'disabled'
+
+			original_login = (
+				journal.progress(source_id)['login'] if journal is not None else full_source_v['vgroup']['login']
+			)
+
+			if step == 'disabled':
+				disabled_login = original_login + '-disabled-' + datetime.now().isoformat()
+				disabled_v = full_source_v.payload()
+				disabled_v['vgroup']['login'] = disabled_login
+				rpc_obj.insupdVgroup(0, disabled_v)
+				journal_step(source_id, 'renamed', disabled_login=disabled_login)
+				print('Vgroup (vgid=%i) login was renamed to "%s"' % (source_id, disabled_login))
+				step = 'renamed'
+
+			if step == 'renamed':
+				new_vgroup_id = None
+				if progress is not None:
+					# the previous run could die right after the vgroup was created
+					for vgroup in fetch_vgroups(rpc_obj, login=original_login, vgroup_agent_id=target_agent['id']):
+						if vgroup['login'] == original_login:
+							new_vgroup_id = vgroup['vgid']
+							print('Vgroup (vgid=%i) was created by the previous run' % new_vgroup_id)
+							break
+
+				if new_vgroup_id is None:
+					new_v = full_source_v.payload()
+					new_v['vgroup']['login'] = original_login
+					new_v['vgroup']['vgid'] = 0
+					new_v['vgroup']['id'] = target_agent['id']
+					new_v['vgroup']['tarid'] = 0
+					del new_v['vgroup']['uid']
+					new_v['agentname'] = target_agent['name']
+					new_vgroup_id = rpc_obj.insupdVgroup(0, new_v)
+					print('New vgroup created with vgid=%i (previous value - %i)' % (new_vgroup_id, source_id))
+				journal_step(source_id, 'created', sync=True, result_vgid=new_vgroup_id)
+				step = 'created'
+			else:
+				new_vgroup_id = progress['result_vgid']
+
+			migration_report['result_vgid'] = new_vgroup_id
+			exporter.export(migration_report)
+
+			if step == 'created':
+				assign_tariff(rpc_obj, new_vgroup_id, target_agent['id'], equal_tariff_id)
+				journal_step(source_id, 'tariff_assigned')
+				print('Tariff (tarid=%i) was assigned to vgroup (vgid=%i)' % (equal_tariff_id, new_vgroup_id))
+				step = 'tariff_assigned'
+
+			if step == 'tariff_assigned':
+				unblock_vgroup(rpc_obj, new_vgroup_id, target_agent['id'])
+				journal_step(source_id, 'unblocked')
+				print('New vgroup (vgid=%i) was unblocked' % new_vgroup_id)
+
+			print('Vgroup (vg_id=%i) was migrated to other agent (new vg_id=%i)' % (source_id, new_vgroup_id))
+
+	def shard_worker(source_vgroups, output_obj):
+		shard_rpc = rpc.clone()
+		try:
+			migrate_vgroups(shard_rpc, WCSVExporter(output_obj), source_vgroups)
+		finally:
+			if journal is not None:
+				journal.close()
+			# the shard session is connected by the first call, that may not happen (with a pool, for example)
+			if shard_rpc.soap_client() is not None:
+				shard_rpc.rpc().Logout()
+
+	# RPC calls that are made by the migration for a single vgroup
+	migration_calls = {
+		'same_agent': 0,
+		'unsupported': 1,  # getVgroup
+		'missing_tariff': 2,  # getVgroup, getTarif
+		'unsupported_tariff': 2,  # getVgroup, getTarif
+		'no_analog': 2,  # getVgroup, getTarif
+		'migrate': 7  # getVgroup, getTarif, insBlkRasp, insupdVgroup (twice), insupdTarifsRasp, insBlkRasp
+	}
+
+	def plan_migration(target_agent, exporter):
+		print('Fetching tariffs')
+		tariffs = list(fetch_tariffs(rpc, max_workers=args.jobs))
+		print('%i tariffs was fetched' % len(tariffs))
+		tariffs_by_id = {x['tarif']['tarid']: x for x in tariffs}
+
+		destination_tariffs = TariffPrefixCloneGenerator(
+			rpc, args.destination_tariff_type, prefix=args.destination_tariff_prefix, tariffs=tariffs
+		)
+		print('%i tariffs with destination type was found' % len(destination_tariffs.current_tariffs()))
+
+		source_vgroups = fetch_source_vgroups()
+
+		checked_vgroups = [x for x in source_vgroups if x['id'] != target_agent['id']]
+		print('Fetching details of %i vgroups' % len(checked_vgroups))
+		details = fetch_vgroups_details(rpc, [x['vgid'] for x in checked_vgroups], max_workers=args.jobs)
+		details = dict(zip([x['vgid'] for x in checked_vgroups], details))
+
+		counts = {x: 0 for x in migration_calls}
+		for source_v in source_vgroups:
+			source_id = source_v['vgid']
+			tariff_id = source_v['tarid']
+			equal_tariff_id = None
+
+			if source_v['id'] == target_agent['id']:
+				action = 'same_agent'
+			elif len(details[source_id]) != 1 or supported_vgroup(details[source_id][0]) is False:
+				action = 'unsupported'
+			elif tariff_id not in tariffs_by_id:
+				action = 'missing_tariff'
+			else:
+				action, equal_tariff = migration_action(destination_tariffs, tariffs_by_id[tariff_id])
+				if equal_tariff is not None:
+					equal_tariff_id = equal_tariff['tarif']['tarid']
+
+			counts[action] += 1
+			exporter.export({
+				'source_vgid': source_id, 'source_id': source_v['id'], 'source_tarid': tariff_id,
+				'action': action, 'equal_tarid': equal_tariff_id
+			})
+
+		print('Vgroups at the destination agent already: %i' % counts['same_agent'])
+		print('Unsupported vgroups: %i' % counts['unsupported'])
+		print('Vgroups with unknown tariff: %i' % counts['missing_tariff'])
+		print('Vgroups with unsupported tariff: %i' % counts['unsupported_tariff'])
+		print('Vgroups which tariff does not have analog: %i' % counts['no_analog'])
+		print('Vgroups to migrate: %i' % counts['migrate'])
+		if counts['missing_tariff'] > 0 or counts['unsupported_tariff'] > 0:
+			print('Migration will stop at the first vgroup with unknown or unsupported tariff')
+
+		# getAgents, getVgroups, getTarifs and getTarif for every tariff that is checked for the destination type
+		rpc_calls = 3 + len(tariffs) + sum(migration_calls[x] * counts[x] for x in counts)
+		print(
+			'Estimated RPC calls: %i (%i of them are writes)' %
+			(rpc_calls, (migration_calls['migrate'] - 2) * counts['migrate'])
+		)
+
+	try:
+		report_filename = args.export_report
+		if report_filename is None:
+			report_filename = '/dev/null'
+
+		print('Fetching agents')
+		agents = rpc.getAgents()
+		print('%i agents fetched' % len(agents))
+
+		target_agent = None
+		for agent in agents:
+			if agent['id'] == args.destination_agent_id:
+				target_agent = agent
+				break
+		if target_agent is None:
+			raise ValueError('Unable to find the specified agent (id=%i)' % args.destination_agent_id)
+
+		if args.plan is True:
+			plan_migration(target_agent, WCSVExporter(open(report_filename, 'w')))
+			sys.exit(0)
+
+		destination_tariffs = TariffPrefixCloneGenerator(
+			rpc, args.destination_tariff_type, prefix=args.destination_tariff_prefix, max_workers=args.jobs
+		)
+		print('%i tariffs with destination type was fetched' % len(destination_tariffs.current_tariffs()))
+
+		if args.shards is not None and args.shards > 1:
+			# the index is built once and is inherited by every shard
+			destination_tariffs.tariffs_index()
+
+			# vgroups are fetched once and every shard migrates its part of them
+			with WVgroupShards(vgroup_shards(fetch_source_vgroups(), args.shards)) as shards:
+				shards.run(shard_worker, metrics=metrics)
+				with open(report_filename, 'w', newline='') as report_obj:
+					shards.merge(report_obj)
+				failed_shards = shards.failed()
+
+			for from_vg_id, to_vg_id, exit_code in failed_shards:
+				print(
+					'Shard with vgids from %i to %i failed (exit code - %s)' % (from_vg_id, to_vg_id, exit_code),
+					file=sys.stderr
+				)
+			if len(failed_shards) > 0:
+				sys.exit(1)
+		else:
+			migrate_vgroups(rpc, WCSVExporter(open(report_filename, 'w')), fetch_source_vgroups())
+	finally:
+		dump_metrics(args, metrics)
+		if journal is not None:
+			journal.close()
+		response_cache = rpc.response_cache()
+		if response_cache is not None:
+			print(
+				'RPC response cache: %i hits, %i misses' % (response_cache.hits(), response_cache.misses())
+			)
+		status = concurrency_status(rpc)
+		if status is not None:
+			print(status)
+		rpc.rpc().Logout()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/snapshot.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+from lanbilling_stuff.commands import diagnostic_args, start_session, dump_metrics
+
+
+summary = 'dump vgroups, tariffs and agents to a local SQLite file'
+description = (
+	'Snapshot tool. Dumps vgroups, tariffs and agents to the local SQLite file, that may be used '
+	'by exporters instead of the billing server (see --snapshot option). By default, only new and changed '
+	'records are written. Every tariff is fetched on every refresh'
+)
+
+
+def arguments(parser):
+	parser.add_argument(
+		'--snapshot', help='snapshot filename. File is created if it does not exist', type=str,
+		metavar='filename', required=True
+	)
+	parser.add_argument(
+		'--full', help='drop previously saved records and fetch everything again', action='store_true'
+	)
+	parser.add_argument(
+		'--skip-vgroups', help='do not refresh vgroups', action='store_true'
+	)
+	parser.add_argument(
+		'--skip-tariffs', help='do not refresh tariffs', action='store_true'
+	)
+	parser.add_argument(
+		'--skip-agents', help='do not refresh agents', action='store_true'
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	from lanbilling_stuff.snapshot import WLanbillingSnapshot
+
+	rpc, metrics = start_session(args)
+	snapshot = WLanbillingSnapshot(args.snapshot)
+
+	try:
+		if args.skip_agents is False:
+			print('Refreshing agents')
+			print('%i agents saved' % snapshot.refresh_agents(rpc))
+
+		if args.skip_tariffs is False:
+			print('Refreshing tariffs')
+			print('%i tariffs fetched, %i saved, %i removed' % snapshot.refresh_tariffs(rpc, full=args.full))
+
+		if args.skip_vgroups is False:
+			print('Refreshing vgroups')
+			print('%i vgroups fetched, %i saved, %i removed' % snapshot.refresh_vgroups(rpc, full=args.full))
+	finally:
+		dump_metrics(args, metrics)
+		snapshot.close()
+		rpc.rpc().Logout()
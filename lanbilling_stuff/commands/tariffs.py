@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/tariffs.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+from lanbilling_stuff.commands import tariff_selection_args, diagnostic_args, archive_flag, check_selection
+from lanbilling_stuff.commands import check_positive, start_session, dump_metrics
+
+
+summary = 'export tariffs as CSV'
+description = 'Tariffs exporter. By default, everything is fetched. But it can be limited by options'
+
+
+def arguments(parser):
+	tariff_selection_args(parser, 'exported')
+
+	parser.add_argument(
+		'--tariff-type', help='Search end export the specified tariff type only',
+		**lanbilling_scripts_args['--tariff-type']
+	)
+
+	parser.add_argument(
+		'--jobs', help='number of parallel sessions that are used for fetching tariffs. '
+		'Tariffs are fetched one by one if this option is omitted and "rpc_pool_size" option is not set',
+		**lanbilling_scripts_args['--jobs']
+	)
+
+	parser.add_argument(
+		'--snapshot', help='snapshot file (see the "snapshot" command) to read data from. If it is specified, then '
+		'the billing server is not queried',
+		**lanbilling_scripts_args['--snapshot']
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	check_selection(args)
+	check_positive(args, 'jobs')
+
+	from wasp_general.csv import WCSVExporter
+	from lanbilling_stuff.snapshot import WLanbillingSnapshot
+	from lanbilling_stuff.tariff import fetch_tariffs
+
+	snapshot = None
+	if args.snapshot is not None:
+		snapshot = WLanbillingSnapshot(args.snapshot)
+	rpc, metrics = start_session(args, password_prompt=(snapshot is None))
+
+	try:
+		exporter = WCSVExporter(sys.stdout)
+		exporter.omit_field('catnumbers')
+		for tariff in fetch_tariffs(
+			rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id, tariff_type=args.tariff_type,
+			from_tar_id=args.from_tar_id, to_tar_id=args.to_tar_id,
+			login=args.login, vgroup_agent_id=args.vgroup_agent_id, archived_vgroups=archive_flag(args),
+			max_workers=args.jobs, snapshot=snapshot
+		):
+			record = tariff['tarif']
+			exporter.export({x: record[x] for x in record})
+	finally:
+		dump_metrics(args, metrics)
+		if snapshot is not None:
+			snapshot.close()
+		else:
+			rpc.rpc().Logout()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/update_vgroups.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+import time
+from contextlib import contextmanager
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+from lanbilling_stuff.commands import vgroup_selection_args, diagnostic_args, archive_flag, check_selection
+from lanbilling_stuff.commands import check_positive, start_session, dump_metrics, concurrency_status
+
+
+summary = 'set or unset options of vgroups'
+description = 'VGroups bulk updater. By default, everything will be updated. But it can be limited by options'
+
+# seconds between progress messages
+progress_interval = 10
+
+
+def arguments(parser):
+	parser.add_argument(
+		'--update-ip-details', help='Set/unset ipdet option (1 - to set, 0 - to unset)', type=int,
+		nargs='?', metavar='bool_flag', default=None
+	)
+	parser.add_argument(
+		'--update-port-details', help='Set/unset portdet option (1 - to set, 0 - to unset)', type=int,
+		nargs='?', metavar='bool_flag', default=None
+	)
+
+	vgroup_selection_args(parser, 'updated')
+
+	parser.add_argument(
+		'--jobs', help='number of vgroups that are updated in parallel (each one with a separate session). '
+		'Vgroups are updated one by one if this option is omitted and "rpc_pool_size" option is not set',
+		**lanbilling_scripts_args['--jobs']
+	)
+
+	parser.add_argument(
+		'--page-size', help='fetch vgroups page by page with the specified number of records per page. '
+		'By default, all the vgroups are fetched with a single request',
+		**lanbilling_scripts_args['--page-size']
+	)
+
+	parser.add_argument(
+		'--shards', help='split the selected vgroups (they are fetched once) into the specified number of parts and '
+		'update each part in a separate process (with separate sessions). Reports and RPC metrics are merged. '
+		'Every process has its own RPC concurrency limit (see "rpc_concurrency_max" option)',
+		**lanbilling_scripts_args['--shards']
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	check_selection(args)
+
+	if args.update_ip_details is None and args.update_port_details is None:
+		raise ValueError('At least one update option must be specified')
+
+	for arg_name in ['update_ip_details', 'update_port_details']:
+		arg_value = getattr(args, arg_name)
+		if arg_value is not None and arg_value not in [0, 1]:
+			raise ValueError('Invalid value for "%s" option was specified' % arg_name)
+
+	check_positive(args, 'jobs', 'page_size', 'shards')
+
+	from wasp_general.csv import WCSVExporter
+	from lanbilling_stuff.rpc_pool import WLanbillingRPCPool
+	from lanbilling_stuff.parallel import ordered_imap
+	from lanbilling_stuff.vgroup import fetch_vgroups, update_vgroup
+	from lanbilling_stuff.shards import WVgroupShards, vgroup_shards
+
+	rpc, metrics = start_session(args)
+
+	filters = {
+		'from_tar_id': args.from_tar_id, 'to_tar_id': args.to_tar_id, 'login': args.login,
+		'vgroup_agent_id': args.vgroup_agent_id, 'archived_vgroups': archive_flag(args), 'page_size': args.page_size
+	}
+
+	def limiter_status():
+		status = concurrency_status(rpc)
+		return (', ' + status) if status is not None else ''
+
+	def update_vgroups(rpc_obj, output_obj, vgroups):
+		pool = None
+		if args.jobs is not None and args.jobs > 1:
+			pool = WLanbillingRPCPool(rpc_obj.clone(), size=args.jobs)
+
+		@contextmanager
+		def rpc_session():
+			if pool is None:
+				yield rpc_obj
+			else:
+				with pool.session() as session:
+					yield session
+
+		def update_worker(vg_id):
+			error = None
+			started_at = time.monotonic()
+			try:
+				with rpc_session() as session:
+					update_vgroup(
+						session, vg_id, ip_details=args.update_ip_details,
+						port_details=args.update_port_details
+					)
+			except Exception as e:
+				error = '%s: %s' % (e.__class__.__name__, str(e))
+			return vg_id, error, time.monotonic() - started_at
+
+		try:
+			exporter = WCSVExporter(output_obj)
+
+			vg_ids = map(lambda x: x['vgid'], vgroups)
+
+			if pool is None:
+				results = map(update_worker, vg_ids)
+			else:
+				results = ordered_imap(update_worker, vg_ids, args.jobs)
+
+			latencies = []
+			errors = 0
+			run_started_at = time.monotonic()
+			progress_at = run_started_at + progress_interval
+
+			for vg_id, error, latency in results:
+				latencies.append(latency)
+				if error is not None:
+					errors += 1
+					print('Unable to update vgroup (vgid=%i) - %s' % (vg_id, error), file=sys.stderr)
+				exporter.export({
+					'vgid': vg_id,
+					'ipdet': args.update_ip_details,
+					'portdet': args.update_port_details,
+					'error': error
+				})
+
+				if time.monotonic() >= progress_at:
+					run_time = time.monotonic() - run_started_at
+					print(
+						'%i vgroups processed (%i failed) - %.2f vgroups per second%s' %
+						(len(latencies), errors, len(latencies) / run_time, limiter_status()),
+						file=sys.stderr
+					)
+					progress_at = time.monotonic() + progress_interval
+
+			run_time = time.monotonic() - run_started_at
+			if len(latencies) > 0:
+				latencies.sort()
+				print(
+					'%i vgroups processed (%i failed) in %.2f seconds - %.2f vgroups per second%s' % (
+						len(latencies), errors, run_time, len(latencies) / run_time if run_time > 0 else 0,
+						limiter_status()
+					), file=sys.stderr
+				)
+				print(
+					'Per-vgroup latency: mean=%.3fs, p50=%.3fs, p95=%.3fs, max=%.3fs' % (
+						sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.5)],
+						latencies[int(len(latencies) * 0.95)], latencies[-1]
+					), file=sys.stderr
+				)
+		finally:
+			if pool is not None:
+				pool.shutdown()
+
+	def shard_worker(vgroups, output_obj):
+		shard_rpc = rpc.clone()
+		try:
+			update_vgroups(shard_rpc, output_obj, vgroups)
+		finally:
+			# the shard session is connected by the first call, that may not happen (with a pool, for example)
+			if shard_rpc.soap_client() is not None:
+				shard_rpc.rpc().Logout()
+
+	try:
+		vgroups = fetch_vgroups(rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id, **filters)
+
+		if args.shards is not None and args.shards > 1:
+			# vgroups are fetched once and every shard updates its part of them
+			with WVgroupShards(vgroup_shards(vgroups, args.shards)) as shards:
+				shards.run(shard_worker, metrics=metrics)
+				shards.merge(sys.stdout)
+				failed_shards = shards.failed()
+
+			for from_vg_id, to_vg_id, exit_code in failed_shards:
+				print(
+					'Shard with vgids from %i to %i failed (exit code - %s)' % (from_vg_id, to_vg_id, exit_code),
+					file=sys.stderr
+				)
+			if len(failed_shards) > 0:
+				sys.exit(1)
+		else:
+			update_vgroups(rpc, sys.stdout, vgroups)
+	finally:
+		dump_metrics(args, metrics)
+		rpc.rpc().Logout()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/vgroups.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+
+from lanbilling_stuff.scripts_args import lanbilling_scripts_args
+from lanbilling_stuff.commands import vgroup_selection_args, diagnostic_args, archive_flag, check_selection
+from lanbilling_stuff.commands import check_positive, start_session, dump_metrics, concurrency_status
+
+
+summary = 'export vgroups as CSV'
+description = 'VGroups exporter. By default, everything is fetched. But it can be limited by options'
+
+
+def arguments(parser):
+	vgroup_selection_args(parser, 'exported')
+
+	parser.add_argument(
+		'--snapshot', help='snapshot file (see the "snapshot" command) to read data from. If it is specified, then '
+		'the billing server is not queried',
+		**lanbilling_scripts_args['--snapshot']
+	)
+
+	parser.add_argument(
+		'--page-size', help='fetch vgroups page by page with the specified number of records per page. '
+		'By default, all the vgroups are fetched with a single request',
+		**lanbilling_scripts_args['--page-size']
+	)
+
+	parser.add_argument(
+		'--agent-shards', help='when no agent is specified, fetch vgroups of every agent separately with '
+		'the specified number of parallel sessions. This reduces wall time, but not memory usage',
+		**lanbilling_scripts_args['--agent-shards']
+	)
+	parser.add_argument(
+		'--order-by-vgid', help='export vgroups ordered by vgid when they are fetched by agent shards. Every '
+		'fetched vgroup is kept in memory till the last shard is fetched',
+		**lanbilling_scripts_args['--order-by-vgid']
+	)
+
+	diagnostic_args(parser)
+
+
+def run(args):
+	check_selection(args)
+	check_positive(args, 'agent_shards', 'page_size')
+
+	from wasp_general.csv import WCSVExporter
+	from lanbilling_stuff.snapshot import WLanbillingSnapshot
+	from lanbilling_stuff.vgroup import fetch_vgroups
+
+	snapshot = None
+	if args.snapshot is not None:
+		snapshot = WLanbillingSnapshot(args.snapshot)
+	rpc, metrics = start_session(args, password_prompt=(snapshot is None))
+
+	filters = {
+		'from_tar_id': args.from_tar_id, 'to_tar_id': args.to_tar_id, 'login': args.login,
+		'vgroup_agent_id': args.vgroup_agent_id, 'archived_vgroups': archive_flag(args), 'page_size': args.page_size
+	}
+
+	try:
+		exporter = WCSVExporter(sys.stdout)
+		exporter.omit_field('address')
+
+		for vgroup in fetch_vgroups(
+			rpc, from_vg_id=args.from_vg_id, to_vg_id=args.to_vg_id, snapshot=snapshot,
+			shard_workers=args.agent_shards, order_by_vgid=args.order_by_vgid, **filters
+		):
+			exporter.export({x: vgroup[x] for x in vgroup})
+	finally:
+		dump_metrics(args, metrics)
+		status = concurrency_status(rpc)
+		if status is not None:
+			print(status, file=sys.stderr)
+		if snapshot is not None:
+			snapshot.close()
+		else:
+			rpc.rpc().Logout()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/commands/wsdl_cache.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+from datetime import datetime
+
+from lanbilling_stuff.commands import start_session
+
+
+summary = 'list or invalidate cached WSDL documents'
+description = (
+	'WSDL cache maintenance tool. By default, cached documents are listed. The cache directory '
+	'is set by the "wsdl_cache_dir" option of the configuration file'
+)
+
+
+def arguments(parser):
+	parser.add_argument(
+		'--invalidate', help='Drop cached documents. If url is omitted, then every document is dropped',
+		type=str, nargs='?', metavar='url', default=None, const=''
+	)
+
+
+def run(args):
+	from wasp_general.csv import WCSVExporter
+	from lanbilling_stuff.wsdl_cache import WWSDLFileCache
+
+	rpc, metrics = start_session(args, password_prompt=False)
+
+	raw_cache = rpc.wsdl_cache().raw_cache()
+	if isinstance(raw_cache, WWSDLFileCache) is False:
+		print('Persistent WSDL cache is not configured - nothing to do here')
+		sys.exit(0)
+
+	if args.invalidate is not None:
+		url = args.invalidate if len(args.invalidate) > 0 else None
+		rpc.wsdl_cache().invalidate(url)
+		print('WSDL cache was invalidated')
+		sys.exit(0)
+
+	exporter = WCSVExporter(sys.stdout)
+	for entry in raw_cache.entries():
+		exporter.export({
+			'url': entry['url'],
+			'digest': entry['digest'],
+			'created': datetime.fromtimestamp(entry['created']).isoformat()
+		})
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/journal.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import os
+import json
+import time
+
+from wasp_general.verify import verify_type, verify_value
+
+
+class WMigrationJournal:
+
+	steps = ('disabled', 'renamed', 'created', 'tariff_assigned', 'unblocked')
+	final_steps = ('skipped', 'unblocked')
+
+	@verify_type(filename=str, sync_every=int)
+	@verify_value(filename=lambda x: len(x) > 0, sync_every=lambda x: x > 0)
+	def __init__(self, filename, sync_every=100):
+		self.__filename = filename
+		self.__sync_every = sync_every
+		self.__progress = self.__load(filename)
+		self.__fd = None
+		self.__pid = None
+		self.__unsynced = 0
+
+	@staticmethod
+	def __load(filename):
+		progress = {}
+		if os.path.exists(filename) is False:
+			return progress
+
+		with open(filename) as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					# the last record may be truncated by a crash
+					continue
+				vg_id = record['vgid']
+				state = progress.setdefault(vg_id, {})
+				state.update(record['data'])
+				state['step'] = record['step']
+		return progress
+
+	def filename(self):
+		return self.__filename
+
+	def sync_every(self):
+		return self.__sync_every
+
+	def progress(self, vg_id):
+		return self.__progress.get(vg_id)
+
+	def records(self):
+		return len(self.__progress)
+
+	def finished(self, vg_id):
+		state = self.__progress.get(vg_id)
+		return state is not None and state['step'] in self.final_steps
+
+	def __descriptor(self):
+		# every forked shard process opens its own descriptor. Records are appended with a single write call,
+		# so records of different processes do not interleave
+		if self.__fd is None or self.__pid != os.getpid():
+			self.__fd = os.open(self.__filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+			self.__pid = os.getpid()
+			self.__unsynced = 0
+		return self.__fd
+
+	@verify_type(vg_id=int, step=str, sync=bool)
+	@verify_value(step=lambda x: x in WMigrationJournal.steps or x in WMigrationJournal.final_steps)
+	def record(self, vg_id, step, sync=False, **data):
+		line = json.dumps({'vgid': vg_id, 'step': step, 'time': time.time(), 'data': data}, sort_keys=True)
+		os.write(self.__descriptor(), (line + '\n').encode())
+
+		state = self.__progress.setdefault(vg_id, {})
+		state.update(data)
+		state['step'] = step
+
+		self.__unsynced += 1
+		if sync is True or self.__unsynced >= self.__sync_every:
+			self.sync()
+
+	def sync(self):
+		if self.__fd is not None and self.__pid == os.getpid() and self.__unsynced > 0:
+			os.fsync(self.__fd)
+			self.__unsynced = 0
+
+	def close(self):
+		if self.__fd is not None and self.__pid == os.getpid():
+			self.sync()
+			os.close(self.__fd)
+		self.__fd = None
+		self.__pid = None
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/limiter.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import time
+import logging
+import threading
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class WConcurrencyLimiter:
+
+	# the latency baseline of a method slowly grows, so a server that became slower for a long time is not treated
+	# as overloaded forever
+	baseline_drift = 0.001
+
+	# weight of a new latency sample in the smoothed latency of a method. A single slow call (a garbage collection
+	# pause or a slow record) does not decrease the limit
+	latency_smoothing = 0.1
+
+	@verify_type(max_limit=(int, None), min_limit=int, max_rate=(int, float, None))
+	@verify_type(latency_tolerance=(int, float), backoff_ratio=float)
+	@verify_value(max_limit=lambda x: x is None or x > 0, min_limit=lambda x: x > 0)
+	@verify_value(max_rate=lambda x: x is None or x > 0, latency_tolerance=lambda x: x > 1)
+	@verify_value(backoff_ratio=lambda x: 0 < x < 1)
+	def __init__(self, max_limit=None, min_limit=1, max_rate=None, latency_tolerance=2.0, backoff_ratio=0.5):
+		if max_limit is not None and min_limit > max_limit:
+			raise ValueError('"min_limit" is greater then "max_limit"')
+
+		self.__max_limit = max_limit
+		self.__min_limit = min_limit
+		self.__max_rate = max_rate
+		self.__latency_tolerance = latency_tolerance
+		self.__backoff_ratio = backoff_ratio
+
+		self.__limit = float(min_limit)
+		self.__slow_start = True
+		self.__in_flight = 0
+		self.__baselines = {}
+		self.__latencies = {}
+		self.__decreased_at = None
+		self.__next_call_at = None
+		self.__condition = threading.Condition()
+
+	def max_limit(self):
+		return self.__max_limit
+
+	def min_limit(self):
+		return self.__min_limit
+
+	def max_rate(self):
+		return self.__max_rate
+
+	def limit(self):
+		if self.__max_limit is None:
+			return None
+		return int(self.__limit)
+
+	def in_flight(self):
+		return self.__in_flight
+
+	def acquire(self):
+		with self.__condition:
+			if self.__max_limit is not None:
+				while self.__in_flight >= int(self.__limit):
+					self.__condition.wait()
+			self.__in_flight += 1
+
+			delay = 0
+			if self.__max_rate is not None:
+				now = time.monotonic()
+				call_at = max(now, self.__next_call_at if self.__next_call_at is not None else now)
+				self.__next_call_at = call_at + (1 / self.__max_rate)
+				delay = call_at - now
+
+		if delay > 0:
+			time.sleep(delay)
+
+	def release(self, method_name, latency=None, overloaded=False):
+		with self.__condition:
+			self.__in_flight -= 1
+
+			if self.__max_limit is not None:
+				if overloaded is True:
+					self.__decrease('errors', latency)
+				elif latency is not None:
+					baseline = self.__baselines.get(method_name)
+					if baseline is None or latency < baseline:
+						baseline = latency
+					else:
+						baseline *= (1 + self.baseline_drift)
+					self.__baselines[method_name] = baseline
+
+					smoothed_latency = self.__latencies.get(method_name, latency)
+					smoothed_latency += (latency - smoothed_latency) * self.latency_smoothing
+					self.__latencies[method_name] = smoothed_latency
+
+					if smoothed_latency > baseline * self.__latency_tolerance:
+						self.__decrease('latency', smoothed_latency)
+					elif self.__in_flight + 1 >= int(self.__limit):
+						# the limit grows only when it is reached. At the start it grows by one for every call
+						# (doubles every round trip) and after the first decrease - by one every round trip
+						self.__limit += 1 if self.__slow_start is True else (1 / self.__limit)
+						self.__limit = min(self.__limit, self.__max_limit)
+
+				# only callers that may proceed are woken up
+				free_slots = int(self.__limit) - self.__in_flight
+				if free_slots > 0:
+					self.__condition.notify(free_slots)
+
+	def __decrease(self, reason, latency):
+		# concurrent calls spot the same overload, so the limit is decreased once per round trip
+		now = time.monotonic()
+		if self.__decreased_at is not None and (now - self.__decreased_at) < (latency or 0):
+			return
+
+		previous_limit = int(self.__limit)
+		self.__limit = max(self.__limit * self.__backoff_ratio, self.__min_limit)
+		self.__slow_start = False
+		self.__decreased_at = now
+		if int(self.__limit) != previous_limit:
+			logger.info(
+				'RPC concurrency limit is decreased from %i to %i (%s)', previous_limit, int(self.__limit), reason
+			)
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str)
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def from_configuration(cls, config, section_name):
+		options = (
+			('rpc_concurrency_max', 'max_limit', int),
+			('rpc_rate_limit', 'max_rate', float),
+			('rpc_concurrency_min', 'min_limit', int),
+			('rpc_latency_tolerance', 'latency_tolerance', float)
+		)
+
+		kwargs = {}
+		for option_name, arg_name, arg_type in options:
+			if config.has_option(section_name, option_name) is True:
+				value = config[section_name][option_name].strip()
+				if len(value) > 0:
+					kwargs[arg_name] = arg_type(value)
+
+		if kwargs.get('max_limit') is None and kwargs.get('max_rate') is None:
+			return None
+		return cls(**kwargs)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/metrics.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import os
+import json
+import time
+import signal
+import threading
+from contextlib import contextmanager
+
+from wasp_general.verify import verify_type, verify_value
+
+
+class WRPCMethodMetrics:
+
+	latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float('inf'))
+
+	def __init__(self):
+		self.calls = 0
+		self.errors = {}
+		self.retries = 0
+		self.relogins = 0
+		self.request_bytes = 0
+		self.response_bytes = 0
+		self.latency_sum = 0.0
+		self.latency_max = 0.0
+		self.latency_counts = [0] * len(self.latency_buckets)
+
+	def observe(self, latency):
+		self.calls += 1
+		self.latency_sum += latency
+		self.latency_max = max(self.latency_max, latency)
+		for i, bound in enumerate(self.latency_buckets):
+			if latency <= bound:
+				self.latency_counts[i] += 1
+				break
+
+	def quantile(self, q):
+		if self.calls == 0:
+			return None
+
+		rank = q * self.calls
+		seen = 0
+		lower_bound = 0.0
+		for bound, count in zip(self.latency_buckets, self.latency_counts):
+			if count > 0 and seen + count >= rank:
+				upper_bound = min(bound, self.latency_max)
+				return lower_bound + (upper_bound - lower_bound) * ((rank - seen) / count)
+			seen += count
+			lower_bound = bound
+		return self.latency_max
+
+	def as_dict(self):
+		return {
+			'calls': self.calls,
+			'errors': dict(self.errors),
+			'retries': self.retries,
+			'relogins': self.relogins,
+			'request_bytes': self.request_bytes,
+			'response_bytes': self.response_bytes,
+			'latency': {
+				'sum': self.latency_sum,
+				'mean': (self.latency_sum / self.calls) if self.calls > 0 else None,
+				'max': self.latency_max,
+				'p50': self.quantile(0.5),
+				'p95': self.quantile(0.95),
+				'p99': self.quantile(0.99)
+			}
+		}
+
+
+class WRPCMetrics:
+
+	dump_formats = ('json', 'prometheus')
+
+	def __init__(self):
+		self.__methods = {}
+		# dump may be called by a signal handler while the lock is held by the same thread
+		self.__lock = threading.RLock()
+		self.__current = threading.local()
+		self.__started_at = time.time()
+
+	def __method(self, method_name):
+		method = self.__methods.get(method_name)
+		if method is None:
+			method = WRPCMethodMetrics()
+			self.__methods[method_name] = method
+		return method
+
+	def current_method(self):
+		return getattr(self.__current, 'method_name', None)
+
+	@contextmanager
+	def measure(self, method_name):
+		previous_method = self.current_method()
+		self.__current.method_name = method_name
+		started_at = time.monotonic()
+		try:
+			yield
+		except Exception as e:
+			with self.__lock:
+				errors = self.__method(method_name).errors
+				errors[e.__class__.__name__] = errors.get(e.__class__.__name__, 0) + 1
+			raise
+		finally:
+			latency = time.monotonic() - started_at
+			self.__current.method_name = previous_method
+			with self.__lock:
+				self.__method(method_name).observe(latency)
+
+	def retried(self, method_name):
+		with self.__lock:
+			self.__method(method_name).retries += 1
+
+	def relogged(self, method_name):
+		with self.__lock:
+			self.__method(method_name).relogins += 1
+
+	def transferred(self, method_name, request_bytes, response_bytes):
+		with self.__lock:
+			method = self.__method(method_name)
+			method.request_bytes += request_bytes
+			method.response_bytes += response_bytes
+
+	def response_hook(self, response, *args, **kwargs):
+		# "requests" hook. A response is accounted to the method that is called by the current thread
+		method_name = self.current_method()
+		if method_name is not None:
+			request_body = response.request.body
+			self.transferred(
+				method_name, len(request_body) if request_body is not None else 0, len(response.content)
+			)
+		return response
+
+	def counters(self):
+		# raw counters that may be added to metrics of an other process (see merge)
+		with self.__lock:
+			return {x: vars(y).copy() for x, y in self.__methods.items()}
+
+	def merge(self, counters):
+		with self.__lock:
+			for method_name, values in counters.items():
+				method = self.__method(method_name)
+				for name in ('calls', 'retries', 'relogins', 'request_bytes', 'response_bytes', 'latency_sum'):
+					setattr(method, name, getattr(method, name) + values[name])
+				for error, count in values['errors'].items():
+					method.errors[error] = method.errors.get(error, 0) + count
+				method.latency_max = max(method.latency_max, values['latency_max'])
+				method.latency_counts = [x + y for x, y in zip(method.latency_counts, values['latency_counts'])]
+
+	def reset(self):
+		with self.__lock:
+			self.__methods.clear()
+
+	def as_dict(self):
+		with self.__lock:
+			return {
+				'started_at': self.__started_at,
+				'dumped_at': time.time(),
+				'methods': {x: y.as_dict() for x, y in self.__methods.items()}
+			}
+
+	def json(self):
+		return json.dumps(self.as_dict(), indent=4, sort_keys=True)
+
+	def prometheus(self):
+		with self.__lock:
+			methods = sorted(self.__methods.items())
+
+			lines = []
+
+			def metric(name, metric_type, help_text, values):
+				lines.append('# HELP %s %s' % (name, help_text))
+				lines.append('# TYPE %s %s' % (name, metric_type))
+				for labels, value in values:
+					labels = ','.join('%s="%s"' % (x, y) for x, y in labels)
+					lines.append('%s{%s} %s' % (name, labels, repr(value)))
+
+			metric(
+				'lanbilling_rpc_calls_total', 'counter', 'Number of RPC calls (every retry is a separate call)',
+				(((('method', x), ), y.calls) for x, y in methods)
+			)
+			metric(
+				'lanbilling_rpc_errors_total', 'counter', 'Number of failed RPC calls',
+				(((('method', x), ('error', e)), c) for x, y in methods for e, c in sorted(y.errors.items()))
+			)
+			metric(
+				'lanbilling_rpc_retries_total', 'counter', 'Number of RPC call retries',
+				(((('method', x), ), y.retries) for x, y in methods)
+			)
+			metric(
+				'lanbilling_rpc_relogins_total', 'counter', 'Number of re-logins caused by RPC calls',
+				(((('method', x), ), y.relogins) for x, y in methods)
+			)
+			metric(
+				'lanbilling_rpc_request_bytes_total', 'counter', 'Size of sent requests',
+				(((('method', x), ), y.request_bytes) for x, y in methods)
+			)
+			metric(
+				'lanbilling_rpc_response_bytes_total', 'counter', 'Size of received (decoded) responses',
+				(((('method', x), ), y.response_bytes) for x, y in methods)
+			)
+
+			lines.append('# HELP lanbilling_rpc_latency_seconds RPC call latency')
+			lines.append('# TYPE lanbilling_rpc_latency_seconds histogram')
+			for method_name, method in methods:
+				cumulative = 0
+				for bound, count in zip(method.latency_buckets, method.latency_counts):
+					cumulative += count
+					bound = '+Inf' if bound == float('inf') else repr(bound)
+					lines.append(
+						'lanbilling_rpc_latency_seconds_bucket{method="%s",le="%s"} %i' %
+						(method_name, bound, cumulative)
+					)
+				lines.append(
+					'lanbilling_rpc_latency_seconds_sum{method="%s"} %s' % (method_name, repr(method.latency_sum))
+				)
+				lines.append('lanbilling_rpc_latency_seconds_count{method="%s"} %i' % (method_name, method.calls))
+
+			return '\n'.join(lines) + '\n'
+
+	@verify_type(filename=str, dump_format=str)
+	@verify_value(filename=lambda x: len(x) > 0, dump_format=lambda x: x in WRPCMetrics.dump_formats)
+	def dump(self, filename, dump_format='json'):
+		data = self.json() if dump_format == 'json' else self.prometheus()
+		# a textfile collector may read the file at any moment, so it is replaced at once
+		temp_filename = '%s.%i.tmp' % (filename, os.getpid())
+		with open(temp_filename, 'w') as f:
+			f.write(data)
+		os.replace(temp_filename, filename)
+
+	@verify_type(filename=str, dump_format=str)
+	@verify_value(filename=lambda x: len(x) > 0, dump_format=lambda x: x in WRPCMetrics.dump_formats)
+	def dump_on_signal(self, filename, dump_format='json', signal_number=signal.SIGUSR1):
+		signal.signal(signal_number, lambda signum, frame: self.dump(filename, dump_format=dump_format))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/parallel.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from wasp_general.verify import verify_type, verify_value
+
+
+@verify_type(workers=int, window=(int, None))
+@verify_value(fn=lambda x: callable(x), workers=lambda x: x > 0, window=lambda x: x is None or x > 0)
+def ordered_imap(fn, items, workers, window=None):
+	if window is None:
+		window = workers * 2
+
+	executor = ThreadPoolExecutor(max_workers=workers)
+	pending = deque()
+	try:
+		for item in items:
+			pending.append(executor.submit(fn, item))
+			if len(pending) >= window:
+				yield pending.popleft().result()
+		while len(pending) > 0:
+			yield pending.popleft().result()
+	finally:
+		for future in pending:
+			future.cancel()
+		executor.shutdown(wait=True)
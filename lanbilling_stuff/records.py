@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/records.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import sys
+
+
+class WCompactRecord(tuple):
+	# A read-only record that is backed by a tuple. Field names are kept by the record class, so a record does not
+	# have a per-instance dict and does not refer to zeep types. Records are accessed like read-only dicts:
+	# "record['vgid']", "for x in record", "x in record", "record.items()". A class is created for every set of
+	# fields (records of the same zeep type share it), so fields of any server version are kept
+
+	__slots__ = ()
+
+	record_base = None
+	record_fields = tuple()
+	field_index = {}
+
+	# fields that are dropped on conversion
+	omitted_fields = tuple()
+
+	# string fields that have a few distinct values among many records (like agent description). Records share
+	# the same string objects of these fields
+	interned_fields = tuple()
+
+	__record_types = {}
+
+	@classmethod
+	def record_type(cls, fields):
+		key = (cls, fields)
+		record_cls = WCompactRecord.__record_types.get(key)
+		if record_cls is None:
+			record_cls = type(cls.__name__, (cls, ), {
+				'__slots__': (),
+				'record_base': cls,
+				'record_fields': fields,
+				'field_index': {x: i for i, x in enumerate(fields)}
+			})
+			WCompactRecord.__record_types[key] = record_cls
+		return record_cls
+
+	@classmethod
+	def from_value(cls, value):
+		if isinstance(value, cls) is True:
+			return value
+		if hasattr(value, '__values__') is True:
+			value = value.__values__
+
+		fields = tuple(x for x in value if x not in cls.omitted_fields)
+		values = []
+		for field_name in fields:
+			field_value = compact_value(value[field_name])
+			if field_name in cls.interned_fields and isinstance(field_value, str) is True:
+				field_value = sys.intern(field_value)
+			values.append(field_value)
+		return tuple.__new__(cls.record_type(fields), values)
+
+	def __getitem__(self, item):
+		return tuple.__getitem__(self, self.field_index[item])
+
+	def __iter__(self):
+		return iter(self.record_fields)
+
+	def __contains__(self, item):
+		return item in self.field_index
+
+	def get(self, item, default=None):
+		index = self.field_index.get(item)
+		return tuple.__getitem__(self, index) if index is not None else default
+
+	def keys(self):
+		return self.record_fields
+
+	def values(self):
+		return tuple(tuple.__iter__(self))
+
+	def items(self):
+		return zip(self.record_fields, tuple.__iter__(self))
+
+	def payload(self):
+		# mutable dict (with nested dicts and lists) that may be sent to the server
+		return {x: payload_value(y) for x, y in self.items()}
+
+	def __repr__(self):
+		return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % x for x in self.items()))
+
+	def __reduce__(self):
+		return restore_record, (self.record_base, self.record_fields, self.values())
+
+
+class VGroupSummary(WCompactRecord):
+	# a record of the getVgroups result. Addresses are not used (and are not exported) by scripts
+
+	__slots__ = ()
+
+	omitted_fields = ('address', )
+	interned_fields = ('agentdescr', 'tarifdescr')
+
+
+class VGroupDetail(WCompactRecord):
+	# a record of the getVgroup result. The "payload" method returns data for the insupdVgroup call
+
+	__slots__ = ()
+
+	interned_fields = ('agentname', )
+
+
+class TariffSummary(WCompactRecord):
+	# a record of the getTarifs result
+
+	__slots__ = ()
+
+
+class Tariff(WCompactRecord):
+	# a record of the getTarif result. The "payload" method returns data for the insupdTarif call
+
+	__slots__ = ()
+
+
+def compact_value(value):
+	if isinstance(value, WCompactRecord) is True:
+		return value
+	if isinstance(value, (list, tuple)) is True:
+		return tuple(compact_value(x) for x in value)
+	if isinstance(value, dict) is True or hasattr(value, '__values__') is True:
+		return WCompactRecord.from_value(value)
+	return value
+
+
+def payload_value(value):
+	if isinstance(value, WCompactRecord) is True:
+		return value.payload()
+	if isinstance(value, tuple) is True:
+		return [payload_value(x) for x in value]
+	return value
+
+
+def restore_record(record_base, fields, values):
+	return tuple.__new__(record_base.record_type(fields), values)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/retry.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import time
+import random
+import logging
+import threading
+
+import requests.exceptions
+import urllib3.exceptions
+import zeep.exceptions
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class WCircuitBreaker:
+
+	@verify_type(failure_threshold=int, reset_timeout=(int, float))
+	@verify_value(failure_threshold=lambda x: x > 0, reset_timeout=lambda x: x > 0)
+	def __init__(self, failure_threshold=5, reset_timeout=30):
+		self.__failure_threshold = failure_threshold
+		self.__reset_timeout = reset_timeout
+		self.__failures = 0
+		self.__opened_at = None
+		self.__probing = False
+		self.__condition = threading.Condition()
+
+	def failure_threshold(self):
+		return self.__failure_threshold
+
+	def reset_timeout(self):
+		return self.__reset_timeout
+
+	def state(self):
+		with self.__condition:
+			if self.__opened_at is None:
+				return 'closed'
+			if self.__probing is True or (self.__opened_at + self.__reset_timeout) <= time.monotonic():
+				return 'half-open'
+			return 'open'
+
+	def acquire(self):
+		# callers are paused while the breaker is open. After the timeout a single caller probes the server and
+		# the others wait for the result. Returns True for the probing caller
+		with self.__condition:
+			while self.__opened_at is not None:
+				delay = self.__opened_at + self.__reset_timeout - time.monotonic()
+				if delay > 0:
+					self.__condition.wait(delay)
+				elif self.__probing is False:
+					self.__probing = True
+					return True
+				else:
+					self.__condition.wait()
+			return False
+
+	def release_probe(self):
+		# if the probing call was interrupted without a result (by KeyboardInterrupt, for example), then an other
+		# caller probes the server
+		with self.__condition:
+			if self.__probing is True:
+				self.__probing = False
+				self.__condition.notify_all()
+
+	def success(self):
+		with self.__condition:
+			if self.__opened_at is not None:
+				logger.warning('Circuit breaker is closed, server responds again')
+			self.__failures = 0
+			self.__opened_at = None
+			self.__probing = False
+			self.__condition.notify_all()
+
+	def failure(self):
+		with self.__condition:
+			self.__failures += 1
+			if self.__probing is True or self.__failures >= self.__failure_threshold:
+				if self.__opened_at is None:
+					logger.warning(
+						'Circuit breaker is open after %i failures, calls are paused for %s seconds' %
+						(self.__failures, self.__reset_timeout)
+					)
+				self.__opened_at = time.monotonic()
+			self.__probing = False
+			self.__condition.notify_all()
+
+
+class WRetryPolicy:
+
+	read_methods_prefixes = ('get', 'Login', 'Logout')
+
+	# statuses with which the server refuses a request without processing it
+	write_safe_statuses = (429, 503)
+
+	@verify_type(read_retries=int, write_retries=int, base_delay=(int, float), max_delay=(int, float))
+	@verify_type(circuit_breaker=(WCircuitBreaker, None))
+	@verify_value(read_retries=lambda x: x >= 0, write_retries=lambda x: x >= 0)
+	@verify_value(base_delay=lambda x: x >= 0, max_delay=lambda x: x >= 0)
+	def __init__(self, read_retries=3, write_retries=3, base_delay=0.5, max_delay=30, circuit_breaker=None):
+		self.__read_retries = read_retries
+		self.__write_retries = write_retries
+		self.__base_delay = base_delay
+		self.__max_delay = max_delay
+		self.__circuit_breaker = circuit_breaker
+
+	def read_retries(self):
+		return self.__read_retries
+
+	def write_retries(self):
+		return self.__write_retries
+
+	def base_delay(self):
+		return self.__base_delay
+
+	def max_delay(self):
+		return self.__max_delay
+
+	def circuit_breaker(self):
+		return self.__circuit_breaker
+
+	def read_method(self, method_name):
+		return method_name.startswith(self.read_methods_prefixes)
+
+	def retries(self, method_name):
+		return self.__read_retries if self.read_method(method_name) is True else self.__write_retries
+
+	@staticmethod
+	def __exception_chain(exc):
+		result = []
+		while exc is not None and exc not in result:
+			result.append(exc)
+			if isinstance(exc, urllib3.exceptions.MaxRetryError) is True and exc.reason is not None:
+				exc = exc.reason
+			elif len(exc.args) > 0 and isinstance(exc.args[0], BaseException) is True:
+				exc = exc.args[0]
+			else:
+				exc = exc.__cause__ or exc.__context__
+		return result
+
+	@classmethod
+	def not_sent_error(cls, exc):
+		# the connection was not established, so the server has not received the request
+		if isinstance(exc, requests.exceptions.ConnectTimeout) is True:
+			return True
+		if isinstance(exc, requests.exceptions.ConnectionError) is True:
+			for error in cls.__exception_chain(exc):
+				if isinstance(error, (urllib3.exceptions.NewConnectionError, ConnectionRefusedError)) is True:
+					return True
+		return False
+
+	@classmethod
+	def transient_error(cls, exc):
+		if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)) is True:
+			return True
+		if isinstance(exc, zeep.exceptions.TransportError) is True:
+			return exc.status_code == 429 or exc.status_code >= 500
+		return False
+
+	def retry_allowed(self, method_name, exc):
+		if self.read_method(method_name) is True:
+			return self.transient_error(exc)
+		if isinstance(exc, zeep.exceptions.TransportError) is True:
+			return exc.status_code in self.write_safe_statuses
+		return self.not_sent_error(exc)
+
+	def delay(self, attempt):
+		# exponential backoff with "full jitter"
+		return random.uniform(0, min(self.__max_delay, self.__base_delay * (2 ** attempt)))
+
+	def call(self, method_name, fn, args, kwargs, on_retry=None):
+		retries = self.retries(method_name)
+		attempt = 0
+		while True:
+			probe = False
+			if self.__circuit_breaker is not None:
+				probe = self.__circuit_breaker.acquire()
+
+			try:
+				result = fn(*args, **kwargs)
+			except Exception as e:
+				if self.__circuit_breaker is not None:
+					if self.transient_error(e) is True:
+						self.__circuit_breaker.failure()
+					else:
+						self.__circuit_breaker.success()
+
+				if attempt >= retries or self.retry_allowed(method_name, e) is False:
+					raise
+
+				delay = self.delay(attempt)
+				attempt += 1
+				logger.warning(
+					'RPC method "%s" failed (%s: %s). Retry %i of %i in %.2f seconds' %
+					(method_name, e.__class__.__name__, str(e), attempt, retries, delay)
+				)
+				if on_retry is not None:
+					on_retry(method_name)
+				time.sleep(delay)
+				continue
+			else:
+				if self.__circuit_breaker is not None:
+					self.__circuit_breaker.success()
+				return result
+			finally:
+				# success and failure release the probe already, but the call may be interrupted by a BaseException
+				if probe is True:
+					self.__circuit_breaker.release_probe()
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str)
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def from_configuration(cls, config, section_name):
+		options = (
+			('rpc_read_retries', 'read_retries', int),
+			('rpc_write_retries', 'write_retries', int),
+			('rpc_retry_delay', 'base_delay', float),
+			('rpc_retry_max_delay', 'max_delay', float)
+		)
+
+		kwargs = {}
+		for option_name, arg_name, arg_type in options:
+			if config.has_option(section_name, option_name) is True:
+				value = config[section_name][option_name].strip()
+				if len(value) > 0:
+					kwargs[arg_name] = arg_type(value)
+
+		if config.has_option(section_name, 'rpc_breaker_threshold') is True:
+			value = config[section_name]['rpc_breaker_threshold'].strip()
+			if len(value) > 0 and int(value) > 0:
+				breaker_timeout = 30
+				if config.has_option(section_name, 'rpc_breaker_timeout') is True:
+					timeout_value = config[section_name]['rpc_breaker_timeout'].strip()
+					if len(timeout_value) > 0:
+						breaker_timeout = float(timeout_value)
+				kwargs['circuit_breaker'] = WCircuitBreaker(
+					failure_threshold=int(value), reset_timeout=breaker_timeout
+				)
+
+		# a circuit breaker alone is used with the default retries
+		if len(kwargs) == 0:
+			return None
+		return cls(**kwargs)
@@ -27,6 +27,10 @@ from lanbilling_stuff.version import __author__, __version__, __credits__, __lic
 # noinspection PyUnresolvedReferences
 from lanbilling_stuff.version import __status__
 
+import time
+import threading
+import functools
+
 import zeep.exceptions
 from zeep import Client as SOAPClient
 from getpass import getpass
@@ -34,35 +38,28 @@ from getpass import getpass
 from wasp_general.verify import verify_type, verify_value
 from wasp_general.config import WConfig
 
+from lanbilling_stuff.wsdl_cache import WWSDLCache
+from lanbilling_stuff.transport import WTransportSettings
+from lanbilling_stuff.rpc_cache import WRPCResponseCache
+from lanbilling_stuff.retry import WRetryPolicy
+from lanbilling_stuff.metrics import WRPCMetrics
+from lanbilling_stuff.cassette import WRPCCassette
+from lanbilling_stuff.limiter import WConcurrencyLimiter
+from lanbilling_stuff.streaming import WStreamingDecoder
 
-class WLanbillingRPC:
 
-	class MethodProxy:
-
-		def __init__(self, lanbilling_rpc, soap_service, method_name):
-			self.lanbilling_rpc = lanbilling_rpc
-			self.soap_service = soap_service
-			self.method_name = method_name
-
-		def __call__(self, *args, **kwargs):
-			try:
-				return getattr(self.soap_service, self.method_name)(*args, **kwargs)
-			except zeep.exceptions.Fault as e:
-				if e.message != 'error_auth' or self.method_name in ('Login', 'Logout'):
-					raise
-
-			self.lanbilling_rpc.connect()
-			self.soap_service = self.lanbilling_rpc.rpc()
-			return getattr(self.soap_service, self.method_name)(*args, **kwargs)
+class WLanbillingRPCSettings:
+	# connection settings that are shared by the synchronous and the asynchronous clients
 
 	@verify_type(hostname=(str, None), login=(str, None), password=(str, None), wsdl_url=(str, None))
 	@verify_type(soap_proxy=bool, soap_proxy_service=(str, None), soap_proxy_address=(str, None))
 	@verify_value(hostname=lambda x: x is None or len(x) > 0, login=lambda x: x is None or len(x) > 0)
 	@verify_value(wsdl_url=lambda x: x is None or len(x) > 0, soap_proxy_service=lambda x: x is None or len(x) > 0)
 	@verify_value(soap_proxy_address=lambda x: x is None or len(x) > 0)
+	@verify_type(wsdl_cache=(WWSDLCache, None), transport_settings=(WTransportSettings, None))
 	def __init__(
 		self, hostname=None, login=None, password=None, wsdl_url=None, soap_proxy=False,
-		soap_proxy_service=None, soap_proxy_address=None
+		soap_proxy_service=None, soap_proxy_address=None, wsdl_cache=None, transport_settings=None
 	):
 		default = lambda x, d: x if x is not None else d
 
@@ -77,8 +74,8 @@ class WLanbillingRPC:
 			self.__soap_proxy_address = default(soap_proxy_address, ('http://%s:34012' % hostname))
 			self.__soap_proxy_service = default(soap_proxy_service, '{urn:api3}api3')
 
-		self.__client = None
-		self.__service = None
+		self.__wsdl_cache = wsdl_cache
+		self.__transport_settings = default(transport_settings, WTransportSettings())
 
 	def hostname(self):
 		return self.__hostname
@@ -98,51 +95,25 @@ class WLanbillingRPC:
 	def proxy_service(self):
 		return self.__soap_proxy_service
 
-	def soap_client(self):
-		return self.__client
-
-	def soap_proxy(self):
-		return self.__service
+	def wsdl_cache(self):
+		return self.__wsdl_cache
 
-	def connect(self):
-		self.close()
-		self.__client = SOAPClient(self.__wsdl_url)
-		proxy_address = self.proxy_address()
-		proxy_service = self.proxy_service()
+	def transport_settings(self):
+		return self.__transport_settings
 
-		if proxy_address is not None and proxy_service is not None:
-			self.__service = self.__client.create_service(proxy_service, proxy_address)
-		self._rpc().Login(self.__login, self.__password)
+	def settings(self):
+		# arguments for a client with the same settings
+		return {
+			'hostname': self.__hostname, 'login': self.__login, 'password': self.__password,
+			'wsdl_url': self.__wsdl_url, 'soap_proxy': (self.__soap_proxy_address is not None),
+			'soap_proxy_service': self.__soap_proxy_service, 'soap_proxy_address': self.__soap_proxy_address,
+			'wsdl_cache': self.__wsdl_cache, 'transport_settings': self.__transport_settings
+		}
 
-	def _rpc(self):
-		if self.__service is not None:
-			return self.__service
-		if self.__client is not None:
-			return self.__client.service
-		raise RuntimeError('RPC call before connect')
-
-	def close(self):
-		if self.__client is not None:
-			self._rpc().Logout()
-		self.__client = None
-		self.__service = None
-
-	def rpc(self):
-		if self.__client is None:
-			self.connect()
-		return self._rpc()
-
-	def __getattr__(self, item):
-		try:
-			return object.__getattribute__(self, item)
-		except AttributeError:
-			pass
-		return WLanbillingRPC.MethodProxy(self, self.rpc(), item)
-
-	@classmethod
+	@staticmethod
 	@verify_type(config=WConfig, section_name=str, password_prompt=bool)
 	@verify_value(section_name=lambda x: len(x) > 0)
-	def from_configuration(cls, config, section_name, password_prompt=False):
+	def settings_from_configuration(config, section_name, password_prompt=False):
 		login = config[section_name]['login'].strip()
 		if len(login) == 0:
 			login = None
@@ -170,7 +141,308 @@ class WLanbillingRPC:
 		else:
 			soap_proxy = True
 
+		wsdl_cache_dir = None
+		if config.has_option(section_name, 'wsdl_cache_dir') is True:
+			wsdl_cache_dir = config[section_name]['wsdl_cache_dir'].strip()
+			if len(wsdl_cache_dir) == 0:
+				wsdl_cache_dir = None
+
+		wsdl_cache_ttl = 3600
+		if config.has_option(section_name, 'wsdl_cache_ttl') is True:
+			value = config[section_name]['wsdl_cache_ttl'].strip()
+			if len(value) > 0:
+				wsdl_cache_ttl = int(value)
+
+		wsdl_cache = WWSDLCache(cache_dir=wsdl_cache_dir, ttl=wsdl_cache_ttl)
+		transport_settings = WTransportSettings.from_configuration(config, section_name)
+
+		return {
+			'hostname': hostname, 'login': login, 'password': password, 'wsdl_url': wsdl_url,
+			'soap_proxy': soap_proxy, 'soap_proxy_address': soap_proxy_address, 'wsdl_cache': wsdl_cache,
+			'transport_settings': transport_settings
+		}
+
+
+class WLanbillingRPC(WLanbillingRPCSettings):
+
+	class MethodProxy:
+
+		def __init__(self, lanbilling_rpc, soap_service, method_name):
+			self.lanbilling_rpc = lanbilling_rpc
+			self.soap_service = soap_service
+			self.method_name = method_name
+			self.operation = self.soap_operation()
+			self.generation = lanbilling_rpc.generation()
+
+		def soap_operation(self):
+			return getattr(self.soap_service, self.method_name)
+
+		def __call__(self, *args, **kwargs):
+			response_cache = self.lanbilling_rpc.response_cache()
+			if response_cache is not None:
+				return response_cache.call(self.method_name, self.retry, args, kwargs)
+			return self.retry(*args, **kwargs)
+
+		def retry(self, *args, **kwargs):
+			retry_policy = self.lanbilling_rpc.retry_policy()
+			if retry_policy is not None:
+				metrics = self.lanbilling_rpc.metrics()
+				return retry_policy.call(
+					self.method_name, self.limited_invoke, args, kwargs,
+					on_retry=(metrics.retried if metrics is not None else None)
+				)
+			return self.limited_invoke(*args, **kwargs)
+
+		def limited_invoke(self, *args, **kwargs):
+			limiter = self.lanbilling_rpc.concurrency_limiter()
+			if limiter is None:
+				return self.measured_invoke(*args, **kwargs)
+
+			limiter.acquire()
+			started_at = time.monotonic()
+			try:
+				result = self.measured_invoke(*args, **kwargs)
+			except Exception as e:
+				limiter.release(
+					self.method_name, latency=(time.monotonic() - started_at),
+					overloaded=WRetryPolicy.transient_error(e)
+				)
+				raise
+			limiter.release(self.method_name, latency=(time.monotonic() - started_at))
+			return result
+
+		def measured_invoke(self, *args, **kwargs):
+			# every attempt is measured by itself, so retry delays and waits for the circuit breaker or for the
+			# concurrency limiter are not counted as latency. Retries are counted separately
+			metrics = self.lanbilling_rpc.metrics()
+			if metrics is None:
+				return self.invoke(*args, **kwargs)
+			with metrics.measure(self.method_name):
+				return self.invoke(*args, **kwargs)
+
+		def invoke(self, *args, **kwargs):
+			operation, generation = self.operation, self.generation
+			try:
+				return operation(*args, **kwargs)
+			except zeep.exceptions.Fault as e:
+				if e.message != 'error_auth' or self.method_name in ('Login', 'Logout'):
+					raise
+
+			# only the first caller that spotted the expired session logs in again, the others reuse its result
+			self.lanbilling_rpc.reconnect(generation)
+			metrics = self.lanbilling_rpc.metrics()
+			if metrics is not None:
+				metrics.relogged(self.method_name)
+			self.soap_service = self.lanbilling_rpc.rpc()
+			self.operation = self.soap_operation()
+			self.generation = self.lanbilling_rpc.generation()
+			return self.operation(*args, **kwargs)
+
+	class StreamProxy(MethodProxy):
+		# a call of a bulk listing method whose records are decoded while the response is received (see
+		# WStreamingDecoder). Retries, re-login, metrics latency and the concurrency limit cover the request till the
+		# response status is received, an error that happens after that is raised to the caller that iterates over
+		# records. Responses are not cached
+
+		def __init__(self, lanbilling_rpc, soap_service, decoder):
+			self.decoder = decoder
+			# records are read with a separate connection, so the session may be used by other calls meanwhile
+			self.http_session = lanbilling_rpc.transport_settings().session()
+			WLanbillingRPC.MethodProxy.__init__(self, lanbilling_rpc, soap_service, decoder.method_name())
+
+		def soap_operation(self):
+			return functools.partial(
+				self.decoder.request, self.http_session, self.soap_service, self.lanbilling_rpc.http_session().cookies,
+				self.lanbilling_rpc.transport_settings().operation_timeout(), self.lanbilling_rpc.metrics()
+			)
+
+		def __call__(self, *args, **kwargs):
+			try:
+				response = self.retry(*args, **kwargs)
+			except Exception:
+				self.http_session.close()
+				raise
+			return self.records(response)
+
+		def records(self, response):
+			try:
+				for record in self.decoder.records(response, metrics=self.lanbilling_rpc.metrics()):
+					yield record
+			finally:
+				self.http_session.close()
+
+	@verify_type(response_cache=(WRPCResponseCache, None), retry_policy=(WRetryPolicy, None))
+	@verify_type(metrics=(WRPCMetrics, None), cassette=(WRPCCassette, None))
+	@verify_type(concurrency_limiter=(WConcurrencyLimiter, None), streaming=bool)
+	def __init__(
+		self, hostname=None, login=None, password=None, wsdl_url=None, soap_proxy=False,
+		soap_proxy_service=None, soap_proxy_address=None, wsdl_cache=None, transport_settings=None,
+		response_cache=None, retry_policy=None, metrics=None, cassette=None, concurrency_limiter=None, streaming=False
+	):
+		WLanbillingRPCSettings.__init__(
+			self, hostname=hostname, login=login, password=password, wsdl_url=wsdl_url, soap_proxy=soap_proxy,
+			soap_proxy_service=soap_proxy_service, soap_proxy_address=soap_proxy_address, wsdl_cache=wsdl_cache,
+			transport_settings=transport_settings
+		)
+		self.__response_cache = response_cache
+		self.__retry_policy = retry_policy
+		self.__metrics = metrics
+		self.__cassette = cassette
+		self.__concurrency_limiter = concurrency_limiter
+		self.__streaming = streaming
+		self.__stream_decoders = {}
+		self.__http_session = None
+		self.__client = None
+		self.__service = None
+		self.__methods = {}
+		self.__generation = 0
+		self.__connect_lock = threading.Lock()
+
+	def response_cache(self):
+		return self.__response_cache
+
+	def retry_policy(self):
+		return self.__retry_policy
+
+	def metrics(self):
+		return self.__metrics
+
+	def cassette(self):
+		return self.__cassette
+
+	def concurrency_limiter(self):
+		return self.__concurrency_limiter
+
+	def streaming(self):
+		return self.__streaming
+
+	def http_session(self):
+		if self.__http_session is None:
+			self.__http_session = self.transport_settings().session()
+			if self.__metrics is not None:
+				self.__http_session.hooks['response'].append(self.__metrics.response_hook)
+		return self.__http_session
+
+	def soap_client(self):
+		return self.__client
+
+	def soap_proxy(self):
+		return self.__service
+
+	def connect(self):
+		self.close()
+		http_session = self.http_session()
+		http_session.cookies.clear()
+
+		wsdl_cache = self.wsdl_cache()
+		if wsdl_cache is not None:
+			transport = self.transport_settings().transport(
+				http_session, cache=wsdl_cache.raw_cache(), cassette=self.__cassette
+			)
+			self.__client = SOAPClient(
+				wsdl_cache.document(self.wsdl_url(), transport), transport=transport
+			)
+		else:
+			transport = self.transport_settings().transport(http_session, cassette=self.__cassette)
+			self.__client = SOAPClient(self.wsdl_url(), transport=transport)
+		proxy_address = self.proxy_address()
+		proxy_service = self.proxy_service()
+
+		if proxy_address is not None and proxy_service is not None:
+			self.__service = self.__client.create_service(proxy_service, proxy_address)
+		self._rpc().Login(self.login(), self.password())
+		self.__generation += 1
+
+	def generation(self):
+		return self.__generation
+
+	def reconnect(self, generation):
+		with self.__connect_lock:
+			if self.__generation == generation:
+				self.connect()
+		return self.__generation
+
+	def _rpc(self):
+		if self.__service is not None:
+			return self.__service
+		if self.__client is not None:
+			return self.__client.service
+		raise RuntimeError('RPC call before connect')
+
+	def stream(self, method_name, record_cls, *args):
+		# records of a bulk listing call. They are decoded while the response is received if streaming is on. A
+		# cassette records zeep calls only, so with a cassette (or for an operation that the decoder does not
+		# support) records are converted from the zeep result
+		decoder = None
+		if self.__streaming is True and self.__cassette is None:
+			key = (method_name, record_cls)
+			if key not in self.__stream_decoders:
+				self.__stream_decoders[key] = WStreamingDecoder.create(self.rpc(), method_name, record_cls)
+			decoder = self.__stream_decoders[key]
+
+		if decoder is None:
+			return map(record_cls.from_value, getattr(self, method_name)(*args))
+		return WLanbillingRPC.StreamProxy(self, self.rpc(), decoder)(*args)
+
+	def close(self):
+		for method_name in self.__methods:
+			self.__dict__.pop(method_name, None)
+		self.__methods.clear()
+		try:
+			if self.__client is not None:
+				self._rpc().Logout()
+		finally:
+			self.__client = None
+			self.__service = None
+
+	def rpc(self):
+		if self.__client is None:
+			with self.__connect_lock:
+				if self.__client is None:
+					self.connect()
+		return self._rpc()
+
+	def clone(self):
+		return WLanbillingRPC(
+			response_cache=self.__response_cache, retry_policy=self.__retry_policy, metrics=self.__metrics,
+			cassette=self.__cassette, concurrency_limiter=self.__concurrency_limiter, streaming=self.__streaming,
+			**self.settings()
+		)
+
+	def __getattr__(self, item):
+		if item.startswith('_'):
+			raise AttributeError(item)
+		method = WLanbillingRPC.MethodProxy(self, self.rpc(), item)
+		self.__methods[item] = method
+		self.__dict__[item] = method
+		return method
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str, password_prompt=bool, metrics=(WRPCMetrics, None))
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def from_configuration(cls, config, section_name, password_prompt=False, metrics=None):
+		settings = cls.settings_from_configuration(config, section_name, password_prompt=password_prompt)
+
+		response_cache = None
+		if config.has_option(section_name, 'rpc_cache_size') is True:
+			value = config[section_name]['rpc_cache_size'].strip()
+			if len(value) > 0 and int(value) > 0:
+				response_cache_ttl = 300
+				if config.has_option(section_name, 'rpc_cache_ttl') is True:
+					ttl_value = config[section_name]['rpc_cache_ttl'].strip()
+					if len(ttl_value) > 0:
+						response_cache_ttl = int(ttl_value)
+				response_cache = WRPCResponseCache(max_size=int(value), ttl=response_cache_ttl)
+
+		streaming = False
+		if config.has_option(section_name, 'rpc_streaming') is True:
+			value = config[section_name]['rpc_streaming'].strip()
+			if len(value) > 0:
+				streaming = config.getboolean(section_name, 'rpc_streaming')
+
 		return WLanbillingRPC(
-			hostname=hostname, login=login, password=password,
-			wsdl_url=wsdl_url, soap_proxy_address=soap_proxy_address, soap_proxy=soap_proxy
+			response_cache=response_cache, retry_policy=WRetryPolicy.from_configuration(config, section_name),
+			metrics=metrics, cassette=WRPCCassette.from_configuration(config, section_name),
+			concurrency_limiter=WConcurrencyLimiter.from_configuration(config, section_name), streaming=streaming,
+			**settings
 		)
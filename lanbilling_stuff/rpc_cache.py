@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/rpc_cache.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+from wasp_general.verify import verify_type, verify_value
+
+
+def _tariff_id(args, kwargs):
+	tariff = args[1] if len(args) > 1 else kwargs.get('val')
+	return tariff['tarif']['tarid']
+
+
+def _vgroup_id(args, kwargs):
+	vgroup = args[1] if len(args) > 1 else kwargs.get('val')
+	return vgroup['vgroup']['vgid']
+
+
+def _tariffs_rasp_vgroup_id(args, kwargs):
+	rasp = args[1] if len(args) > 1 else kwargs.get('val')
+	return rasp['vgid']
+
+
+def _block_rasp_vgroup_id(args, kwargs):
+	rasp = args[0] if len(args) > 0 else kwargs.get('val')
+	return rasp['vgid']
+
+
+class WRPCResponseCache:
+
+	read_methods = ('getTarif', 'getTarifs', 'getAgents', 'getVgroup')
+
+	# write method -> ((read method, entity id getter or None if every entry must be dropped), ...)
+	write_methods = {
+		'insupdTarif': (('getTarif', _tariff_id), ('getTarifs', None)),
+		'insupdVgroup': (('getVgroup', _vgroup_id), ),
+		'insupdTarifsRasp': (('getVgroup', _tariffs_rasp_vgroup_id), ),
+		'insBlkRasp': (('getVgroup', _block_rasp_vgroup_id), )
+	}
+
+	@verify_type(max_size=int, ttl=(int, float, None), methods_ttl=(dict, None))
+	@verify_value(max_size=lambda x: x > 0, ttl=lambda x: x is None or x >= 0)
+	def __init__(self, max_size=1024, ttl=300, methods_ttl=None):
+		self.__max_size = max_size
+		self.__ttl = ttl
+		self.__methods_ttl = methods_ttl.copy() if methods_ttl is not None else {}
+		self.__entries = OrderedDict()
+		self.__entities = {}
+		self.__hits = {}
+		self.__misses = {}
+		self.__lock = threading.Lock()
+
+	def max_size(self):
+		return self.__max_size
+
+	def ttl(self, method_name=None):
+		return self.__methods_ttl.get(method_name, self.__ttl)
+
+	@staticmethod
+	def __entity_id(args, kwargs):
+		if len(args) > 0:
+			return args[0]
+		if len(kwargs) > 0:
+			return next(iter(kwargs.values()))
+		return None
+
+	def __drop(self, key):
+		self.__entries.pop(key, None)
+		entity = (key[0], key[1])
+		keys = self.__entities.get(entity)
+		if keys is not None:
+			keys.discard(key)
+			if len(keys) == 0:
+				del self.__entities[entity]
+
+	def __lookup(self, key):
+		with self.__lock:
+			entry = self.__entries.get(key)
+			if entry is not None:
+				expires_at, value = entry
+				if expires_at is None or expires_at > time.monotonic():
+					self.__entries.move_to_end(key)
+					self.__hits[key[0]] = self.__hits.get(key[0], 0) + 1
+					return True, value
+				self.__drop(key)
+			self.__misses[key[0]] = self.__misses.get(key[0], 0) + 1
+			return False, None
+
+	def __store(self, key, value):
+		ttl = self.ttl(key[0])
+		with self.__lock:
+			self.__entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+			self.__entries.move_to_end(key)
+			self.__entities.setdefault((key[0], key[1]), set()).add(key)
+			while len(self.__entries) > self.__max_size:
+				self.__drop(next(iter(self.__entries)))
+
+	@verify_type(method_name=(str, None))
+	def invalidate(self, method_name=None, entity_id=None):
+		with self.__lock:
+			if method_name is None:
+				self.__entries.clear()
+				self.__entities.clear()
+				return
+			if entity_id is not None:
+				keys = list(self.__entities.get((method_name, entity_id), ()))
+			else:
+				keys = [x for x in self.__entries if x[0] == method_name]
+			for key in keys:
+				self.__drop(key)
+
+	def call(self, method_name, fn, args, kwargs):
+		if method_name in self.read_methods:
+			try:
+				key = (method_name, self.__entity_id(args, kwargs), args, tuple(sorted(kwargs.items())))
+				hash(key)
+			except TypeError:
+				return fn(*args, **kwargs)
+
+			hit, value = self.__lookup(key)
+			if hit is False:
+				value = fn(*args, **kwargs)
+				self.__store(key, value)
+			return copy.deepcopy(value)
+
+		invalidations = self.write_methods.get(method_name)
+		if invalidations is None:
+			return fn(*args, **kwargs)
+
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			for read_method, entity_id_getter in invalidations:
+				entity_id = None
+				if entity_id_getter is not None:
+					try:
+						entity_id = entity_id_getter(args, kwargs)
+					except (LookupError, TypeError):
+						pass
+				if entity_id is not None and entity_id != 0:
+					self.invalidate(read_method, entity_id)
+				elif entity_id_getter is None or entity_id is None:
+					self.invalidate(read_method)
+
+	def hits(self, method_name=None):
+		with self.__lock:
+			if method_name is not None:
+				return self.__hits.get(method_name, 0)
+			return sum(self.__hits.values())
+
+	def misses(self, method_name=None):
+		with self.__lock:
+			if method_name is not None:
+				return self.__misses.get(method_name, 0)
+			return sum(self.__misses.values())
+
+	def stats(self):
+		with self.__lock:
+			return {
+				x: {'hits': self.__hits.get(x, 0), 'misses': self.__misses.get(x, 0)}
+				for x in set(self.__hits.keys()).union(self.__misses.keys())
+			}
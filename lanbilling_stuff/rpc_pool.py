@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/rpc_pool.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import queue
+import threading
+from contextlib import contextmanager
+
+import requests.exceptions
+import zeep.exceptions
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+
+
+class WLanbillingRPCPool:
+
+	broken_session_exceptions = (requests.exceptions.RequestException, zeep.exceptions.TransportError)
+
+	@verify_type(rpc=WLanbillingRPC, size=int, checkout_timeout=(int, float, None))
+	@verify_value(size=lambda x: x > 0, checkout_timeout=lambda x: x is None or x > 0)
+	def __init__(self, rpc, size=1, checkout_timeout=None):
+		self.__template = rpc
+		self.__size = size
+		self.__checkout_timeout = checkout_timeout
+		self.__idle = queue.LifoQueue()
+		self.__sessions = []
+		self.__lock = threading.Lock()
+		self.__closed = False
+
+	def size(self):
+		return self.__size
+
+	def __checkout(self):
+		with self.__lock:
+			if self.__closed is True:
+				raise RuntimeError('Pool was shut down')
+			if self.__idle.empty() is True and len(self.__sessions) < self.__size:
+				rpc = self.__template if len(self.__sessions) == 0 else self.__template.clone()
+				self.__sessions.append(rpc)
+				return rpc
+		try:
+			return self.__idle.get(timeout=self.__checkout_timeout)
+		except queue.Empty:
+			raise RuntimeError('Unable to checkout a session from the pool (timeout)')
+
+	def __checkin(self, rpc):
+		with self.__lock:
+			if self.__closed is True:
+				self.__logout(rpc)
+				return
+		self.__idle.put(rpc)
+
+	@staticmethod
+	def __logout(rpc):
+		try:
+			rpc.close()
+		except Exception:
+			pass
+
+	@contextmanager
+	def session(self):
+		rpc = self.__checkout()
+		try:
+			if rpc.soap_client() is None:
+				rpc.connect()
+			yield rpc
+		except self.broken_session_exceptions:
+			self.__logout(rpc)
+			raise
+		finally:
+			self.__checkin(rpc)
+
+	def shutdown(self):
+		with self.__lock:
+			self.__closed = True
+		while True:
+			try:
+				rpc = self.__idle.get_nowait()
+			except queue.Empty:
+				break
+			self.__logout(rpc)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.shutdown()
+
+	@staticmethod
+	@verify_type(config=WConfig, section_name=str)
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def size_from_configuration(config, section_name):
+		if config.has_option(section_name, 'rpc_pool_size') is True:
+			value = config[section_name]['rpc_pool_size'].strip()
+			if len(value) > 0:
+				size = int(value)
+				if size < 1:
+					raise ValueError('"rpc_pool_size" must be a positive number')
+				return size
+		return None
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str, password_prompt=bool, size=(int, None))
+	@verify_value(section_name=lambda x: len(x) > 0, size=lambda x: x is None or x > 0)
+	def from_configuration(cls, config, section_name, password_prompt=False, size=None):
+		rpc = WLanbillingRPC.from_configuration(config, section_name, password_prompt=password_prompt)
+
+		if size is None:
+			size = cls.size_from_configuration(config, section_name) or 1
+
+		return cls(rpc, size=size)
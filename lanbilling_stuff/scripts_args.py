@@ -76,5 +76,55 @@ lanbilling_scripts_args = {
 	},
 	'--non-archived-vgroups': {
 		'action': 'store_true'
+	},
+	'--jobs': {
+		'type': int,
+		'nargs': '?',
+		'metavar': 'jobs',
+		'default': None
+	},
+	'--page-size': {
+		'type': int,
+		'nargs': '?',
+		'metavar': 'records',
+		'default': None
+	},
+	'--agent-shards': {
+		'type': int,
+		'nargs': '?',
+		'metavar': 'workers',
+		'default': None
+	},
+	'--order-by-vgid': {
+		'action': 'store_true'
+	},
+	'--shards': {
+		'type': int,
+		'nargs': '?',
+		'metavar': 'processes',
+		'default': None
+	},
+	'--plan': {
+		'action': 'store_true'
+	},
+	'--metrics': {
+		'type': str,
+		'nargs': '?',
+		'metavar': 'filename',
+		'default': None
+	},
+	'--metrics-format': {
+		'type': str,
+		'choices': ('json', 'prometheus'),
+		'default': 'json'
+	},
+	'--verbose': {
+		'action': 'store_true'
+	},
+	'--snapshot': {
+		'type': str,
+		'nargs': '?',
+		'metavar': 'filename',
+		'default': None
 	}
 }
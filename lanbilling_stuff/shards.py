@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/shards.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import multiprocessing
+
+from wasp_general.verify import verify_type, verify_value
+
+from lanbilling_stuff.metrics import WRPCMetrics
+
+
+@verify_type(shards=int)
+@verify_value(shards=lambda x: x > 0)
+def vgroup_shards(vgroups, shards):
+	# vgroups are fetched once by the parent and are split into parts with equal number of vgroups. getVgroups can
+	# not select a vgid range, so a shard that fetched its own range would download the whole base again
+	vgroups = sorted(vgroups, key=lambda x: x['vgid'])
+	if len(vgroups) == 0:
+		return []
+
+	shards = min(shards, len(vgroups))
+	bounds = [(len(vgroups) * i) // shards for i in range(shards + 1)]
+	return [vgroups[bounds[i]:bounds[i + 1]] for i in range(shards)]
+
+
+def _run_shard(worker, vgroups, filename, metrics):
+	# the forked process has a copy of the parent metrics, so only calls of the shard are counted and sent back.
+	# A concurrency limiter can not be shared this way, every shard has its own copy of it
+	if metrics is not None:
+		metrics.reset()
+	try:
+		# csv module writes its own row endings
+		with open(filename, 'w', newline='') as output_obj:
+			worker(vgroups, output_obj)
+	finally:
+		if metrics is not None:
+			with open(filename + '.metrics', 'w') as f:
+				json.dump(metrics.counters(), f)
+
+
+class WVgroupShards:
+
+	@verify_type(shards=list)
+	def __init__(self, shards):
+		self.__shards = shards
+		self.__directory = tempfile.mkdtemp(prefix='lanbilling-shards-')
+		self.__exit_codes = []
+
+	def shards(self):
+		return self.__shards
+
+	def ranges(self):
+		return [(x[0]['vgid'], x[-1]['vgid']) for x in self.__shards]
+
+	def output_filename(self, shard_index):
+		return os.path.join(self.__directory, 'shard-%i.csv' % shard_index)
+
+	@verify_type(metrics=(WRPCMetrics, None))
+	def run(self, worker, metrics=None):
+		# the worker, vgroups and everything the worker references (like the entered password) are inherited by
+		# the forked process. RPC metrics of shards are added to the specified metrics
+		context = multiprocessing.get_context('fork')
+
+		sys.stdout.flush()
+		sys.stderr.flush()
+
+		processes = []
+		for shard_index, vgroups in enumerate(self.__shards):
+			process = context.Process(
+				target=_run_shard, args=(worker, vgroups, self.output_filename(shard_index), metrics),
+				name=('shard-%i' % shard_index)
+			)
+			process.start()
+			processes.append(process)
+
+		for process in processes:
+			process.join()
+		self.__exit_codes = [x.exitcode for x in processes]
+
+		if metrics is not None:
+			for shard_index in range(len(processes)):
+				try:
+					with open(self.output_filename(shard_index) + '.metrics') as f:
+						metrics.merge(json.load(f))
+				except (OSError, ValueError):
+					pass  # the shard was killed
+		return self.__exit_codes
+
+	def exit_codes(self):
+		return self.__exit_codes
+
+	def failed(self):
+		ranges = self.ranges()
+		return [
+			(ranges[i][0], ranges[i][1], self.__exit_codes[i])
+			for i in range(len(self.__exit_codes)) if self.__exit_codes[i] != 0
+		]
+
+	def merge(self, output_obj):
+		# rows are written in the column order of the first shard, so shards may export fields in different order
+		titles = None
+		writer = None
+		for shard_index in range(len(self.__exit_codes)):
+			filename = self.output_filename(shard_index)
+			if os.path.exists(filename) is False:
+				continue
+
+			with open(filename, newline='') as shard_obj:
+				reader = csv.reader(shard_obj)
+				shard_titles = next(reader, None)
+				if shard_titles is None:
+					continue
+				if titles is None:
+					titles = shard_titles
+					writer = csv.writer(output_obj)
+					writer.writerow(titles)
+				elif sorted(shard_titles) != sorted(titles):
+					raise RuntimeError('Shard outputs have different columns')
+
+				columns = [shard_titles.index(x) for x in titles]
+				for row in reader:
+					writer.writerow([row[x] for x in columns])
+		output_obj.flush()
+
+	def cleanup(self):
+		shutil.rmtree(self.__directory, ignore_errors=True)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.cleanup()
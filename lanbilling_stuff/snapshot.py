@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/snapshot.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import json
+import time
+import sqlite3
+import hashlib
+
+from zeep.helpers import serialize_object
+
+from wasp_general.verify import verify_type, verify_value
+
+
+class WLanbillingSnapshot:
+
+	schema_statements = (
+		'CREATE TABLE IF NOT EXISTS vgroups ('
+		'vgid INTEGER PRIMARY KEY, agentid INTEGER, tarid INTEGER, login TEXT, archive INTEGER, '
+		'digest TEXT NOT NULL, data TEXT NOT NULL)',
+		'CREATE INDEX IF NOT EXISTS vgroups_agentid ON vgroups (agentid)',
+		'CREATE INDEX IF NOT EXISTS vgroups_tarid ON vgroups (tarid)',
+		'CREATE INDEX IF NOT EXISTS vgroups_login ON vgroups (login)',
+		'CREATE TABLE IF NOT EXISTS tariffs ('
+		'tarid INTEGER PRIMARY KEY, type INTEGER, digest TEXT NOT NULL, data TEXT NOT NULL)',
+		'CREATE INDEX IF NOT EXISTS tariffs_type ON tariffs (type)',
+		'CREATE TABLE IF NOT EXISTS agents (id INTEGER PRIMARY KEY, data TEXT NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS refreshes (dataset TEXT PRIMARY KEY, refreshed_at REAL NOT NULL)'
+	)
+
+	@verify_type(filename=str)
+	@verify_value(filename=lambda x: len(x) > 0)
+	def __init__(self, filename):
+		self.__filename = filename
+		self.__db = sqlite3.connect(filename)
+		for statement in self.schema_statements:
+			self.__db.execute(statement)
+		self.__db.commit()
+
+	def filename(self):
+		return self.__filename
+
+	def close(self):
+		self.__db.close()
+
+	@staticmethod
+	def serialize(record):
+		return json.dumps(serialize_object(record, dict), default=str, sort_keys=True)
+
+	@staticmethod
+	def digest(data):
+		return hashlib.sha1(data.encode()).hexdigest()
+
+	@staticmethod
+	def __field(record, name):
+		return record[name] if name in record else None
+
+	def __digests(self, table, id_field):
+		return dict(self.__db.execute('SELECT %s, digest FROM %s' % (id_field, table)))
+
+	def __mark_refreshed(self, dataset):
+		self.__db.execute(
+			'INSERT OR REPLACE INTO refreshes (dataset, refreshed_at) VALUES (?, ?)', (dataset, time.time())
+		)
+
+	def refreshed_at(self, dataset):
+		row = self.__db.execute('SELECT refreshed_at FROM refreshes WHERE dataset = ?', (dataset, )).fetchone()
+		return row[0] if row is not None else None
+
+	def refresh_vgroups(self, rpc_obj, full=False):
+		current = self.__digests('vgroups', 'vgid') if full is False else {}
+		if full is True:
+			self.__db.execute('DELETE FROM vgroups')
+
+		fetched_ids = set()
+		updated = 0
+		for record in rpc_obj.getVgroups({}):
+			vg_id = record['vgid']
+			fetched_ids.add(vg_id)
+			data = self.serialize(record)
+			digest = self.digest(data)
+			if current.get(vg_id) == digest:
+				continue
+			self.__db.execute(
+				'INSERT OR REPLACE INTO vgroups (vgid, agentid, tarid, login, archive, digest, data) '
+				'VALUES (?, ?, ?, ?, ?, ?, ?)', (
+					vg_id, self.__field(record, 'id'), self.__field(record, 'tarid'),
+					self.__field(record, 'login'), self.__field(record, 'archive'), digest, data
+				)
+			)
+			updated += 1
+
+		removed = set(current.keys()).difference(fetched_ids)
+		self.__db.executemany('DELETE FROM vgroups WHERE vgid = ?', ((x, ) for x in removed))
+		self.__mark_refreshed('vgroups')
+		self.__db.commit()
+		return len(fetched_ids), updated, len(removed)
+
+	def refresh_tariffs(self, rpc_obj, full=False):
+		current = self.__digests('tariffs', 'tarid') if full is False else {}
+		if full is True:
+			self.__db.execute('DELETE FROM tariffs')
+
+		fetched_ids = set()
+		updated = 0
+		for summary in rpc_obj.getTarifs():
+			tar_id = summary['id']
+			fetched_ids.add(tar_id)
+
+			# the summary does not have rent, shapes and other settings, so every tariff is fetched and compared
+			# as a whole. There are few tariffs, unlike vgroups
+			tariff = rpc_obj.getTarif(tar_id)
+			if len(tariff) != 1:
+				continue
+			tariff = tariff[0]
+			data = self.serialize(tariff)
+			digest = self.digest(data)
+			if current.get(tar_id) == digest:
+				continue
+			self.__db.execute(
+				'INSERT OR REPLACE INTO tariffs (tarid, type, digest, data) VALUES (?, ?, ?, ?)',
+				(tar_id, tariff['tarif']['type'], digest, data)
+			)
+			updated += 1
+
+		removed = set(current.keys()).difference(fetched_ids)
+		self.__db.executemany('DELETE FROM tariffs WHERE tarid = ?', ((x, ) for x in removed))
+		self.__mark_refreshed('tariffs')
+		self.__db.commit()
+		return len(fetched_ids), updated, len(removed)
+
+	def refresh_agents(self, rpc_obj):
+		agents = rpc_obj.getAgents()
+		self.__db.execute('DELETE FROM agents')
+		self.__db.executemany(
+			'INSERT INTO agents (id, data) VALUES (?, ?)', ((x['id'], self.serialize(x)) for x in agents)
+		)
+		self.__mark_refreshed('agents')
+		self.__db.commit()
+		return len(agents)
+
+	def vgroups(
+		self, from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None, login=None, vgroup_agent_id=None,
+		archived_vgroups=None
+	):
+		conditions = []
+		params = []
+		for condition, value in (
+			('vgid >= ?', from_vg_id),
+			('vgid <= ?', to_vg_id),
+			('tarid >= ?', from_tar_id),
+			('tarid <= ?', to_tar_id),
+			('agentid = ?', vgroup_agent_id),
+			('archive = ?', (int(archived_vgroups) if archived_vgroups is not None else None))
+		):
+			if value is not None:
+				conditions.append(condition)
+				params.append(value)
+		if login is not None:
+			conditions.append('instr(login, ?) > 0')
+			params.append(login)
+
+		query = 'SELECT data FROM vgroups'
+		if len(conditions) > 0:
+			query += ' WHERE ' + ' AND '.join(conditions)
+		query += ' ORDER BY vgid'
+		return map(lambda x: json.loads(x[0]), self.__db.execute(query, params))
+
+	def tariff_ids(self, from_tar_id=None, to_tar_id=None):
+		conditions = []
+		params = []
+		for condition, value in (('tarid >= ?', from_tar_id), ('tarid <= ?', to_tar_id)):
+			if value is not None:
+				conditions.append(condition)
+				params.append(value)
+
+		query = 'SELECT tarid FROM tariffs'
+		if len(conditions) > 0:
+			query += ' WHERE ' + ' AND '.join(conditions)
+		query += ' ORDER BY tarid'
+		return [x[0] for x in self.__db.execute(query, params)]
+
+	def tariff(self, tar_id):
+		row = self.__db.execute('SELECT data FROM tariffs WHERE tarid = ?', (tar_id, )).fetchone()
+		return json.loads(row[0]) if row is not None else None
+
+	def agents(self):
+		return [json.loads(x[0]) for x in self.__db.execute('SELECT data FROM agents ORDER BY id')]
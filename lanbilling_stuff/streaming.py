@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/streaming.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import logging
+
+import zeep.exceptions
+from lxml import etree
+from zeep.wsdl.utils import etree_to_string
+from zeep.wsdl.messages import DocumentMessage
+from zeep.wsdl.bindings.soap import Soap11Binding
+
+from wasp_general.verify import verify_type, verify_value
+
+from lanbilling_stuff.records import WCompactRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+class WStreamingDecoder:
+	# Decodes records of a bulk listing call (like getVgroups or getTarifs) while the response is received. zeep
+	# builds a tree of the whole response and converts it to objects before the first record is returned, so a large
+	# response takes a few times its size in memory. This decoder feeds the response body to a pull parser chunk by
+	# chunk, converts every record element to a compact record as soon as the element is parsed and drops the
+	# element. Only document/literal SOAP 1.1 operations whose response has a single repeated element
+	# (like "getVgroupsResponse(ret: soapVgroups[])") are supported
+
+	chunk_size = 64 * 1024
+
+	soap_envelope_ns = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+	def __init__(self, soap_service, method_name, record_cls, response_element, record_element):
+		self.__binding = soap_service._binding
+		self.__method_name = method_name
+		self.__record_cls = record_cls
+		self.__response_tag = response_element.qname.text
+		self.__record_tag = record_element.qname.text
+		self.__fault_tag = '{%s}Fault' % self.soap_envelope_ns
+
+		schema = soap_service._client.wsdl.types
+		self.__fields = []
+		self.__decoders = {}
+		self.__repeated_fields = []
+		for field_name, field_element in record_element.type.elements:
+			self.__fields.append(field_name)
+			if field_name in record_cls.omitted_fields:
+				continue
+			if field_element.accepts_multiple is True:
+				self.__repeated_fields.append(len(self.__fields) - 1)
+			self.__decoders[field_element.qname.text] = (
+				len(self.__fields) - 1, field_element.accepts_multiple,
+				self.__field_decoder(field_element, schema)
+			)
+
+	def method_name(self):
+		return self.__method_name
+
+	def record_cls(self):
+		return self.__record_cls
+
+	@staticmethod
+	def __field_decoder(field_element, schema):
+		if hasattr(field_element.type, 'elements') is True:
+			return lambda x: field_element.parse(x, schema)
+
+		# the same conversion that zeep does for simple types, but without the per-element type lookup
+		python_value = field_element.type.pythonvalue
+
+		def decode(element):
+			if element.text is None:
+				return None
+			try:
+				return python_value(element.text)
+			except (TypeError, ValueError):
+				logger.exception('Error during xml -> python translation')
+				return None
+
+		return decode
+
+	def request(self, http_session, soap_service, cookies, timeout, metrics, *args, **kwargs):
+		envelope, headers = soap_service._binding._create(
+			self.__method_name, args, kwargs, client=soap_service._client, options=soap_service._binding_options
+		)
+		message = etree_to_string(envelope)
+		http_session.cookies.update(cookies)
+
+		response = http_session.post(
+			soap_service._binding_options['address'], data=message, headers=headers, timeout=timeout, stream=True
+		)
+		if response.status_code == 200:
+			return response
+
+		try:
+			content = response.content
+		finally:
+			response.close()
+		if metrics is not None:
+			metrics.transferred(self.__method_name, len(message), len(content))
+
+		try:
+			document = etree.fromstring(content, etree.XMLParser(resolve_entities=False, no_network=True))
+		except etree.XMLSyntaxError:
+			raise zeep.exceptions.TransportError(
+				'Server returned response (%i) with invalid XML' % response.status_code,
+				status_code=response.status_code, content=content
+			)
+		self.__binding.process_error(document, self.__binding.get(self.__method_name))
+
+	def records(self, response, metrics=None):
+		parser = etree.XMLPullParser(
+			events=('end', ), tag=(self.__record_tag, self.__fault_tag), resolve_entities=False, no_network=True
+		)
+		received = 0
+		try:
+			for chunk in response.iter_content(chunk_size=self.chunk_size):
+				received += len(chunk)
+				parser.feed(chunk)
+				for record in self.__parsed_records(parser):
+					yield record
+			# a truncated response is an error
+			parser.close()
+			for record in self.__parsed_records(parser):
+				yield record
+		finally:
+			response.close()
+			if metrics is not None:
+				request_body = response.request.body
+				metrics.transferred(
+					self.__method_name, len(request_body) if request_body is not None else 0, received
+				)
+
+	def __parsed_records(self, parser):
+		for event, element in parser.read_events():
+			if element.tag == self.__fault_tag:
+				self.__binding.process_error(
+					element.getroottree().getroot(), self.__binding.get(self.__method_name)
+				)
+
+			parent = element.getparent()
+			if parent is None or parent.tag != self.__response_tag:
+				continue  # a nested element with the same name, it is decoded with its record
+
+			yield self.decode(element)
+
+			# the decoded element and the previous ones are not needed any more
+			element.clear()
+			while element.getprevious() is not None:
+				del parent[0]
+
+	def decode(self, element):
+		values = [None] * len(self.__fields)
+		for index in self.__repeated_fields:
+			values[index] = []
+
+		for child in element:
+			decoder = self.__decoders.get(child.tag)
+			if decoder is None:
+				continue  # zeep does not know the field either
+			index, accepts_multiple, decode = decoder
+			if accepts_multiple is True:
+				values[index].append(decode(child))
+			else:
+				values[index] = decode(child)
+		return self.__record_cls.from_value(dict(zip(self.__fields, values)))
+
+	@classmethod
+	@verify_type(method_name=str)
+	@verify_value(method_name=lambda x: len(x) > 0)
+	def create(cls, soap_service, method_name, record_cls):
+		# returns None if responses of the method can not be decoded by records
+		if issubclass(record_cls, WCompactRecord) is False:
+			raise TypeError('"record_cls" must be a WCompactRecord subclass')
+
+		binding = soap_service._binding
+		if isinstance(binding, Soap11Binding) is False:
+			return None
+		try:
+			operation = binding.get(method_name)
+		except ValueError:
+			return None
+		if isinstance(operation.output, DocumentMessage) is False:
+			return None
+
+		response_element = operation.output.body
+		if response_element is None or hasattr(response_element.type, 'elements') is False:
+			return None
+		response_fields = response_element.type.elements
+		if len(response_fields) != 1:
+			return None
+
+		record_element = response_fields[0][1]
+		if record_element.accepts_multiple is False or hasattr(record_element.type, 'elements') is False:
+			return None
+		return cls(soap_service, method_name, record_cls, response_element, record_element)
@@ -27,13 +27,20 @@ from lanbilling_stuff.version import __author__, __version__, __credits__, __lic
 # noinspection PyUnresolvedReferences
 from lanbilling_stuff.version import __status__
 
+import asyncio
+from collections import deque
 from datetime import datetime
 
 from wasp_general.verify import verify_type, verify_value
 from wasp_general.csv import WCSVExporter
 
 from lanbilling_stuff.rpc import WLanbillingRPC
-from lanbilling_stuff.vgroup import fetch_vgroups
+from lanbilling_stuff.rpc_pool import WLanbillingRPCPool
+from lanbilling_stuff.async_rpc import WLanbillingAsyncRPC
+from lanbilling_stuff.parallel import ordered_imap
+from lanbilling_stuff.snapshot import WLanbillingSnapshot
+from lanbilling_stuff.vgroup import fetch_vgroups, async_fetch_vgroups
+from lanbilling_stuff.records import WCompactRecord, Tariff, TariffSummary, payload_value
 
 
 @verify_type('paranoid', from_vg_id=(int, None), to_vg_id=(int, None), login=(str, None), vgroup_agent_id=(int, None))
@@ -42,44 +49,127 @@ from lanbilling_stuff.vgroup import fetch_vgroups
 @verify_value('paranoid', from_vg_id=lambda x: x is None or x >= 0, to_vg_id=lambda x: x is None or x >= 0)
 @verify_value('paranoid', login=lambda x: x is None or len(x) > 0, vgroup_agent_id=lambda x: x is None or x >= 0)
 @verify_value(from_tar_id=lambda x: x is None or x >= 0, to_tar_id=lambda x: x is None or x >= 0)
+@verify_type(max_workers=(int, None), snapshot=(WLanbillingSnapshot, None))
+@verify_value(max_workers=lambda x: x is None or x > 0)
 def fetch_tariffs(
+	rpc_obj, from_vg_id=None, to_vg_id=None, tariff_type=None, from_tar_id=None, to_tar_id=None, login=None,
+	vgroup_agent_id=None, archived_vgroups=None, max_workers=None, snapshot=None
+):
+
+	tariff_ids = set()
+
+	if vgroups_required(
+		from_vg_id=from_vg_id, to_vg_id=to_vg_id, login=login, vgroup_agent_id=vgroup_agent_id,
+		archived_vgroups=archived_vgroups
+	) is True:
+		vgroups = fetch_vgroups(
+			rpc_obj, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id,
+			to_tar_id=to_tar_id, login=login, vgroup_agent_id=vgroup_agent_id,
+			archived_vgroups=archived_vgroups, snapshot=snapshot,
+			shard_workers=(max_workers if max_workers is not None and max_workers > 1 else None)
+		)
+		tariff_ids.update(map(lambda x: x['tarid'], vgroups))
+	elif from_tar_id is not None and from_tar_id == to_tar_id:
+		tariff_ids.add(from_tar_id)
+	elif snapshot is not None:
+		tariff_ids = snapshot.tariff_ids(from_tar_id=from_tar_id, to_tar_id=to_tar_id)
+	else:
+		tariffs = rpc_obj.stream('getTarifs', TariffSummary) if rpc_obj.streaming() is True else rpc_obj.getTarifs()
+		tariff_ids = filter_tariff_ids(map(lambda x: x['id'], tariffs), from_tar_id=from_tar_id, to_tar_id=to_tar_id)
+
+	if snapshot is not None:
+		result = map(lambda x: snapshot.tariff(x), tariff_ids)
+		result = map(lambda x: [x] if x is not None else [], result)
+	elif max_workers is not None and max_workers > 1:
+		result = _fetch_tariffs_concurrently(rpc_obj, tariff_ids, max_workers)
+	else:
+		result = map(lambda x: rpc_obj.getTarif(x), tariff_ids)
+	return filter_tariffs(result, tariff_type=tariff_type)
+
+
+@verify_type('paranoid', from_vg_id=(int, None), to_vg_id=(int, None), login=(str, None), vgroup_agent_id=(int, None))
+@verify_type('paranoid', archived_vgroups=(bool, None))
+@verify_type(rpc_obj=WLanbillingAsyncRPC, from_tar_id=(int, None), to_tar_id=(int, None), tariff_type=(int, None))
+@verify_value('paranoid', from_vg_id=lambda x: x is None or x >= 0, to_vg_id=lambda x: x is None or x >= 0)
+@verify_value('paranoid', login=lambda x: x is None or len(x) > 0, vgroup_agent_id=lambda x: x is None or x >= 0)
+@verify_value(from_tar_id=lambda x: x is None or x >= 0, to_tar_id=lambda x: x is None or x >= 0)
+async def async_fetch_tariffs(
 	rpc_obj, from_vg_id=None, to_vg_id=None, tariff_type=None, from_tar_id=None, to_tar_id=None, login=None,
 	vgroup_agent_id=None, archived_vgroups=None
 ):
 
 	tariff_ids = set()
-	vgroups_fetched = False
 
+	if vgroups_required(
+		from_vg_id=from_vg_id, to_vg_id=to_vg_id, login=login, vgroup_agent_id=vgroup_agent_id,
+		archived_vgroups=archived_vgroups
+	) is True:
+		async for vgroup in async_fetch_vgroups(
+			rpc_obj, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id,
+			to_tar_id=to_tar_id, login=login, vgroup_agent_id=vgroup_agent_id,
+			archived_vgroups=archived_vgroups
+		):
+			tariff_ids.add(vgroup['tarid'])
+	elif from_tar_id is not None and from_tar_id == to_tar_id:
+		tariff_ids.add(from_tar_id)
+	else:
+		tariff_ids = filter_tariff_ids(
+			map(lambda x: x['id'], await rpc_obj.getTarifs()), from_tar_id=from_tar_id, to_tar_id=to_tar_id
+		)
+
+	window = rpc_obj.concurrency() * 2
+	pending = deque()
+	try:
+		for tariff_id in tariff_ids:
+			pending.append(asyncio.ensure_future(rpc_obj.getTarif(tariff_id)))
+			if len(pending) >= window:
+				for tariff in filter_tariffs([await pending.popleft()], tariff_type=tariff_type):
+					yield tariff
+		while len(pending) > 0:
+			for tariff in filter_tariffs([await pending.popleft()], tariff_type=tariff_type):
+				yield tariff
+	finally:
+		for future in pending:
+			future.cancel()
+
+
+def vgroups_required(from_vg_id=None, to_vg_id=None, login=None, vgroup_agent_id=None, archived_vgroups=None):
 	for attr in [from_vg_id, to_vg_id, login, vgroup_agent_id, archived_vgroups]:
 		if attr is not None:
-			vgroups_fetched = True
-			vgroups = fetch_vgroups(
-				rpc_obj, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id,
-				to_tar_id=to_tar_id, login=login, vgroup_agent_id=vgroup_agent_id,
-				archived_vgroups=archived_vgroups
-			)
-			tariff_ids.update(map(lambda x: x['tarid'], vgroups))
-			break
+			return True
+	return False
 
-	if vgroups_fetched is False:
-		if from_tar_id is not None and from_tar_id == to_tar_id:
-			tariff_ids.add(from_tar_id)
-		else:
-			tariff_ids = map(lambda x: x['id'], rpc_obj.rpc().getTarifs())
-			if from_tar_id is not None:
-				tariff_ids = filter(lambda x: x >= from_tar_id, tariff_ids)
-			if to_tar_id is not None:
-				tariff_ids = filter(lambda x: x <= to_tar_id, tariff_ids)
-
-	result = map(lambda x: rpc_obj.getTarif(x), tariff_ids)
-	result = filter(lambda x: len(x) == 1, result)
-	result = map(lambda x: x[0], result)
+
+def filter_tariff_ids(tariff_ids, from_tar_id=None, to_tar_id=None):
+	if from_tar_id is not None:
+		tariff_ids = filter(lambda x: x >= from_tar_id, tariff_ids)
+	if to_tar_id is not None:
+		tariff_ids = filter(lambda x: x <= to_tar_id, tariff_ids)
+	return tariff_ids
+
+
+def filter_tariffs(get_tarif_results, tariff_type=None):
+	result = filter(lambda x: len(x) == 1, get_tarif_results)
+	result = map(lambda x: Tariff.from_value(x[0]), result)
 	if tariff_type is not None:
 		result = filter(lambda x: x['tarif']['type'] == tariff_type, result)
-
 	return result
 
 
+def _fetch_tariffs_concurrently(rpc_obj, tariff_ids, max_workers):
+	pool = WLanbillingRPCPool(rpc_obj.clone(), size=max_workers)
+
+	def fetch_tariff(tariff_id):
+		with pool.session() as rpc:
+			return rpc.getTarif(tariff_id)
+
+	try:
+		for tariff in ordered_imap(fetch_tariff, tariff_ids, max_workers):
+			yield tariff
+	finally:
+		pool.shutdown()
+
+
 @verify_type(rpc_obj=WLanbillingRPC)
 def assign_tariff(rpc_obj, vg_id, agent_id, tariff_id):
 	rpc_obj.insupdTarifsRasp(0, {
@@ -94,14 +184,32 @@ def assign_tariff(rpc_obj, vg_id, agent_id, tariff_id):
 	})
 
 
+def _freeze(value):
+	if isinstance(value, (list, tuple)) is True:
+		return tuple(_freeze(x) for x in value)
+	if isinstance(value, (dict, WCompactRecord)) is True or hasattr(value, '__values__') is True:
+		return tuple(sorted(((x, _freeze(value[x])) for x in value), key=lambda x: x[0]))
+	return value
+
+
 class TariffCloneGenerator:
 
-	@verify_type(rpc=WLanbillingRPC, tariff_type=int)
-	@verify_value(tariff_type=lambda x: x >= 0)
-	def __init__(self, rpc, tariff_type):
+	fingerprint_omitted_fields = ('tarid', 'type', 'descr', 'descrfull', 'used', 'uuid', 'saledictionaryid')
+
+	clone_actions = ('same_type', 'equal', 'clone', 'unsupported')
+
+	@verify_type(rpc=WLanbillingRPC, tariff_type=int, max_workers=(int, None), tariffs=(list, None))
+	@verify_value(tariff_type=lambda x: x >= 0, max_workers=lambda x: x is None or x > 0)
+	def __init__(self, rpc, tariff_type, max_workers=None, tariffs=None):
 		self.__rpc = rpc
 		self.__tariff_type = tariff_type
-		self.__current_tariffs = list(fetch_tariffs(rpc, tariff_type=self.__tariff_type))
+		if tariffs is not None:
+			self.__current_tariffs = [x for x in tariffs if x['tarif']['type'] == tariff_type]
+		else:
+			self.__current_tariffs = list(
+				fetch_tariffs(rpc, tariff_type=self.__tariff_type, max_workers=max_workers)
+			)
+		self.__tariffs_index = None
 
 	def rpc(self):
 		return self.__rpc
@@ -113,15 +221,15 @@ class TariffCloneGenerator:
 		return self.__current_tariffs
 
 	def supported_tariff(self, tariff):
-		if tariff['sizeshapes'] != []:
+		if len(tariff['sizeshapes']) > 0:
 			return False
-		if tariff['timeshapes'] != []:
+		if len(tariff['timeshapes']) > 0:
 			return False
 		if tariff['tarif']['trafflimit'] != 0:
 			return False
 		if tariff['tarif']['archive'] != 0:
 			return False
-		if tariff['tarif']['catnumbers'] != []:
+		if len(tariff['tarif']['catnumbers']) > 0:
 			return False
 		if tariff['tarif']['additional'] != 0:
 			return False
@@ -129,24 +237,32 @@ class TariffCloneGenerator:
 			return False
 		return True
 
-	def compare_tariffs(self, tariff_a, tariff_b):
-		if tariff_a['sizeshapes'] != tariff_b['sizeshapes']:
-			return False
-
-		if tariff_a['timeshapes'] != tariff_b['timeshapes']:
-			return False
-
-		dict_a = {x: tariff_a['tarif'][x] for x in tariff_a['tarif']}
-		dict_b = {x: tariff_b['tarif'][x] for x in tariff_b['tarif']}
-
-		for key in ['tarid', 'type', 'descr', 'descrfull', 'used', 'uuid', 'saledictionaryid']:
-			del dict_a[key]
-			del dict_b[key]
-
-		return dict_a == dict_b
+	def tariff_fingerprint(self, tariff):
+		tariff_record = tariff['tarif']
+		return (
+			_freeze(tariff['sizeshapes']),
+			_freeze(tariff['timeshapes']),
+			tuple(sorted(
+				((x, _freeze(tariff_record[x])) for x in tariff_record if x not in self.fingerprint_omitted_fields),
+				key=lambda x: x[0]
+			))
+		)
+
+	def destination_fingerprint(self, tariff):
+		return self.tariff_fingerprint(tariff)
+
+	def tariffs_index(self):
+		if self.__tariffs_index is None:
+			index = {}
+			for tariff in self.current_tariffs():
+				fingerprint = self.destination_fingerprint(tariff)
+				if fingerprint is not None:
+					index.setdefault(fingerprint, []).append(tariff)
+			self.__tariffs_index = index
+		return self.__tariffs_index
 
 	def clone_request(self, tariff):
-		tariff_dict = {x: tariff['tarif'][x] for x in tariff['tarif']}
+		tariff_dict = {x: payload_value(tariff['tarif'][x]) for x in tariff['tarif']}
 		tariff_dict['tarid'] = 0
 		tariff_dict['type'] = self.tariff_type()
 		del tariff_dict['uuid']
@@ -159,26 +275,53 @@ class TariffCloneGenerator:
 
 	def find_equal(self, tariff):
 		if self.supported_tariff(tariff) is False:
-			raise ValueError('Unsupported tariff spotted (tar_id=%i)' % tariff)
+			raise ValueError('Unsupported tariff spotted (tar_id=%i)' % tariff['tarif']['tarid'])
 
 		equal_tariff = None
-		for check_t in self.current_tariffs():
-			if self.compare_tariffs(tariff, check_t) is True:
-				if self.supported_tariff(check_t) is True:
-					equal_tariff = check_t
-					break
-				else:
-					print(
-						'Skipping unsupported tariff with tar_id=%i' %
-						check_t['tarif']['tarid']
-					)
+		for check_t in self.tariffs_index().get(self.tariff_fingerprint(tariff), []):
+			if self.supported_tariff(check_t) is True:
+				equal_tariff = check_t
+				break
+			else:
+				print(
+					'Skipping unsupported tariff with tar_id=%i' %
+					check_t['tarif']['tarid']
+				)
 		return equal_tariff
 
+	def clone_action(self, tariff):
+		if tariff['tarif']['type'] == self.tariff_type():
+			return 'same_type', tariff
+		if self.supported_tariff(tariff) is False:
+			return 'unsupported', None
+
+		equal_tariff = self.find_equal(tariff)
+		if equal_tariff is None:
+			return 'clone', None
+		return 'equal', equal_tariff
+
 	@verify_type(report_filename=(str, None))
 	@verify_value(report_filename=lambda x: x is None or len(x) > 0)
-	def clone(self, original_tariffs, report_filename=None):
-		tariff_type = self.tariff_type()
+	def plan(self, original_tariffs, report_filename=None):
+		if report_filename is None:
+			report_filename = '/dev/null'
+
+		exporter = WCSVExporter(open(report_filename, 'w'))
+		counts = {x: 0 for x in self.clone_actions}
 
+		for original_t in original_tariffs:
+			action, equal_tariff = self.clone_action(original_t)
+			counts[action] += 1
+			exporter.export({
+				'source_tar_id': original_t['tarif']['tarid'],
+				'action': action,
+				'equal_tar_id': (equal_tariff['tarif']['tarid'] if equal_tariff is not None else None)
+			})
+		return counts
+
+	@verify_type(report_filename=(str, None))
+	@verify_value(report_filename=lambda x: x is None or len(x) > 0)
+	def clone(self, original_tariffs, report_filename=None):
 		if report_filename is None:
 			report_filename = '/dev/null'
 
@@ -186,8 +329,9 @@ class TariffCloneGenerator:
 
 		for original_t in original_tariffs:
 			original_id = original_t['tarif']['tarid']
+			action, equal_tariff = self.clone_action(original_t)
 
-			if original_t['tarif']['type'] == tariff_type:
+			if action == 'same_type':
 				print('Skipping tariff with tar_id=%i. Tariff has destination type already' % original_id)
 				exporter.export({
 					'source_tar_id': original_id,
@@ -196,8 +340,10 @@ class TariffCloneGenerator:
 				})
 				continue
 
-			equal_tariff = self.find_equal(original_t)
-			if equal_tariff is None:
+			if action == 'unsupported':
+				raise ValueError('Unsupported tariff spotted (tar_id=%i)' % original_id)
+
+			if action == 'clone':
 				print('Tariff with tar_id=%i will be cloned' % original_id)
 				clone_id = self.clone_tariff(original_t)
 				print('Cloned tariff tar_id - %i' % clone_id)
@@ -221,22 +367,32 @@ class TariffCloneGenerator:
 
 class TariffPrefixCloneGenerator(TariffCloneGenerator):
 
-	@verify_type('paranoid', rpc=WLanbillingRPC, tariff_type=int)
-	@verify_value('paranoid', tariff_type=lambda x: x >= 0)
+	@verify_type('paranoid', rpc=WLanbillingRPC, tariff_type=int, max_workers=(int, None), tariffs=(list, None))
+	@verify_value('paranoid', tariff_type=lambda x: x >= 0, max_workers=lambda x: x is None or x > 0)
 	@verify_type(prefix=(str, None))
-	def __init__(self, rpc, tariff_type, prefix=None):
-		TariffCloneGenerator.__init__(self, rpc, tariff_type)
+	def __init__(self, rpc, tariff_type, prefix=None, max_workers=None, tariffs=None):
+		TariffCloneGenerator.__init__(self, rpc, tariff_type, max_workers=max_workers, tariffs=tariffs)
 		self.__tariff_prefix = prefix
 
 	def tariff_prefix(self):
 		return self.__tariff_prefix
 
-	def compare_tariffs(self, tariff_a, tariff_b):
+	def tariff_fingerprint(self, tariff):
+		fingerprint = TariffCloneGenerator.tariff_fingerprint(self, tariff)
+		if self.tariff_prefix() is None:
+			return fingerprint
+		return fingerprint + (tariff['tarif']['descr'], )
+
+	def destination_fingerprint(self, tariff):
+		fingerprint = TariffCloneGenerator.tariff_fingerprint(self, tariff)
 		prefix = self.tariff_prefix()
-		if prefix is not None:
-			if tariff_b['tarif']['descr'] != (prefix + tariff_a['tarif']['descr']):
-				return False
-		return TariffCloneGenerator.compare_tariffs(self, tariff_a, tariff_b)
+		if prefix is None:
+			return fingerprint
+
+		descr = tariff['tarif']['descr']
+		if descr is None or descr.startswith(prefix) is False:
+			return None
+		return fingerprint + (descr[len(prefix):], )
 
 	def clone_request(self, tariff):
 		request = TariffCloneGenerator.clone_request(self, tariff)
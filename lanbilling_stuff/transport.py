@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/transport.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from zeep.transports import Transport as SOAPTransport
+
+from wasp_general.verify import verify_type, verify_value
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.cassette import WRPCCassette, WCassetteTransport
+
+
+class WTransportSettings:
+
+	@verify_type(pool_size=int, compression=bool, timeout=(int, float), operation_timeout=(int, float, None))
+	@verify_value(pool_size=lambda x: x > 0, timeout=lambda x: x > 0)
+	@verify_value(operation_timeout=lambda x: x is None or x > 0)
+	def __init__(self, pool_size=1, compression=True, timeout=300, operation_timeout=None):
+		self.__pool_size = pool_size
+		self.__compression = compression
+		self.__timeout = timeout
+		self.__operation_timeout = operation_timeout
+
+	def pool_size(self):
+		return self.__pool_size
+
+	def compression(self):
+		return self.__compression
+
+	def timeout(self):
+		return self.__timeout
+
+	def operation_timeout(self):
+		return self.__operation_timeout
+
+	def session(self):
+		session = Session()
+		adapter = HTTPAdapter(pool_connections=self.__pool_size, pool_maxsize=self.__pool_size, pool_block=True)
+		session.mount('http://', adapter)
+		session.mount('https://', adapter)
+		session.headers['Connection'] = 'keep-alive'
+		session.headers['Accept-Encoding'] = 'gzip, deflate' if self.__compression is True else 'identity'
+		return session
+
+	@verify_type(cassette=(WRPCCassette, None))
+	def transport(self, session, cache=None, cassette=None):
+		if cassette is not None:
+			return WCassetteTransport(
+				cassette, cache=cache, timeout=self.__timeout, operation_timeout=self.__operation_timeout,
+				session=session
+			)
+		return SOAPTransport(
+			cache=cache, timeout=self.__timeout, operation_timeout=self.__operation_timeout, session=session
+		)
+
+	@classmethod
+	@verify_type(config=WConfig, section_name=str)
+	@verify_value(section_name=lambda x: len(x) > 0)
+	def from_configuration(cls, config, section_name):
+		kwargs = {}
+
+		for option_name, arg_name, cast in (
+			('http_pool_size', 'pool_size', int),
+			('http_timeout', 'timeout', float),
+			('http_operation_timeout', 'operation_timeout', float)
+		):
+			if config.has_option(section_name, option_name) is True:
+				value = config[section_name][option_name].strip()
+				if len(value) > 0:
+					kwargs[arg_name] = cast(value)
+
+		if config.has_option(section_name, 'http_compression') is True:
+			value = config[section_name]['http_compression'].strip()
+			if len(value) > 0:
+				kwargs['compression'] = config.getboolean(section_name, 'http_compression')
+
+		return cls(**kwargs)
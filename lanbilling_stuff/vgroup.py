@@ -27,8 +27,19 @@ from lanbilling_stuff.version import __author__, __version__, __credits__, __lic
 # noinspection PyUnresolvedReferences
 from lanbilling_stuff.version import __status__
 
+import heapq
+import logging
+
 from wasp_general.verify import verify_type, verify_value
 from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.async_rpc import WLanbillingAsyncRPC
+from lanbilling_stuff.rpc_pool import WLanbillingRPCPool
+from lanbilling_stuff.parallel import ordered_imap
+from lanbilling_stuff.snapshot import WLanbillingSnapshot
+from lanbilling_stuff.records import VGroupSummary, VGroupDetail, TariffSummary
+
+
+logger = logging.getLogger(__name__)
 
 
 @verify_type(rpc_obj=WLanbillingRPC, from_vg_id=(int, None), to_vg_id=(int, None), from_tar_id=(int, None))
@@ -36,17 +47,232 @@ from lanbilling_stuff.rpc import WLanbillingRPC
 @verify_value(from_vg_id=lambda x: x is None or x >= 0, to_vg_id=lambda x: x is None or x >= 0)
 @verify_value(from_tar_id=lambda x: x is None or x >= 0, to_tar_id=lambda x: x is None or x >= 0)
 @verify_value(login=lambda x: x is None or len(x) > 0, vgroup_agent_id=lambda x: x is None or x >= 0)
+@verify_type(snapshot=(WLanbillingSnapshot, None), page_size=(int, None), max_planned_requests=int)
+@verify_value(page_size=lambda x: x is None or x > 0, max_planned_requests=lambda x: x >= 0)
+@verify_type(shard_workers=(int, None), order_by_vgid=bool)
+@verify_value(shard_workers=lambda x: x is None or x > 0)
+@verify_type(full_scan_size=(int, None))
+@verify_value(full_scan_size=lambda x: x is None or x >= 0)
 def fetch_vgroups(
+	rpc_obj, from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None, login=None, vgroup_agent_id=None,
+	archived_vgroups=None, snapshot=None, page_size=None, max_planned_requests=32, shard_workers=None,
+	order_by_vgid=False, full_scan_size=None
+):
+
+	if snapshot is not None:
+		return map(VGroupSummary.from_value, snapshot.vgroups(
+			from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id, to_tar_id=to_tar_id,
+			login=login, vgroup_agent_id=vgroup_agent_id, archived_vgroups=archived_vgroups
+		))
+
+	request_param = vgroups_request(
+		from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id, to_tar_id=to_tar_id, login=login,
+		vgroup_agent_id=vgroup_agent_id, archived_vgroups=archived_vgroups
+	)
+	plan_name, requests = plan_vgroups_requests(
+		rpc_obj, request_param, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id,
+		to_tar_id=to_tar_id, max_requests=max_planned_requests, full_scan_size=full_scan_size
+	)
+	logger.info('Vgroups are fetched with "%s" plan (%i request(s))', plan_name, len(requests))
+
+	if plan_name == 'full scan' and shard_workers is not None and vgroup_agent_id is None:
+		logger.info('Full scan is split into per-agent shards (%i worker(s))', shard_workers)
+		return _fetch_vgroups_by_agents(
+			rpc_obj, request_param, shard_workers, order_by_vgid, from_vg_id=from_vg_id, to_vg_id=to_vg_id,
+			from_tar_id=from_tar_id, to_tar_id=to_tar_id
+		)
+
+	if plan_name not in ('full scan', 'narrowed request'):
+		records = _fetch_vgroups_requests(rpc_obj, requests)
+	elif page_size is not None:
+		records = _fetch_vgroups_pages(rpc_obj, request_param, page_size)
+	else:
+		records = _get_vgroups(rpc_obj, request_param)
+	return map(VGroupSummary.from_value, filter_vgroups(
+		records, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id, to_tar_id=to_tar_id
+	))
+
+
+# cost of a single getVgroups request in records of a response. A request takes about the time that a large
+# response needs to transfer this many records
+vgroups_request_cost = 50
+
+
+def plan_vgroups_requests(
+	rpc_obj, request_param, from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None, max_requests=32,
+	full_scan_size=None
+):
+	# A plan of several filtered requests is chosen only when it is cheaper than a single full scan. A cost is the
+	# number of requests (in records, see vgroups_request_cost) plus the number of transferred records. vgids are
+	# assigned incrementally, so the full scan is estimated to have at least "to_vg_id" records. When the full scan
+	# size is unknown a plan may have "max_requests" requests at most. Zero "max_requests" disables planning. A
+	# request that the server narrows already (by a login, an agent or a single vgid) is never split
+	if max_requests == 0:
+		return 'full scan', [request_param]
+
+	narrowed_by = [x for x in ('vgid', 'login', 'agentid') if x in request_param]
+	if len(narrowed_by) > 0:
+		logger.info('Request is not split, it is narrowed by "%s" already', '", "'.join(narrowed_by))
+		return 'narrowed request', [request_param]
+
+	if full_scan_size is None and to_vg_id is not None:
+		full_scan_size = to_vg_id
+	full_scan_cost = (vgroups_request_cost + full_scan_size) if full_scan_size is not None else None
+
+	def plan_cost(plan_name, requests, records):
+		if full_scan_cost is None:
+			if requests > max_requests:
+				logger.info(
+					'%s plan is rejected: %i requests with unknown full scan size (the limit is %i requests)',
+					plan_name, requests, max_requests
+				)
+				return None
+			return requests * vgroups_request_cost
+
+		cost = requests * vgroups_request_cost + records
+		if cost >= full_scan_cost:
+			logger.info(
+				'%s plan is rejected: %i requests cost about %i records, the full scan - about %i records',
+				plan_name, requests, cost, full_scan_cost
+			)
+			return None
+		return cost
+
+	plans = []
+
+	if from_vg_id is not None and to_vg_id is not None:
+		vg_ids = range(from_vg_id, to_vg_id + 1)
+		# every request returns a single record at most
+		cost = plan_cost('Per-vgid', len(vg_ids), len(vg_ids))
+		if cost is not None:
+			plans.append((cost, 'vgid', vg_ids))
+
+	if 'tarid' not in request_param and (from_tar_id is not None or to_tar_id is not None):
+		# even a single per-tarid request is not cheaper than a single per-vgid request, so getTarifs is skipped
+		if len(plans) == 0 or len(plans[0][2]) > 1:
+			tariffs = rpc_obj.stream('getTarifs', TariffSummary) if rpc_obj.streaming() is True else rpc_obj.getTarifs()
+			all_tariff_ids = [x['id'] for x in tariffs]
+			tariff_ids = [
+				x for x in all_tariff_ids
+				if (from_tar_id is None or x >= from_tar_id) and (to_tar_id is None or x <= to_tar_id)
+			]
+			if len(all_tariff_ids) > 0:
+				# vgroups are assumed to be spread over tariffs evenly
+				records = ((full_scan_size or 0) * len(tariff_ids)) // len(all_tariff_ids)
+				cost = plan_cost('Per-tarid', len(tariff_ids), records)
+				if cost is not None:
+					plans.append((cost, 'tarid', tariff_ids))
+
+	if len(plans) == 0:
+		return 'full scan', [request_param]
+
+	cost, field, values = min(plans, key=lambda x: x[0])
+	requests = []
+	for value in values:
+		request = request_param.copy()
+		request[field] = value
+		requests.append(request)
+	return 'per-' + field, requests
+
+
+def _get_vgroups(rpc_obj, request_param):
+	if rpc_obj.streaming() is True:
+		return rpc_obj.stream('getVgroups', VGroupSummary, request_param)
+	# the response cache does not keep getVgroups results, so the call is retried and measured only
+	return rpc_obj.getVgroups(request_param)
+
+
+def _fetch_vgroups_requests(rpc_obj, requests):
+	fetched_ids = set()
+	for request in requests:
+		for record in _get_vgroups(rpc_obj, request):
+			vg_id = record['vgid']
+			if vg_id not in fetched_ids:
+				fetched_ids.add(vg_id)
+				yield record
+
+
+def _fetch_vgroups_by_agents(rpc_obj, request_param, workers, order_by_vgid, **filters):
+	agent_ids = [x['id'] for x in rpc_obj.getAgents()]
+	pool = WLanbillingRPCPool(rpc_obj.clone(), size=workers)
+
+	def fetch_shard(agent_id):
+		shard_request = request_param.copy()
+		shard_request['agentid'] = agent_id
+		with pool.session() as rpc:
+			# shards are kept until they are merged, so zeep objects are replaced by compact records at once
+			records = list(map(VGroupSummary.from_value, filter_vgroups(_get_vgroups(rpc, shard_request), **filters)))
+		if order_by_vgid is True:
+			records.sort(key=lambda x: x['vgid'])
+		return records
+
+	# shards make a full scan faster, but every shard is a whole server response. Without ordering at most "workers"
+	# shards are kept at once. Merging by vgid needs every shard, so all the records are kept in memory till the
+	# last shard is fetched
+	try:
+		if order_by_vgid is True:
+			records = heapq.merge(*ordered_imap(fetch_shard, agent_ids, workers), key=lambda x: x['vgid'])
+		else:
+			shards = ordered_imap(fetch_shard, agent_ids, workers, window=workers)
+			records = (x for shard in shards for x in shard)
+		for record in records:
+			yield record
+	finally:
+		pool.shutdown()
+
+
+def _fetch_vgroups_pages(rpc_obj, request_param, page_size):
+	page_number = 1
+	previous_first_vg_id = None
+	while True:
+		page_request = request_param.copy()
+		page_request['pgnum'] = page_number
+		page_request['pgsize'] = page_size
+
+		page_length = 0
+		for record in _get_vgroups(rpc_obj, page_request):
+			if page_length == 0:
+				if record['vgid'] == previous_first_vg_id:
+					# the server ignores paging and the whole result (of exactly page_size records) was returned
+					return
+				previous_first_vg_id = record['vgid']
+			page_length += 1
+			yield record
+
+		if page_length != page_size:
+			# the last page or the server does not support paging and the whole result was returned
+			break
+		page_number += 1
+
+
+@verify_type(rpc_obj=WLanbillingAsyncRPC, from_vg_id=(int, None), to_vg_id=(int, None), from_tar_id=(int, None))
+@verify_type(to_tar_id=(int, None), login=(str, None), vgroup_agent_id=(int, None), archived_vgroups=(bool, None))
+@verify_value(from_vg_id=lambda x: x is None or x >= 0, to_vg_id=lambda x: x is None or x >= 0)
+@verify_value(from_tar_id=lambda x: x is None or x >= 0, to_tar_id=lambda x: x is None or x >= 0)
+@verify_value(login=lambda x: x is None or len(x) > 0, vgroup_agent_id=lambda x: x is None or x >= 0)
+async def async_fetch_vgroups(
 	rpc_obj, from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None, login=None, vgroup_agent_id=None,
 	archived_vgroups=None
 ):
 
+	request_param = vgroups_request(
+		from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id, to_tar_id=to_tar_id, login=login,
+		vgroup_agent_id=vgroup_agent_id, archived_vgroups=archived_vgroups
+	)
+	records = await rpc_obj.getVgroups(request_param)
+	for record in filter_vgroups(
+		records, from_vg_id=from_vg_id, to_vg_id=to_vg_id, from_tar_id=from_tar_id, to_tar_id=to_tar_id
+	):
+		yield VGroupSummary.from_value(record)
+
+
+def vgroups_request(
+	from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None, login=None, vgroup_agent_id=None,
+	archived_vgroups=None
+):
 	request_param = {}
-	single_vg_id = False
-	single_tar_id = False
 
 	if from_vg_id is not None and from_vg_id == to_vg_id:
-		single_vg_id = True
 		request_param['vgid'] = from_vg_id
 	if login is not None:
 		request_param['login'] = login
@@ -55,10 +281,14 @@ def fetch_vgroups(
 	if archived_vgroups is not None:
 		request_param['archive'] = int(archived_vgroups)
 	if from_tar_id is not None and from_tar_id == to_tar_id:
-		single_tar_id = True
 		request_param['tarid'] = from_tar_id
 
-	records = rpc_obj.rpc().getVgroups(request_param)
+	return request_param
+
+
+def filter_vgroups(records, from_vg_id=None, to_vg_id=None, from_tar_id=None, to_tar_id=None):
+	single_vg_id = from_vg_id is not None and from_vg_id == to_vg_id
+	single_tar_id = from_tar_id is not None and from_tar_id == to_tar_id
 
 	if single_vg_id is False:
 		if from_vg_id is not None:
@@ -75,6 +305,33 @@ def fetch_vgroups(
 	return records
 
 
+@verify_type(rpc_obj=WLanbillingRPC, vg_id=int)
+@verify_value(vg_id=lambda x: x >= 0)
+def fetch_vgroup_details(rpc_obj, vg_id):
+	return [VGroupDetail.from_value(x) for x in rpc_obj.getVgroup(vg_id)]
+
+
+@verify_type(rpc_obj=WLanbillingRPC, max_workers=(int, None))
+@verify_value(max_workers=lambda x: x is None or x > 0)
+def fetch_vgroups_details(rpc_obj, vg_ids, max_workers=None):
+	if max_workers is None or max_workers == 1:
+		for vg_id in vg_ids:
+			yield fetch_vgroup_details(rpc_obj, vg_id)
+		return
+
+	pool = WLanbillingRPCPool(rpc_obj.clone(), size=max_workers)
+
+	def fetch_vgroup(vg_id):
+		with pool.session() as rpc:
+			return fetch_vgroup_details(rpc, vg_id)
+
+	try:
+		for vgroup in ordered_imap(fetch_vgroup, vg_ids, max_workers):
+			yield vgroup
+	finally:
+		pool.shutdown()
+
+
 @verify_type(rpc_obj=WLanbillingRPC, vg_id=int, agent_id=int)
 @verify_value(vg_id=lambda x: x >= 0, agent_id=lambda x: x >= 0)
 def disable_vgroup(rpc_obj, vg_id, agent_id):
@@ -85,3 +342,20 @@ def disable_vgroup(rpc_obj, vg_id, agent_id):
 @verify_value(vg_id=lambda x: x >= 0, agent_id=lambda x: x >= 0)
 def unblock_vgroup(rpc_obj, vg_id, agent_id):
 	rpc_obj.insBlkRasp({'recordid': 0, 'vgid': vg_id, 'id': agent_id, 'blkreq': 0})
+
+
+@verify_type(rpc_obj=WLanbillingRPC, vg_id=int, ip_details=(int, None), port_details=(int, None))
+@verify_value(vg_id=lambda x: x >= 0)
+@verify_value(ip_details=lambda x: x is None or x in (0, 1), port_details=lambda x: x is None or x in (0, 1))
+def update_vgroup(rpc_obj, vg_id, ip_details=None, port_details=None):
+	vgroup_details = rpc_obj.getVgroup(vg_id)
+	assert (len(vgroup_details) == 1)
+	vgroup_details = vgroup_details[0]
+
+	if ip_details is not None:
+		vgroup_details['vgroup']['ipdet'] = ip_details
+
+	if port_details is not None:
+		vgroup_details['vgroup']['portdet'] = port_details
+
+	rpc_obj.insupdVgroup(0, vgroup_details)
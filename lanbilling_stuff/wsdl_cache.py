@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# lanbilling_stuff/wsdl_cache.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+# TODO: document the code
+# TODO: write tests for the code
+
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __author__, __version__, __credits__, __license__, __copyright__, __email__
+# noinspection PyUnresolvedReferences
+from lanbilling_stuff.version import __status__
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+import zeep.cache
+from zeep.wsdl import Document as WSDLDocument
+
+from wasp_general.verify import verify_type, verify_value
+
+
+class WWSDLFileCache(zeep.cache.Base):
+
+	@verify_type(cache_dir=str, ttl=(int, None))
+	@verify_value(cache_dir=lambda x: len(x) > 0, ttl=lambda x: x is None or x >= 0)
+	def __init__(self, cache_dir, ttl=None):
+		self.__cache_dir = cache_dir
+		self.__ttl = ttl
+		self.__lock = threading.Lock()
+		os.makedirs(self.__cache_dir, exist_ok=True)
+
+	def cache_dir(self):
+		return self.__cache_dir
+
+	def ttl(self):
+		return self.__ttl
+
+	def __paths(self, url):
+		name = hashlib.sha1(url.encode()).hexdigest()
+		return os.path.join(self.__cache_dir, name + '.xml'), os.path.join(self.__cache_dir, name + '.json')
+
+	def __meta(self, url):
+		content_path, meta_path = self.__paths(url)
+		try:
+			with open(meta_path) as f:
+				meta = json.load(f)
+		except (OSError, ValueError):
+			return None
+		if meta.get('url') != url:
+			return None
+		if self.__ttl is not None and (time.time() - meta['created']) > self.__ttl:
+			return None
+		return meta
+
+	def add(self, url, content):
+		if isinstance(content, str):
+			content = content.encode()
+		content_path, meta_path = self.__paths(url)
+		meta = {'url': url, 'digest': hashlib.sha256(content).hexdigest(), 'created': time.time()}
+
+		with self.__lock:
+			for path, data, mode in ((content_path, content, 'wb'), (meta_path, json.dumps(meta), 'w')):
+				tmp_path = path + '.tmp'
+				with open(tmp_path, mode) as f:
+					f.write(data)
+				os.replace(tmp_path, path)
+
+	def get(self, url):
+		with self.__lock:
+			meta = self.__meta(url)
+			if meta is None:
+				return None
+			content_path, meta_path = self.__paths(url)
+			try:
+				with open(content_path, 'rb') as f:
+					content = f.read()
+			except OSError:
+				return None
+		if hashlib.sha256(content).hexdigest() != meta['digest']:
+			return None
+		return content
+
+	def entries(self):
+		result = []
+		for file_name in sorted(os.listdir(self.__cache_dir)):
+			if file_name.endswith('.json') is False:
+				continue
+			try:
+				with open(os.path.join(self.__cache_dir, file_name)) as f:
+					result.append(json.load(f))
+			except (OSError, ValueError):
+				continue
+		return result
+
+	@verify_type(url=(str, None))
+	def invalidate(self, url=None):
+		with self.__lock:
+			if url is not None:
+				paths = self.__paths(url)
+			else:
+				paths = [
+					os.path.join(self.__cache_dir, x) for x in os.listdir(self.__cache_dir)
+					if x.endswith('.xml') or x.endswith('.json')
+				]
+			for path in paths:
+				try:
+					os.unlink(path)
+				except FileNotFoundError:
+					pass
+
+
+class WWSDLMemoryCache(zeep.cache.Base):
+	# documents are shared by all the clients of a process, like parsed documents of WWSDLCache
+
+	__documents = {}
+	__lock = threading.Lock()
+
+	@verify_type(ttl=(int, None))
+	@verify_value(ttl=lambda x: x is None or x >= 0)
+	def __init__(self, ttl=None):
+		self.__ttl = ttl
+
+	def ttl(self):
+		return self.__ttl
+
+	def add(self, url, content):
+		if isinstance(content, str):
+			content = content.encode()
+		with WWSDLMemoryCache.__lock:
+			WWSDLMemoryCache.__documents[url] = (time.time(), content)
+
+	def get(self, url):
+		with WWSDLMemoryCache.__lock:
+			created, content = WWSDLMemoryCache.__documents.get(url, (None, None))
+		if content is None:
+			return None
+		if self.__ttl is not None and (time.time() - created) > self.__ttl:
+			return None
+		return content
+
+	@verify_type(url=(str, None))
+	def invalidate(self, url=None):
+		with WWSDLMemoryCache.__lock:
+			if url is not None:
+				WWSDLMemoryCache.__documents.pop(url, None)
+			else:
+				WWSDLMemoryCache.__documents.clear()
+
+
+class WWSDLCache:
+
+	__parsed_documents = {}
+	__parsed_documents_lock = threading.Lock()
+
+	@verify_type(cache_dir=(str, None), ttl=(int, None))
+	@verify_value(cache_dir=lambda x: x is None or len(x) > 0, ttl=lambda x: x is None or x >= 0)
+	def __init__(self, cache_dir=None, ttl=3600):
+		if cache_dir is not None:
+			self.__raw_cache = WWSDLFileCache(cache_dir, ttl=ttl)
+		else:
+			self.__raw_cache = WWSDLMemoryCache(ttl=ttl)
+
+	def raw_cache(self):
+		return self.__raw_cache
+
+	@verify_type(wsdl_url=str)
+	@verify_value(wsdl_url=lambda x: len(x) > 0)
+	def document(self, wsdl_url, transport):
+		digest = hashlib.sha256(transport.load(wsdl_url)).hexdigest()
+		key = (wsdl_url, digest)
+
+		with WWSDLCache.__parsed_documents_lock:
+			document = WWSDLCache.__parsed_documents.get(key)
+			if document is None:
+				document = WSDLDocument(wsdl_url, transport)
+				WWSDLCache.__parsed_documents[key] = document
+		return document
+
+	@verify_type(wsdl_url=(str, None))
+	def invalidate(self, wsdl_url=None):
+		with WWSDLCache.__parsed_documents_lock:
+			for key in list(WWSDLCache.__parsed_documents.keys()):
+				if wsdl_url is None or key[0] == wsdl_url:
+					del WWSDLCache.__parsed_documents[key]
+
+		self.__raw_cache.invalidate(wsdl_url)
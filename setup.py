@@ -32,6 +32,14 @@ class SetupPySpec:
 
 	zip_safe = False
 
+	entry_points = {
+		'console_scripts': ['lanbilling = lanbilling_stuff.cli:main']
+	}
+
+	extras_require = {
+		'async': ['httpx']
+	}
+
 	@staticmethod
 	def require(fname):
 		return open(fname).read().splitlines()
@@ -57,5 +65,7 @@ if __name__ == "__main__":
 		long_description = SetupPySpec.read('README'),
 		classifiers = SetupPySpec.classifiers,
 		install_requires = SetupPySpec.require('requirements.txt'),
-		zip_safe = SetupPySpec.zip_safe
+		extras_require = SetupPySpec.extras_require,
+		zip_safe = SetupPySpec.zip_safe,
+		entry_points = SetupPySpec.entry_points
 	)
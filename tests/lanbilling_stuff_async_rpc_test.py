@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_async_rpc_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import asyncio
+import threading
+
+import pytest
+
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.async_rpc import WLanbillingAsyncRPC
+from lanbilling_stuff.vgroup import fetch_vgroups, async_fetch_vgroups
+
+repository_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(repository_dir, 'extra', 'benchmarks'))
+
+from fake_api3 import WApi3Schema, WApi3Dataset, WApi3Service, WApi3Server, wsdl_path
+
+
+def configuration(hostname, **options):
+	config = WConfig()
+	config.merge(os.path.join(repository_dir, 'lanbilling.ini'))
+	config['lanbilling'].update({
+		'login': 'admin', 'password': 'admin', 'hostname': hostname,
+		'wsdl_url': 'http://%s/admin/soap/api3.wsdl' % hostname
+	})
+	config['lanbilling'].update(options)
+	return config
+
+
+@pytest.fixture
+def fake_api3():
+	service = WApi3Service(WApi3Schema(wsdl_path), WApi3Dataset(vgroups=200, agents=2, tariffs=10))
+	server = WApi3Server(('127.0.0.1', 0), service)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	try:
+		yield '%s:%i' % server.server_address
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+class TestWLanbillingAsyncRPC:
+
+	def test_configuration(self):
+		config = configuration('billing.local', async_concurrency='3', soap_proxy_address='http://proxy:34012')
+		rpc = WLanbillingRPC.from_configuration(config, 'lanbilling')
+		async_rpc = WLanbillingAsyncRPC.from_configuration(config, 'lanbilling')
+
+		assert(async_rpc.concurrency() == 3)
+		assert(async_rpc.hostname() == 'billing.local')
+		assert(async_rpc.login() == 'admin')
+		assert(async_rpc.proxy_address() == 'http://proxy:34012')
+		settings = async_rpc.settings()
+		settings.pop('wsdl_cache')
+		settings.pop('transport_settings')
+		assert(settings == {x: y for x, y in rpc.settings().items() if x in settings})
+
+		assert(WLanbillingAsyncRPC.from_configuration(config, 'lanbilling', concurrency=5).concurrency() == 5)
+		async_rpc = WLanbillingAsyncRPC.from_rpc(rpc, concurrency=2)
+		assert(async_rpc.concurrency() == 2)
+		assert(async_rpc.settings() == rpc.settings())
+
+	def test_fake_api3(self, fake_api3):
+		pytest.importorskip('httpx')
+
+		config = configuration(fake_api3, wsdl_cache_dir='')
+		rpc = WLanbillingRPC.from_configuration(config, 'lanbilling')
+		vgroups = [x['vgid'] for x in fetch_vgroups(rpc)]
+		rpc.close()
+
+		async def fetch(async_rpc):
+			async with async_rpc:
+				return [x['vgid'] async for x in async_fetch_vgroups(async_rpc)]
+
+		async_rpc = WLanbillingAsyncRPC.from_configuration(config, 'lanbilling')
+		assert(len(vgroups) == 200)
+		assert(asyncio.run(fetch(async_rpc)) == vgroups)
+
+		for compression, accept_encoding in (('true', 'gzip, deflate'), ('false', 'identity')):
+			config['lanbilling']['http_compression'] = compression
+			async_rpc = WLanbillingAsyncRPC.from_configuration(config, 'lanbilling')
+
+			async def connect():
+				await async_rpc.rpc()
+				http_client, wsdl_client = async_rpc.http_client(), async_rpc.wsdl_client()
+				headers = (http_client.headers['Accept-Encoding'], wsdl_client.headers['Accept-Encoding'])
+				await async_rpc.aclose()
+				return headers, http_client.is_closed, wsdl_client.is_closed
+
+			assert(asyncio.run(connect()) == ((accept_encoding, accept_encoding), True, True))
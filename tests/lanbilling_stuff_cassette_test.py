@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_cassette_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from lanbilling_stuff.cassette import WRPCCassette
+
+
+def envelope(operation, body=''):
+	return (
+		'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns="urn:api3">'
+		'<soap:Body><ns:%s>%s</ns:%s></soap:Body></soap:Envelope>' % (operation, body, operation)
+	).encode()
+
+
+def response(content, status_code=200):
+	result = Response()
+	result.status_code = status_code
+	result.headers = CaseInsensitiveDict({'Content-Type': 'text/xml; charset=utf-8'})
+	result._content = content
+	return result
+
+
+def record(filename, posts):
+	cassette = WRPCCassette(filename, mode='record')
+	cassette.record_load('http://localhost/api3.wsdl', b'<definitions/>')
+	for message, content in posts:
+		cassette.record_post('http://localhost/api3', message, response(content), 0.01)
+	cassette.close()
+
+
+class TestWRPCCassette:
+
+	def test_operation_name(self):
+		assert(WRPCCassette.operation_name(envelope('getVgroups')) == 'getVgroups')
+		assert(WRPCCassette.operation_name(b'<xml') is None)
+		assert(WRPCCassette.request_digest('a') == WRPCCassette.request_digest(b'a'))
+
+	def test_replay(self, tmp_path):
+		filename = str(tmp_path / 'cassette.gz')
+		first_page = envelope('getVgroups', '<pgnum>1</pgnum>')
+		second_page = envelope('getVgroups', '<pgnum>2</pgnum>')
+		record(filename, (
+			(first_page, b'first page'),
+			(second_page, b'second page'),
+			(first_page, b'first page again'),
+			(envelope('getTarifs'), b'\xff\xfe binary')
+		))
+
+		cassette = WRPCCassette(filename)
+		assert(cassette.replay_load('http://localhost/api3.wsdl') == b'<definitions/>')
+		with pytest.raises(RuntimeError):
+			cassette.replay_load('http://localhost/other.wsdl')
+
+		# the same request gets its recorded responses in order and then the last one
+		result = cassette.replay_post('http://localhost/api3', second_page)
+		assert(result.status_code == 200)
+		assert(result.content == b'second page')
+		assert(result.headers['content-type'] == 'text/xml; charset=utf-8')
+		assert(cassette.replay_post('http://localhost/api3', first_page).content == b'first page')
+		assert(cassette.replay_post('http://localhost/api3', first_page).content == b'first page again')
+		assert(cassette.replay_post('http://localhost/api3', first_page).content == b'first page again')
+		assert(cassette.replay_post('http://localhost/api3', second_page).content == b'second page')
+
+		assert(cassette.replay_post('http://localhost/api3', envelope('getTarifs')).content == b'\xff\xfe binary')
+
+		with pytest.raises(RuntimeError):
+			cassette.replay_post('http://localhost/api3', envelope('getAccounts'))
+
+	def test_replay_operation(self, tmp_path):
+		filename = str(tmp_path / 'cassette.gz')
+		record(filename, (
+			(envelope('insupdVgroup', '<stamp>1</stamp>'), b'first'),
+			(envelope('insupdVgroup', '<stamp>2</stamp>'), b'second')
+		))
+
+		# a request that was not recorded gets the next response of the same operation, that was not replayed
+		cassette = WRPCCassette(filename)
+
+		def replay(stamp):
+			message = envelope('insupdVgroup', '<stamp>%i</stamp>' % stamp)
+			return cassette.replay_post('http://localhost/api3', message).content
+
+		assert(replay(2) == b'second')
+		assert(replay(3) == b'first')
+		assert(replay(3) == b'first')
+		with pytest.raises(RuntimeError):
+			replay(4)
+
+	def test_truncated(self, tmp_path):
+		filename = str(tmp_path / 'cassette.gz')
+		record(filename, ((envelope('getVgroups'), b'vgroups'), (envelope('getTarifs'), b'tariffs')))
+		with open(filename, 'rb') as f:
+			data = f.read()
+		with open(filename, 'wb') as f:
+			f.write(data[:-10])
+
+		# the last record that was truncated by a crash is lost only
+		cassette = WRPCCassette(filename)
+		assert(cassette.replay_post('http://localhost/api3', envelope('getVgroups')).content == b'vgroups')
+		with pytest.raises(RuntimeError):
+			cassette.replay_post('http://localhost/api3', envelope('getTarifs'))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_limiter_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+
+import pytest
+
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.limiter import WConcurrencyLimiter
+
+
+def call(limiter, calls, method_name='getVgroups', latency=0.01, overloaded=False):
+	# calls of concurrent threads. Every call is made while the limit is reached
+	for i in range(calls):
+		while limiter.in_flight() < limiter.limit():
+			limiter.acquire()
+		limiter.release(method_name, latency=latency, overloaded=overloaded)
+
+
+class TestWConcurrencyLimiter:
+
+	def test(self):
+		limiter = WConcurrencyLimiter()
+		assert(limiter.limit() is None)
+		for i in range(100):
+			limiter.acquire()
+		assert(limiter.in_flight() == 100)
+
+		pytest.raises(ValueError, WConcurrencyLimiter, max_limit=1, min_limit=2)
+
+	def test_slow_start(self):
+		limiter = WConcurrencyLimiter(max_limit=8)
+		assert(limiter.limit() == 1)
+
+		# the limit grows by one for every call that reached the limit
+		call(limiter, 3)
+		assert(limiter.limit() == 4)
+		call(limiter, 20)
+		assert(limiter.limit() == 8)
+
+		# and does not grow when the limit is not reached
+		limiter = WConcurrencyLimiter(max_limit=8)
+		for i in range(5):
+			limiter.acquire()
+			limiter.release('getVgroups', latency=0.01)
+		assert(limiter.limit() == 2)
+		assert(limiter.in_flight() == 0)
+
+	def test_overload(self):
+		limiter = WConcurrencyLimiter(max_limit=16, min_limit=3)
+		call(limiter, 15)
+		assert(limiter.limit() == 16)
+
+		call(limiter, 1, latency=10, overloaded=True)
+		assert(limiter.limit() == 8)
+
+		# concurrent calls spot the same overload, so the limit is decreased once per latency
+		call(limiter, 1, latency=10, overloaded=True)
+		assert(limiter.limit() == 8)
+
+		call(limiter, 1, latency=None, overloaded=True)
+		assert(limiter.limit() == 4)
+		call(limiter, 1, latency=None, overloaded=True)
+		assert(limiter.limit() == 3)
+
+		# after the first decrease the limit grows by one every round trip (one call per slot)
+		call(limiter, 3)
+		assert(limiter.limit() == 3)
+		call(limiter, 1)
+		assert(limiter.limit() == 4)
+
+	def test_latency(self):
+		limiter = WConcurrencyLimiter(max_limit=16)
+		call(limiter, 15)
+		assert(limiter.limit() == 16)
+
+		# a single slow call does not decrease the limit
+		call(limiter, 1, latency=0.05)
+		assert(limiter.limit() == 16)
+
+		# latencies of other methods are tracked separately
+		call(limiter, 1, method_name='insupdVgroup', latency=1)
+		assert(limiter.limit() == 16)
+
+		call(limiter, 30, latency=0.1)
+		assert(limiter.limit() < 16)
+
+	def test_wait(self):
+		limiter = WConcurrencyLimiter(max_limit=1)
+		limiter.acquire()
+
+		acquired = threading.Event()
+
+		def acquire():
+			limiter.acquire()
+			acquired.set()
+
+		thread = threading.Thread(target=acquire)
+		thread.daemon = True
+		thread.start()
+		assert(acquired.wait(0.1) is False)
+
+		limiter.release('getVgroups', latency=0.01)
+		assert(acquired.wait(5) is True)
+		thread.join()
+		assert(limiter.in_flight() == 1)
+
+	def test_rate(self):
+		limiter = WConcurrencyLimiter(max_rate=100)
+		assert(limiter.limit() is None)
+
+		started_at = time.monotonic()
+		for i in range(6):
+			limiter.acquire()
+			limiter.release('getVgroups', latency=0)
+		assert(time.monotonic() - started_at >= 0.05)
+
+	def test_configuration(self):
+		config = WConfig()
+		config.add_section('lanbilling')
+		assert(WConcurrencyLimiter.from_configuration(config, 'lanbilling') is None)
+
+		config['lanbilling']['rpc_concurrency_max'] = ''
+		config['lanbilling']['rpc_concurrency_min'] = '2'
+		assert(WConcurrencyLimiter.from_configuration(config, 'lanbilling') is None)
+
+		config['lanbilling']['rpc_concurrency_max'] = '10'
+		limiter = WConcurrencyLimiter.from_configuration(config, 'lanbilling')
+		assert(limiter.max_limit() == 10)
+		assert(limiter.min_limit() == 2)
+		assert(limiter.limit() == 2)
+		assert(limiter.max_rate() is None)
+
+		config['lanbilling']['rpc_rate_limit'] = '2.5'
+		limiter = WConcurrencyLimiter.from_configuration(config, 'lanbilling')
+		assert(limiter.max_rate() == 2.5)
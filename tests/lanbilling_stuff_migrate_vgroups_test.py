@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_migrate_vgroups_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.tariff import TariffPrefixCloneGenerator
+from lanbilling_stuff.commands.migrate_vgroups import migration_action
+
+
+def tariff(tar_id, tariff_type, descr, rent=100.0, archive=0):
+	return {
+		'tarif': {
+			'tarid': tar_id, 'type': tariff_type, 'descr': descr, 'descrfull': None, 'used': 0,
+			'uuid': 'uuid-%08i' % tar_id, 'saledictionaryid': 0, 'rent': rent, 'trafflimit': 0,
+			'archive': archive, 'catnumbers': [], 'additional': 0
+		},
+		'sizeshapes': [],
+		'timeshapes': []
+	}
+
+
+def action(generator, source_tariff):
+	result, equal_tariff = migration_action(generator, source_tariff)
+	return result, (equal_tariff['tarif']['tarid'] if equal_tariff is not None else None)
+
+
+class TestMigrationAction:
+
+	def test(self):
+		source_tariff = tariff(1, 5, 'Basic')
+		tariffs = [source_tariff, tariff(2, 1, 'Basic'), tariff(3, 1, 'Premium', rent=500.0)]
+		generator = TariffPrefixCloneGenerator(WLanbillingRPC(), 5, tariffs=tariffs)
+
+		# without the prefix the tariff of the destination type is equal to itself
+		assert(action(generator, source_tariff) == ('migrate', 1))
+		assert(action(generator, tariffs[1]) == ('migrate', 1))
+		assert(action(generator, tariffs[2]) == ('no_analog', None))
+		assert(action(generator, tariff(4, 1, 'Basic', archive=1)) == ('unsupported_tariff', None))
+
+	def test_prefix(self):
+		# the source tariff has the destination type, but it does not have the prefix, so it is not the analog
+		# of itself (the plan used to report a migration to the source tariff, that the real run did not do)
+		source_tariff = tariff(1, 5, 'Basic')
+		tariffs = [source_tariff, tariff(2, 1, 'Basic')]
+		generator = TariffPrefixCloneGenerator(WLanbillingRPC(), 5, prefix='Cloned ', tariffs=tariffs)
+		assert(action(generator, source_tariff) == ('no_analog', None))
+		assert(action(generator, tariffs[1]) == ('no_analog', None))
+
+		tariffs.append(tariff(3, 5, 'Cloned Basic'))
+		tariffs.append(tariff(4, 5, 'Cloned Premium'))
+		generator = TariffPrefixCloneGenerator(WLanbillingRPC(), 5, prefix='Cloned ', tariffs=tariffs)
+		assert(action(generator, source_tariff) == ('migrate', 3))
+		assert(action(generator, tariffs[1]) == ('migrate', 3))
+		assert(action(generator, tariff(5, 1, 'Premium')) == ('migrate', 4))
+		assert(action(generator, tariff(6, 1, 'Premium', rent=1.0)) == ('no_analog', None))
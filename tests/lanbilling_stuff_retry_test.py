@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_retry_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import pytest
+import requests.exceptions
+import urllib3.exceptions
+import zeep.exceptions
+
+from wasp_general.config import WConfig
+
+from lanbilling_stuff.retry import WRetryPolicy, WCircuitBreaker
+
+
+def connection_error(reason):
+	# the way "requests" wraps an error of urllib3
+	return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, '/', reason=reason))
+
+
+class TestWRetryPolicy:
+
+	def test_read_method(self):
+		policy = WRetryPolicy(read_retries=2, write_retries=1)
+		assert(policy.read_method('getVgroups') is True)
+		assert(policy.read_method('Login') is True)
+		assert(policy.read_method('insupdTarif') is False)
+		assert(policy.retries('getTarifs') == 2)
+		assert(policy.retries('insupdVgroup') == 1)
+
+	def test_read_retry(self):
+		policy = WRetryPolicy()
+		assert(policy.retry_allowed('getVgroups', requests.exceptions.ReadTimeout()) is True)
+		assert(policy.retry_allowed('getVgroups', requests.exceptions.ConnectTimeout()) is True)
+		assert(policy.retry_allowed('getVgroups', connection_error(ConnectionResetError())) is True)
+		assert(policy.retry_allowed('getVgroups', zeep.exceptions.TransportError(status_code=500)) is True)
+		assert(policy.retry_allowed('getVgroups', zeep.exceptions.TransportError(status_code=429)) is True)
+		assert(policy.retry_allowed('getVgroups', zeep.exceptions.TransportError(status_code=404)) is False)
+		assert(policy.retry_allowed('getVgroups', zeep.exceptions.Fault('error')) is False)
+		assert(policy.retry_allowed('getVgroups', ValueError()) is False)
+
+	def test_write_retry(self):
+		policy = WRetryPolicy()
+
+		# the request was sent, so the server may have processed it already
+		assert(policy.retry_allowed('insupdVgroup', requests.exceptions.ReadTimeout()) is False)
+		assert(policy.retry_allowed('insupdVgroup', connection_error(ConnectionResetError())) is False)
+		assert(policy.retry_allowed('insupdVgroup', requests.exceptions.ConnectionError()) is False)
+		assert(policy.retry_allowed('insupdVgroup', zeep.exceptions.TransportError(status_code=500)) is False)
+		assert(policy.retry_allowed('insupdVgroup', zeep.exceptions.TransportError(status_code=502)) is False)
+		assert(policy.retry_allowed('insupdVgroup', zeep.exceptions.Fault('error')) is False)
+
+		# the request was not sent or was refused without processing
+		assert(policy.retry_allowed('insupdVgroup', requests.exceptions.ConnectTimeout()) is True)
+		new_connection_error = urllib3.exceptions.NewConnectionError(None, 'Connection refused')
+		assert(policy.retry_allowed('insupdVgroup', connection_error(new_connection_error)) is True)
+		assert(policy.retry_allowed('insupdVgroup', connection_error(ConnectionRefusedError())) is True)
+		assert(policy.retry_allowed('insupdVgroup', zeep.exceptions.TransportError(status_code=429)) is True)
+		assert(policy.retry_allowed('insupdVgroup', zeep.exceptions.TransportError(status_code=503)) is True)
+
+	def test_call(self):
+		policy = WRetryPolicy(read_retries=2, write_retries=2, base_delay=0)
+		calls = []
+
+		def fail(exc):
+			def fn():
+				calls.append(exc)
+				raise exc
+			return fn
+
+		with pytest.raises(requests.exceptions.ReadTimeout):
+			policy.call('getVgroups', fail(requests.exceptions.ReadTimeout()), (), {})
+		assert(len(calls) == 3)
+
+		calls.clear()
+		with pytest.raises(requests.exceptions.ReadTimeout):
+			policy.call('insupdVgroup', fail(requests.exceptions.ReadTimeout()), (), {})
+		assert(len(calls) == 1)
+
+		calls.clear()
+		retried = []
+		with pytest.raises(requests.exceptions.ConnectTimeout):
+			policy.call('insupdVgroup', fail(requests.exceptions.ConnectTimeout()), (), {}, on_retry=retried.append)
+		assert(len(calls) == 3)
+		assert(retried == ['insupdVgroup', 'insupdVgroup'])
+
+		results = iter((requests.exceptions.ConnectTimeout(), 1))
+
+		def flaky():
+			result = next(results)
+			if isinstance(result, Exception) is True:
+				raise result
+			return result
+
+		assert(policy.call('insupdVgroup', flaky, (), {}) == 1)
+
+	def test_configuration(self):
+		config = WConfig()
+		config.add_section('lanbilling')
+		assert(WRetryPolicy.from_configuration(config, 'lanbilling') is None)
+
+		config['lanbilling']['rpc_breaker_threshold'] = '0'
+		assert(WRetryPolicy.from_configuration(config, 'lanbilling') is None)
+
+		config['lanbilling']['rpc_breaker_threshold'] = '3'
+		config['lanbilling']['rpc_breaker_timeout'] = '10'
+		policy = WRetryPolicy.from_configuration(config, 'lanbilling')
+		assert(policy.read_retries() == 3)
+		assert(policy.circuit_breaker().failure_threshold() == 3)
+		assert(policy.circuit_breaker().reset_timeout() == 10)
+
+		config['lanbilling']['rpc_read_retries'] = '5'
+		policy = WRetryPolicy.from_configuration(config, 'lanbilling')
+		assert(policy.read_retries() == 5)
+		assert(policy.circuit_breaker() is not None)
+
+
+class TestWCircuitBreaker:
+
+	def test_interrupted_probe(self):
+		breaker = WCircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+		policy = WRetryPolicy(read_retries=0, base_delay=0, circuit_breaker=breaker)
+
+		def fail():
+			raise requests.exceptions.ReadTimeout()
+
+		def interrupt():
+			raise KeyboardInterrupt()
+
+		with pytest.raises(requests.exceptions.ReadTimeout):
+			policy.call('getVgroups', fail, (), {})
+
+		# the interrupted probe is released, so the next caller probes the server instead of waiting forever
+		with pytest.raises(KeyboardInterrupt):
+			policy.call('getVgroups', interrupt, (), {})
+
+		results = []
+		thread = threading.Thread(target=lambda: results.append(policy.call('getVgroups', lambda: 1, (), {})))
+		thread.daemon = True
+		thread.start()
+		thread.join(5)
+		assert(results == [1])
+		assert(breaker.state() == 'closed')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_rpc_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import requests.exceptions
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.retry import WRetryPolicy
+from lanbilling_stuff.metrics import WRPCMetrics
+
+
+class SlowRetryPolicy(WRetryPolicy):
+
+	def delay(self, attempt):
+		return 0.3
+
+
+class FakeService:
+
+	def __init__(self, failures):
+		self.failures = failures
+
+	def getVgroups(self, request):
+		if self.failures > 0:
+			self.failures -= 1
+			raise requests.exceptions.ConnectTimeout()
+		return [request]
+
+
+class TestMethodProxy:
+
+	def test_metrics(self):
+		metrics = WRPCMetrics()
+		rpc = WLanbillingRPC(retry_policy=SlowRetryPolicy(read_retries=2), metrics=metrics)
+		proxy = WLanbillingRPC.MethodProxy(rpc, FakeService(2), 'getVgroups')
+
+		started_at = time.monotonic()
+		assert(proxy({}) == [{}])
+		assert(time.monotonic() - started_at >= 0.6)
+
+		# every attempt is measured, retry delays are not a latency
+		method = metrics.as_dict()['methods']['getVgroups']
+		assert(method['calls'] == 3)
+		assert(method['retries'] == 2)
+		assert(method['errors'] == {'ConnectTimeout': 2})
+		assert(method['latency']['max'] < 0.3)
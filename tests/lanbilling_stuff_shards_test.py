@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_shards_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import csv
+
+from lanbilling_stuff.metrics import WRPCMetrics
+from lanbilling_stuff.shards import WVgroupShards, vgroup_shards
+
+
+class TestWVgroupShards:
+
+	def test(self):
+		vgroups = [{'vgid': x} for x in (5, 3, 1, 4, 2)]
+		shards = vgroup_shards(vgroups, 2)
+		assert([[y['vgid'] for y in x] for x in shards] == [[1, 2], [3, 4, 5]])
+		assert(vgroup_shards([], 2) == [])
+		assert(len(vgroup_shards(vgroups, 10)) == 5)
+
+		metrics = WRPCMetrics()
+		with metrics.measure('getVgroups'):
+			pass
+
+		def worker(shard_vgroups, output_obj):
+			writer = csv.writer(output_obj)
+			# columns are written in different order by shards
+			if shard_vgroups[0]['vgid'] == 1:
+				writer.writerow(['vgid', 'login'])
+				writer.writerows([[x['vgid'], 'user\n%i' % x['vgid']] for x in shard_vgroups])
+			else:
+				writer.writerow(['login', 'vgid'])
+				writer.writerows([['user\n%i' % x['vgid'], x['vgid']] for x in shard_vgroups])
+			for x in shard_vgroups:
+				with metrics.measure('insupdVgroup'):
+					pass
+			if shard_vgroups[0]['vgid'] == 3:
+				metrics.retried('insupdVgroup')
+				os._exit(3)
+
+		output = io.StringIO(newline='')
+		with WVgroupShards(shards) as vgroup_shards_obj:
+			assert(vgroup_shards_obj.ranges() == [(1, 2), (3, 5)])
+			assert(vgroup_shards_obj.run(worker, metrics=metrics) == [0, 3])
+			assert(vgroup_shards_obj.failed() == [(3, 5, 3)])
+			vgroup_shards_obj.merge(output)
+
+		output.seek(0)
+		assert(list(csv.reader(output)) == [['vgid', 'login'], ['1', 'user\n1'], ['2', 'user\n2']])
+
+		# the killed shard did not send its metrics, metrics of the parent are not counted twice
+		methods = metrics.as_dict()['methods']
+		assert(methods['getVgroups']['calls'] == 1)
+		assert(methods['insupdVgroup']['calls'] == 2)
+		assert(methods['insupdVgroup']['retries'] == 0)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_tariff_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+
+from lanbilling_stuff.rpc import WLanbillingRPC
+from lanbilling_stuff.tariff import TariffCloneGenerator, TariffPrefixCloneGenerator
+
+
+def tariff(tar_id, descr, rent=100.0, sizeshapes=None, uuid=None):
+	return {
+		'tarif': {
+			'tarid': tar_id, 'type': 5, 'descr': descr, 'descrfull': 'Tariff %i' % tar_id, 'used': tar_id,
+			'uuid': uuid if uuid is not None else 'uuid-%08i' % tar_id, 'saledictionaryid': 0, 'rent': rent,
+			'trafflimit': 0, 'archive': 0, 'catnumbers': [], 'additional': 0
+		},
+		'sizeshapes': sizeshapes if sizeshapes is not None else [],
+		'timeshapes': []
+	}
+
+
+def compare_tariffs(tariff_a, tariff_b, prefix=None):
+	# the equality rule that was used before tariffs fingerprints, "tariff_b" is a clone of "tariff_a"
+	if prefix is not None:
+		if tariff_b['tarif']['descr'] != (prefix + tariff_a['tarif']['descr']):
+			return False
+
+	if tariff_a['sizeshapes'] != tariff_b['sizeshapes']:
+		return False
+
+	if tariff_a['timeshapes'] != tariff_b['timeshapes']:
+		return False
+
+	dict_a = {x: tariff_a['tarif'][x] for x in tariff_a['tarif']}
+	dict_b = {x: tariff_b['tarif'][x] for x in tariff_b['tarif']}
+
+	for key in ['tarid', 'type', 'descr', 'descrfull', 'used', 'uuid', 'saledictionaryid']:
+		del dict_a[key]
+		del dict_b[key]
+
+	return dict_a == dict_b
+
+
+tariffs = [
+	tariff(1, 'Basic'),
+	tariff(2, 'Basic', uuid='another-uuid'),
+	tariff(3, 'Premium'),
+	tariff(4, 'Basic', rent=500.0),
+	tariff(5, 'Basic', sizeshapes=[{'id': 1, 'volume': 1024}]),
+	tariff(6, 'new Basic'),
+	tariff(7, 'new Premium', rent=500.0),
+	tariff(8, 'new new Basic'),
+	tariff(9, 'new Basic', sizeshapes=[{'id': 1, 'volume': 1024}]),
+	tariff(10, 'newBasic')
+]
+
+
+class TestTariffFingerprint:
+
+	def test(self):
+		generator = TariffCloneGenerator(WLanbillingRPC(), 5, tariffs=tariffs)
+		for tariff_a, tariff_b in itertools.product(tariffs, repeat=2):
+			equal = generator.tariff_fingerprint(tariff_a) == generator.destination_fingerprint(tariff_b)
+			assert(equal is compare_tariffs(tariff_a, tariff_b))
+
+	def test_prefix(self):
+		for prefix in (None, 'new ', 'new'):
+			generator = TariffPrefixCloneGenerator(WLanbillingRPC(), 5, prefix=prefix, tariffs=tariffs)
+			for tariff_a, tariff_b in itertools.product(tariffs, repeat=2):
+				equal = generator.tariff_fingerprint(tariff_a) == generator.destination_fingerprint(tariff_b)
+				assert(equal is compare_tariffs(tariff_a, tariff_b, prefix=prefix))
+
+		generator = TariffPrefixCloneGenerator(WLanbillingRPC(), 5, prefix='new ', tariffs=tariffs)
+		assert(generator.find_equal(tariffs[0])['tarif']['tarid'] == 6)
+		assert(generator.find_equal(tariffs[5])['tarif']['tarid'] == 8)
+		assert(generator.find_equal(tariffs[3]) is None)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_vgroup_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+from lanbilling_stuff.vgroup import plan_vgroups_requests, vgroups_request
+
+
+class FakeRPC:
+
+	def __init__(self, tariffs):
+		self.tariffs = tariffs
+		self.calls = []
+
+	def streaming(self):
+		return False
+
+	def getTarifs(self):
+		self.calls.append('getTarifs')
+		return [{'id': x} for x in range(1, self.tariffs + 1)]
+
+
+def plan(rpc, **filters):
+	full_scan_size = filters.pop('full_scan_size', None)
+	return plan_vgroups_requests(
+		rpc, vgroups_request(**filters), from_vg_id=filters.get('from_vg_id'), to_vg_id=filters.get('to_vg_id'),
+		from_tar_id=filters.get('from_tar_id'), to_tar_id=filters.get('to_tar_id'), full_scan_size=full_scan_size
+	)
+
+
+class TestPlanVgroupsRequests:
+
+	def test_narrowed(self):
+		rpc = FakeRPC(100)
+		assert(plan(rpc, login='user', from_tar_id=1, to_tar_id=30) == (
+			'narrowed request', [{'login': 'user'}]
+		))
+		assert(plan(rpc, vgroup_agent_id=1, from_tar_id=1, to_tar_id=30, full_scan_size=100000) == (
+			'narrowed request', [{'agentid': 1}]
+		))
+		assert(plan(rpc, from_vg_id=5, to_vg_id=5, from_tar_id=1, to_tar_id=30) == (
+			'narrowed request', [{'vgid': 5}]
+		))
+		assert(rpc.calls == [])
+
+	def test_plans(self):
+		rpc = FakeRPC(100)
+		assert(plan(rpc) == ('full scan', [{}]))
+		assert(plan(rpc, from_vg_id=10, to_vg_id=20) == ('full scan', [{}]))
+
+		name, requests = plan(rpc, from_vg_id=100000, to_vg_id=100002)
+		assert(name == 'per-vgid')
+		assert(requests == [{'vgid': 100000}, {'vgid': 100001}, {'vgid': 100002}])
+		assert(rpc.calls == [])
+
+		name, requests = plan(rpc, from_tar_id=1, to_tar_id=3, full_scan_size=100000)
+		assert(name == 'per-tarid')
+		assert(requests == [{'tarid': 1}, {'tarid': 2}, {'tarid': 3}])
+
+		# the most of the tariffs are requested, so the full scan is cheaper
+		assert(plan(rpc, from_tar_id=1, to_tar_id=90, full_scan_size=1000) == ('full scan', [{}]))
+
+	def test_wide_range(self):
+		# a wide range is rejected without a list of every vgid
+		rpc = FakeRPC(100)
+		assert(plan(rpc, from_vg_id=0, to_vg_id=10 ** 12) == ('full scan', [{}]))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# tests/lanbilling_stuff_wsdl_cache_test.py
+#
+# Copyright (C) 2017 the lanbilling-scripts authors and contributors
+# <see AUTHORS file>
+#
+# This file is part of lanbilling-scripts.
+#
+# Lanbilling-scripts is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Lanbilling-scripts is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with lanbilling-scripts.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import zeep.cache
+
+from lanbilling_stuff.wsdl_cache import WWSDLFileCache, WWSDLMemoryCache, WWSDLCache
+
+
+class TestWWSDLMemoryCache:
+
+	def test(self):
+		cache = WWSDLMemoryCache()
+		cache.invalidate()
+		assert(cache.get('http://localhost/api3.wsdl') is None)
+
+		cache.add('http://localhost/api3.wsdl', '<definitions/>')
+		cache.add('http://localhost/other.wsdl', b'<definitions name="other"/>')
+		assert(cache.get('http://localhost/api3.wsdl') == b'<definitions/>')
+
+		# documents are shared by clients of a process, but every client has its own ttl
+		assert(WWSDLMemoryCache(ttl=3600).get('http://localhost/api3.wsdl') == b'<definitions/>')
+		time.sleep(0.01)
+		assert(WWSDLMemoryCache(ttl=0).get('http://localhost/api3.wsdl') is None)
+
+		cache.invalidate('http://localhost/api3.wsdl')
+		assert(cache.get('http://localhost/api3.wsdl') is None)
+		assert(cache.get('http://localhost/other.wsdl') == b'<definitions name="other"/>')
+		cache.invalidate()
+		assert(cache.get('http://localhost/other.wsdl') is None)
+
+
+class TestWWSDLFileCache:
+
+	def test(self, tmp_path):
+		cache = WWSDLFileCache(str(tmp_path), ttl=3600)
+		cache.add('http://localhost/api3.wsdl', '<definitions/>')
+		cache.add('http://localhost/other.wsdl', b'<definitions name="other"/>')
+		assert(cache.get('http://localhost/api3.wsdl') == b'<definitions/>')
+		assert(len(cache.entries()) == 2)
+
+		time.sleep(0.01)
+		assert(WWSDLFileCache(str(tmp_path), ttl=0).get('http://localhost/api3.wsdl') is None)
+
+		cache.invalidate('http://localhost/api3.wsdl')
+		assert(cache.get('http://localhost/api3.wsdl') is None)
+		assert(cache.get('http://localhost/other.wsdl') == b'<definitions name="other"/>')
+		cache.invalidate()
+		assert(cache.entries() == [])
+
+
+class TestWWSDLCache:
+
+	def test_invalidate(self, tmp_path):
+		zeep_cache = zeep.cache.InMemoryCache()
+		zeep_cache.add('http://localhost/api3.wsdl', b'<definitions name="zeep"/>')
+
+		cache = WWSDLCache()
+		assert(isinstance(cache.raw_cache(), WWSDLMemoryCache) is True)
+		cache.raw_cache().add('http://localhost/api3.wsdl', b'<definitions/>')
+		cache.invalidate()
+		assert(cache.raw_cache().get('http://localhost/api3.wsdl') is None)
+		# the cache of zeep is not touched
+		assert(zeep_cache.get('http://localhost/api3.wsdl') == b'<definitions name="zeep"/>')
+
+		cache = WWSDLCache(cache_dir=str(tmp_path))
+		assert(isinstance(cache.raw_cache(), WWSDLFileCache) is True)
+		cache.raw_cache().add('http://localhost/api3.wsdl', b'<definitions/>')
+		cache.invalidate('http://localhost/api3.wsdl')
+		assert(cache.raw_cache().get('http://localhost/api3.wsdl') is None)